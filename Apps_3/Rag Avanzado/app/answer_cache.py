@@ -0,0 +1,218 @@
+# answer_cache.py
+# Caché semántica de respuestas delante de la recuperación y la generación
+#
+# Muchas preguntas son casi iguales. Si el embedding de la pregunta independiente
+# (ya reformulada) se parece lo suficiente al de una pregunta respondida antes,
+# se devuelven la respuesta y las fuentes guardadas, sin multi-query, búsqueda
+# ni llamada a GPT-4.
+# -- dos preguntas solo son la misma si además tienen los mismos números, códigos
+#    y nombres propios: con ada-002, "2019 revenue" y "2020 revenue" superan
+#    holgadamente el umbral de similitud
+# -- cada entrada está ligada a la versión del corpus que escribe el loader en
+#    su manifiesto; al reindexar, las respuestas anteriores dejan de servirse.
+#    La versión se toma antes de buscar en la caché (corpus_version()) y se pasa
+#    a store(): una respuesta generada con el corpus anterior no se guarda
+# -- las entradas caducan (TTL) y se expulsan las menos usadas (LRU)
+# -- stats() devuelve aciertos, fallos y tasa de acierto para el servidor
+
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import AsyncIterator, FrozenSet, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage
+from langchain_core.runnables import RunnableGenerator
+
+# Manifiesto que escribe rag-data-loader/rag_load_and_process.py
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag-data-loader", "index-manifest.json")
+
+
+# Palabras de la pregunta, incluidos códigos como "X-200" o "v1.2"
+_TERM_PATTERN = re.compile(r"\w+(?:[-./]\w+)*")
+
+
+# Números, códigos y nombres propios de la pregunta (en minúsculas)
+def key_terms(question: str) -> FrozenSet[str]:
+    terms = set()
+    for i, match in enumerate(_TERM_PATTERN.finditer(question)):
+        term = match.group()
+        has_digit = any(ch.isdigit() for ch in term)
+        # Mayúsculas en medio de la palabra (ZX, iPhone) o al principio, salvo en la primera palabra
+        capitalized = any(ch.isupper() for ch in term[1:]) or (i > 0 and len(term) > 1 and term[0].isupper())
+        if has_digit or capitalized:
+            terms.add(term.lower())
+    return frozenset(terms)
+
+
+@dataclass
+class CachedAnswer:
+    question: str
+    answer: str
+    docs: List[Document]
+    corpus_version: Optional[str]
+    created_at: float
+    key_terms: FrozenSet[str] = frozenset()
+
+
+class SemanticAnswerCache:
+    def __init__(self, embeddings: Embeddings, manifest_path: str = DEFAULT_MANIFEST_PATH,
+                 threshold: float = 0.95, ttl: float = 3600, max_entries: int = 1000):
+        self.embeddings = embeddings
+        self.manifest_path = manifest_path
+        # Similitud coseno mínima para considerar dos preguntas equivalentes
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # ID -> (vector normalizado, respuesta), en orden LRU
+        self._entries = OrderedDict()
+        self._next_id = 0
+        # Matriz de vectores para comparar con todas las entradas a la vez (se rehace al cambiar)
+        self._matrix = None
+        self._matrix_ids = []
+        self._corpus_version = None
+        self._manifest_mtime = None
+
+    # Versión del corpus indexado; el manifiesto solo se vuelve a leer si ha cambiado
+    def corpus_version(self) -> Optional[str]:
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime
+        except OSError:
+            mtime = None
+        with self._lock:
+            if mtime == self._manifest_mtime:
+                return self._corpus_version
+        version = None
+        if mtime is not None:
+            try:
+                with open(self.manifest_path) as f:
+                    version = json.load(f).get("corpus_version")
+            except (OSError, ValueError):
+                version = None
+        with self._lock:
+            if version != self._corpus_version:
+                # Corpus nuevo: ninguna respuesta anterior es válida
+                self._entries.clear()
+                self._matrix = None
+            self._corpus_version = version
+            self._manifest_mtime = mtime
+        return version
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embeddings.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float):
+        expired = [entry_id for entry_id, (_, entry) in self._entries.items() if now - entry.created_at > self.ttl]
+        for entry_id in expired:
+            del self._entries[entry_id]
+        if expired:
+            self._matrix = None
+
+    def _similarities(self, vector: np.ndarray):
+        if self._matrix is None:
+            self._matrix_ids = list(self._entries)
+            self._matrix = np.stack([self._entries[i][0] for i in self._matrix_ids]) if self._entries else None
+        if self._matrix is None:
+            return [], np.empty(0)
+        return self._matrix_ids, self._matrix @ vector
+
+    def lookup(self, question: str) -> Optional[CachedAnswer]:
+        version = self.corpus_version()
+        vector = self._embed(question)
+        terms = key_terms(question)
+        with self._lock:
+            self._expire(time.time())
+            ids, similarities = self._similarities(vector)
+            # La más parecida por encima del umbral con los mismos números, códigos y nombres
+            for best in np.argsort(-similarities, kind="stable"):
+                if similarities[best] < self.threshold:
+                    break
+                entry = self._entries[ids[best]][1]
+                if entry.corpus_version == version and entry.key_terms == terms:
+                    self._entries.move_to_end(ids[best])
+                    self.hits += 1
+                    return entry
+            self.misses += 1
+            return None
+
+    # corpus_version: la versión del corpus con la que se generó la respuesta, tomada con
+    # corpus_version() antes de buscar en la caché; si el corpus ha cambiado desde entonces,
+    # la respuesta no se guarda. Sin ella se usa la versión actual.
+    def store(self, question: str, answer: str, docs: List[Document], corpus_version: Optional[str] = None):
+        version = self.corpus_version()
+        if corpus_version is not None and corpus_version != version:
+            return
+        vector = self._embed(question)
+        entry = CachedAnswer(question, answer, list(docs), version, time.time(), key_terms(question))
+        with self._lock:
+            if self._corpus_version != version:
+                return
+            self._entries[self._next_id] = (vector, entry)
+            self._next_id += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    async def alookup(self, question: str) -> Optional[CachedAnswer]:
+        return await asyncio.get_running_loop().run_in_executor(None, self.lookup, question)
+
+    async def astore(self, question: str, answer: str, docs: List[Document], corpus_version: Optional[str] = None):
+        await asyncio.get_running_loop().run_in_executor(None, self.store, question, answer, docs, corpus_version)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrix = None
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+                "entries": len(self._entries),
+                "corpus_version": self._corpus_version,
+            }
+
+    # Salida de la cadena RAG ({"answer", "docs"}) para una respuesta de la caché
+    @staticmethod
+    def as_output(cached: CachedAnswer) -> dict:
+        return {"answer": AIMessage(content=cached.answer), "docs": cached.docs}
+
+    # Runnable que deja pasar la salida en streaming de la cadena RAG y, al terminar,
+    # guarda la respuesta completa y las fuentes para `question` (ver store())
+    def storing(self, question: str, corpus_version: Optional[str] = None) -> RunnableGenerator:
+        def collect(output, chunk):
+            if "answer" in chunk:
+                output["answer"] += chunk["answer"].content
+            if "docs" in chunk:
+                output["docs"].extend(chunk["docs"])
+
+        def transform(chunks: Iterator[dict]) -> Iterator[dict]:
+            output = {"answer": "", "docs": []}
+            for chunk in chunks:
+                collect(output, chunk)
+                yield chunk
+            self.store(question, output["answer"], output["docs"], corpus_version)
+
+        async def atransform(chunks: AsyncIterator[dict]) -> AsyncIterator[dict]:
+            output = {"answer": "", "docs": []}
+            async for chunk in chunks:
+                collect(output, chunk)
+                yield chunk
+            await self.astore(question, output["answer"], output["docs"], corpus_version)
+
+        return RunnableGenerator(transform, atransform)
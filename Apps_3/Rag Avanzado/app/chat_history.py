@@ -0,0 +1,277 @@
+# chat_history.py
+# Historial de chat con pool de conexiones, caché por sesión y escritura diferida
+#
+# SQLChatMessageHistory crea un engine (y una conexión) nuevo en cada petición
+# y carga el historial completo de la sesión. ChatHistoryStore:
+# -- comparte un único engine con pool de conexiones entre todas las sesiones
+# -- de la base de datos solo lee la ventana de los últimos mensajes de cada sesión
+#    y, si se activa, la guarda en memoria (LRU acotado en número de sesiones)
+# -- las escrituras se acumulan y un hilo las inserta por lotes (write-behind),
+#    así guardar un turno no bloquea la respuesta
+# -- aget_messages/aadd_messages no bloquean el event loop: la caché responde
+#    directamente y las lecturas que faltan se hacen en un hilo
+#
+# La caché y las escrituras pendientes son de cada proceso. Con varios workers de
+# uvicorn, un worker no ve los turnos que otro guarda en su caché, por eso está
+# desactivada por defecto (max_sessions=0); solo debe activarse
+# (HISTORY_CACHE_SESSIONS=10000, por ejemplo) con un único worker. Aun sin caché,
+# un turno tarda hasta flush_interval en ser visible desde los demás workers.
+#
+# Usa la misma tabla (message_store) y formato que SQLChatMessageHistory.
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import List, Sequence
+
+import sqlalchemy
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, get_buffer_string, message_to_dict, messages_from_dict
+
+logger = logging.getLogger(__name__)
+
+# Mensajes que se recuerdan por sesión (y los únicos que se leen de la base de datos)
+DEFAULT_WINDOW = 20
+
+# Sesiones en la caché de memoria; desactivada (0) salvo con un único proceso
+DEFAULT_MAX_SESSIONS = 0
+
+# Segundos entre escrituras por lotes
+DEFAULT_FLUSH_INTERVAL = 0.5
+
+
+# Historial en texto para el prompt de reformulación, acotado en mensajes y caracteres
+def history_for_prompt(messages: Sequence[BaseMessage], max_messages: int = 10, max_chars: int = 4000) -> str:
+    buffer = get_buffer_string(list(messages)[-max_messages:]) if max_messages else ""
+    return buffer[-max_chars:]
+
+
+class ChatHistoryStore:
+    def __init__(self, connection_string: str, table_name: str = "message_store", window: int = DEFAULT_WINDOW,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS, flush_interval: float = DEFAULT_FLUSH_INTERVAL, **engine_args):
+        engine_args.setdefault("pool_pre_ping", True)
+        self.engine = sqlalchemy.create_engine(connection_string, **engine_args)
+        self.window = window
+        self.max_sessions = max_sessions
+        self.flush_interval = flush_interval
+
+        metadata = sqlalchemy.MetaData()
+        # Mismo esquema que SQLChatMessageHistory, más un índice por sesión
+        self.table = sqlalchemy.Table(
+            table_name, metadata,
+            sqlalchemy.Column("id", sqlalchemy.Integer, primary_key=True),
+            sqlalchemy.Column("session_id", sqlalchemy.Text),
+            sqlalchemy.Column("message", sqlalchemy.Text),
+        )
+        self._session_index = sqlalchemy.Index(f"ix_{table_name}_session_id", self.table.c.session_id)
+        self._schema_ready = False
+        # Las primeras peticiones concurrentes no deben crear la tabla a la vez
+        self._schema_lock = threading.Lock()
+
+        self._lock = threading.Lock()
+        # session_id -> deque con los últimos mensajes
+        self._cache = OrderedDict()
+        # Sesiones que se están leyendo de la base de datos (número de lecturas) y las
+        # escrituras que han recibido mientras tanto, para no guardar en la caché una
+        # ventana a la que le falta el último turno
+        self._loading = {}
+        self._versions = {}
+        # Filas pendientes de insertar: (session_id, mensaje serializado)
+        self._pending = []
+        self._wakeup = threading.Condition(self._lock)
+        # Un solo flush a la vez, para que los lotes se inserten en orden
+        self._flush_lock = threading.Lock()
+        self._closed = False
+        self._writer = None
+
+    def _ensure_schema(self):
+        if self._schema_ready:
+            return
+        with self._schema_lock:
+            if not self._schema_ready:
+                self.table.metadata.create_all(self.engine)
+                self._session_index.create(self.engine, checkfirst=True)
+                self._schema_ready = True
+
+    def session(self, session_id: str) -> "PooledChatMessageHistory":
+        return PooledChatMessageHistory(self, session_id)
+
+    # --- caché de ventanas por sesión ---
+
+    def _cached(self, session_id: str):
+        with self._lock:
+            messages = self._cache.get(session_id)
+            if messages is not None:
+                self._cache.move_to_end(session_id)
+                return list(messages)
+            return None
+
+    # Llamar con self._lock
+    def _cache_put(self, session_id: str, messages: Sequence[BaseMessage]):
+        self._cache[session_id] = deque(messages, maxlen=self.window)
+        self._cache.move_to_end(session_id)
+        while len(self._cache) > self.max_sessions:
+            self._cache.popitem(last=False)
+
+    # Leer la ventana y guardarla en la caché, salvo que otra lectura ya lo haya hecho
+    # o la sesión haya recibido mensajes durante la lectura (se leerá de nuevo la próxima vez)
+    def _load_and_cache(self, session_id: str) -> List[BaseMessage]:
+        with self._lock:
+            self._loading[session_id] = self._loading.get(session_id, 0) + 1
+            version = self._versions.get(session_id, 0)
+        loaded = False
+        try:
+            messages = self._load(session_id)
+            loaded = True
+        finally:
+            with self._lock:
+                if loaded and self._versions.get(session_id, 0) == version and session_id not in self._cache:
+                    self._cache_put(session_id, messages)
+                self._loading[session_id] -= 1
+                if not self._loading[session_id]:
+                    del self._loading[session_id]
+                    self._versions.pop(session_id, None)
+        return messages
+
+    # --- lectura ---
+
+    # Leer de la base de datos los últimos `window` mensajes de la sesión
+    def _load(self, session_id: str) -> List[BaseMessage]:
+        # Las escrituras pendientes deben estar en la base de datos antes de leer
+        self.flush()
+        self._ensure_schema()
+        query = (
+            sqlalchemy.select(self.table.c.message)
+            .where(self.table.c.session_id == session_id)
+            .order_by(self.table.c.id.desc())
+            .limit(self.window)
+        )
+        with self.engine.connect() as connection:
+            rows = connection.execute(query).fetchall()
+        return messages_from_dict([json.loads(row.message) for row in reversed(rows)])
+
+    def get_messages(self, session_id: str) -> List[BaseMessage]:
+        messages = self._cached(session_id)
+        if messages is None:
+            messages = self._load_and_cache(session_id)
+        return messages
+
+    async def aget_messages(self, session_id: str) -> List[BaseMessage]:
+        messages = self._cached(session_id)
+        if messages is None:
+            messages = await asyncio.get_running_loop().run_in_executor(None, self._load_and_cache, session_id)
+        return messages
+
+    # Llamar con self._lock: la sesión cambió, las lecturas en curso no deben guardarse en la caché
+    def _touch(self, session_id: str):
+        if session_id in self._loading:
+            self._versions[session_id] = self._versions.get(session_id, 0) + 1
+
+    # --- escritura diferida ---
+
+    def add_messages(self, session_id: str, messages: Sequence[BaseMessage]):
+        rows = [(session_id, json.dumps(message_to_dict(message))) for message in messages]
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("Chat history store is closed")
+            cached = self._cache.get(session_id)
+            if cached is not None:
+                cached.extend(messages)
+                self._cache.move_to_end(session_id)
+            self._touch(session_id)
+            self._pending.extend(rows)
+            self._start_writer()
+            self._wakeup.notify()
+
+    def _start_writer(self):
+        if self._writer is None:
+            self._writer = threading.Thread(target=self._write_loop, name="chat-history-writer", daemon=True)
+            self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            with self._lock:
+                if not self._pending and not self._closed:
+                    self._wakeup.wait()
+                if self._closed and not self._pending:
+                    return
+            # Dar tiempo a que se acumulen más mensajes antes de escribir
+            if not self._closed:
+                time.sleep(self.flush_interval)
+            try:
+                self.flush()
+            except Exception:
+                logger.exception("Could not write chat history; retrying")
+                # Al cerrar, close() hace el último intento y propaga el error
+                if self._closed:
+                    return
+                time.sleep(self.flush_interval)
+
+    # Insertar todas las filas pendientes en una transacción
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                rows, self._pending = self._pending, []
+            if not rows:
+                return
+            try:
+                self._ensure_schema()
+                with self.engine.begin() as connection:
+                    connection.execute(
+                        self.table.insert(),
+                        [{"session_id": session_id, "message": message} for session_id, message in rows],
+                    )
+            except Exception:
+                # Devolver las filas a la cola, delante de las nuevas, para no perder ni desordenar mensajes
+                with self._lock:
+                    self._pending[:0] = rows
+                raise
+
+    def clear(self, session_id: str):
+        self.flush()
+        self._ensure_schema()
+        with self.engine.begin() as connection:
+            connection.execute(self.table.delete().where(self.table.c.session_id == session_id))
+        with self._lock:
+            self._cache.pop(session_id, None)
+            self._touch(session_id)
+
+    # Escribir lo pendiente y parar el hilo de escritura (al apagar el servidor)
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify()
+            writer = self._writer
+        if writer is not None:
+            writer.join()
+        self.flush()
+        self.engine.dispose()
+
+
+class PooledChatMessageHistory(BaseChatMessageHistory):
+    def __init__(self, store: ChatHistoryStore, session_id: str):
+        self.store = store
+        self.session_id = session_id
+
+    @property
+    def messages(self) -> List[BaseMessage]:  # type: ignore
+        return self.store.get_messages(self.session_id)
+
+    async def aget_messages(self) -> List[BaseMessage]:
+        return await self.store.aget_messages(self.session_id)
+
+    def add_message(self, message: BaseMessage) -> None:
+        self.store.add_messages(self.session_id, [message])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        self.store.add_messages(self.session_id, messages)
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        # Solo encola: no hay E/S en el event loop
+        self.store.add_messages(self.session_id, messages)
+
+    def clear(self) -> None:
+        self.store.clear(self.session_id)
@@ -0,0 +1,163 @@
+# context_packing.py
+# Selección del contexto del prompt de respuesta con un presupuesto de tokens
+#
+# Las variantes de multi-query recuperan chunks que se solapan y el prompt
+# recibía la lista completa de Documents (con su repr y metadatos). ContextPacker:
+# -- descarta los chunks repetidos (mismo texto, por hash) y los casi iguales
+#    (similitud de Jaccard entre sus n-gramas de palabras)
+# -- ordena los chunks por puntuación (rerank_score, si no rrf_score)
+# -- los añade en ese orden mientras quepan en el presupuesto de tokens, contados
+#    con tiktoken en local
+# -- format() deja en el prompt solo el texto de cada chunk
+# -- stats() acumula los tokens enviados y los ahorrados
+
+import hashlib
+import re
+import threading
+from dataclasses import dataclass, field
+from typing import List
+
+import tiktoken
+from langchain_core.documents import Document
+
+# Tokens máximos de contexto en el prompt de respuesta
+DEFAULT_MAX_TOKENS = 3000
+
+# Similitud de Jaccard a partir de la cual dos chunks se consideran el mismo
+DEFAULT_SIMILARITY_THRESHOLD = 0.8
+
+# Palabras por n-grama para comparar chunks
+SHINGLE_SIZE = 3
+
+# Separador entre chunks en el prompt
+SEPARATOR = "\n\n"
+
+
+@dataclass
+class PackedContext:
+    docs: List[Document]
+    tokens: int
+    # Tokens de todos los chunks recuperados menos los enviados
+    tokens_saved: int
+    duplicates: int = 0
+    # Chunks que no cupieron en el presupuesto
+    dropped: int = 0
+    token_counts: List[int] = field(default_factory=list)
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _shingles(text: str) -> frozenset:
+    words = re.findall(r"\w+", text.lower())
+    if len(words) <= SHINGLE_SIZE:
+        return frozenset([" ".join(words)])
+    return frozenset(" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1))
+
+
+def _jaccard(a: frozenset, b: frozenset) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+# Puntuación de un chunk: la del reranker si la hay, si no la de la fusión RRF
+def document_score(doc: Document) -> float:
+    for key in ("rerank_score", "rrf_score"):
+        if key in doc.metadata:
+            return float(doc.metadata[key])
+    return 0.0
+
+
+class ContextPacker:
+    def __init__(self, max_tokens: int = DEFAULT_MAX_TOKENS, similarity_threshold: float = DEFAULT_SIMILARITY_THRESHOLD,
+                 model_name: str = "gpt-4"):
+        self.max_tokens = max_tokens
+        self.similarity_threshold = similarity_threshold
+        self.model_name = model_name
+        self._encoding = None
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.tokens_sent = 0
+        self.tokens_saved = 0
+
+    # El tokenizador se carga la primera vez que hace falta (tiktoken puede descargar su vocabulario)
+    @property
+    def encoding(self):
+        if self._encoding is None:
+            self._encoding = tiktoken.encoding_for_model(self.model_name)
+        return self._encoding
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    # Quitar duplicados, ordenar por puntuación y llenar el presupuesto de tokens
+    def pack(self, docs: List[Document]) -> PackedContext:
+        counts = [self.count_tokens(doc.page_content) for doc in docs]
+        retrieved_tokens = sum(counts)
+
+        # sorted es estable: a igual puntuación se mantiene el orden de la recuperación
+        order = sorted(range(len(docs)), key=lambda i: document_score(docs[i]), reverse=True)
+        seen_hashes = set()
+        kept_shingles = []
+        unique = []
+        duplicates = 0
+        for i in order:
+            digest = hashlib.sha256(_normalize(docs[i].page_content).encode()).digest()
+            shingles = _shingles(docs[i].page_content)
+            if digest in seen_hashes or any(_jaccard(shingles, other) >= self.similarity_threshold for other in kept_shingles):
+                duplicates += 1
+                continue
+            seen_hashes.add(digest)
+            kept_shingles.append(shingles)
+            unique.append(i)
+
+        # Greedy: cada chunk entra si cabe en lo que queda; uno grande no impide que entren otros más pequeños
+        packed, packed_counts, tokens = [], [], 0
+        for i in unique:
+            cost = counts[i] + (self.count_tokens(SEPARATOR) if packed else 0)
+            if tokens + cost <= self.max_tokens:
+                packed.append(docs[i])
+                packed_counts.append(counts[i])
+                tokens += cost
+        # Si ni el mejor chunk cabe, se envía recortado
+        if not packed and unique:
+            best = docs[unique[0]]
+            text = self.encoding.decode(self.encoding.encode(best.page_content)[:self.max_tokens])
+            packed = [Document(page_content=text, metadata=dict(best.metadata, truncated=True))]
+            tokens = self.count_tokens(text)
+            packed_counts = [tokens]
+
+        result = PackedContext(
+            docs=packed,
+            tokens=tokens,
+            tokens_saved=max(0, retrieved_tokens - tokens),
+            duplicates=duplicates,
+            dropped=len(unique) - len(packed),
+            token_counts=packed_counts,
+        )
+        with self._lock:
+            self.requests += 1
+            self.tokens_sent += result.tokens
+            self.tokens_saved += result.tokens_saved
+        return result
+
+    # Para usar en cadenas: solo los documentos seleccionados
+    def pack_documents(self, docs: List[Document]) -> List[Document]:
+        return self.pack(docs).docs
+
+    # Texto del contexto para el prompt
+    @staticmethod
+    def format(docs: List[Document]) -> str:
+        return SEPARATOR.join(doc.page_content for doc in docs)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "max_tokens": self.max_tokens,
+                "tokens_sent": self.tokens_sent,
+                "tokens_saved": self.tokens_saved,
+                "avg_tokens_sent": self.tokens_sent / self.requests if self.requests else 0.0,
+            }
@@ -0,0 +1,158 @@
+# embedding_cache.py
+# Caché de embeddings direccionada por contenido, compartida por el loader y la cadena RAG
+#
+# CachedEmbeddings envuelve cualquier Embeddings de LangChain (OpenAIEmbeddings):
+# -- la clave es el hash SHA-256 de modelo + texto, así un texto ya vectorizado
+#    no se vuelve a pagar aunque lo pida otro proceso (servidor o script de carga)
+# -- los vectores se guardan en SQLite (modo WAL) como float32
+# -- las búsquedas se hacen por lotes y solo los textos que faltan van a la API
+# -- cuando se supera el máximo de entradas se expulsan las menos usadas
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from array import array
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+# Ruta por defecto: .cache/embeddings.sqlite3 en la raíz del proyecto
+DEFAULT_CACHE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".cache", "embeddings.sqlite3")
+
+# Número máximo de vectores guardados (~6 KB cada uno con 1536 dimensiones)
+DEFAULT_MAX_ENTRIES = 500_000
+
+# Claves por consulta SQL (SQLite limita el número de parámetros)
+LOOKUP_BATCH_SIZE = 500
+
+# Inserciones entre comprobaciones del tamaño de la caché (COUNT(*) recorre la tabla)
+EVICTION_CHECK_INTERVAL = 1000
+
+
+class CachedEmbeddings(Embeddings):
+    def __init__(self, embeddings: Embeddings, path: str = DEFAULT_CACHE_PATH, max_entries: int = DEFAULT_MAX_ENTRIES, namespace: str = None):
+        self.embeddings = embeddings
+        self.path = path
+        self.max_entries = max_entries
+        # El modelo forma parte de la clave para que vectores de modelos distintos no se mezclen
+        self.namespace = namespace if namespace is not None else getattr(embeddings, "model", "")
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        # Se comprueba el tamaño en la primera inserción
+        self._inserts_since_check = EVICTION_CHECK_INTERVAL
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, last_used REAL NOT NULL)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS embeddings_last_used ON embeddings (last_used)")
+
+    # Una conexión por hilo; WAL permite que el servidor y el loader lean y escriban a la vez
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _key(self, text: str) -> str:
+        return hashlib.sha256(f"{self.namespace}\0{text}".encode()).hexdigest()
+
+    # Buscar un lote de claves; devuelve {clave: vector} con las encontradas
+    def _lookup(self, keys):
+        found = {}
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            for start in range(0, len(keys), LOOKUP_BATCH_SIZE):
+                batch = keys[start:start + LOOKUP_BATCH_SIZE]
+                placeholders = ",".join("?" * len(batch))
+                rows = connection.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    found[key] = array("f", blob).tolist()
+                if rows:
+                    connection.execute(
+                        f"UPDATE embeddings SET last_used = ? WHERE key IN ({','.join('?' * len(rows))})",
+                        [now] + [key for key, _ in rows],
+                    )
+        return found
+
+    def _store(self, items):
+        connection = self._connection()
+        now = time.time()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, last_used) VALUES (?, ?, ?)",
+                [(key, array("f", vector).tobytes(), now) for key, vector in items],
+            )
+        with self._stats_lock:
+            self._inserts_since_check += len(items)
+            check = self._inserts_since_check >= EVICTION_CHECK_INTERVAL
+            if check:
+                self._inserts_since_check = 0
+        if check:
+            self._evict()
+
+    # Expulsar los vectores menos usados cuando se supera el máximo
+    def _evict(self):
+        connection = self._connection()
+        with connection:
+            (count,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                connection.execute(
+                    "DELETE FROM embeddings WHERE key IN "
+                    "(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def _count(self, hits: int, misses: int):
+        with self._stats_lock:
+            self.hits += hits
+            self.misses += misses
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key(text) for text in texts]
+        found = self._lookup(list(dict.fromkeys(keys)))
+
+        # Vectorizar solo los textos que faltan, cada uno una sola vez
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        if missing:
+            vectors = self.embeddings.embed_documents(list(missing.values()))
+            new_items = list(zip(missing.keys(), vectors))
+            self._store(new_items)
+            found.update(new_items)
+
+        self._count(len(texts) - len(missing), len(missing))
+        return [found[key] for key in keys]
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key(text)
+        found = self._lookup([key])
+        if key in found:
+            self._count(1, 0)
+            return found[key]
+        vector = self.embeddings.embed_query(text)
+        self._store([(key, vector)])
+        self._count(0, 1)
+        return vector
+
+    def stats(self):
+        with self._stats_lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / total if total else 0.0,
+            }
@@ -0,0 +1,119 @@
+# hybrid.py
+# Búsqueda por palabras clave (full-text de Postgres) y reranking para la recuperación híbrida
+#
+# La búsqueda densa de PGVector falla con términos exactos (códigos de producto,
+# nombres propios). PostgresKeywordSearch busca esos términos en los mismos chunks
+# de langchain_pg_embedding, en una columna tsvector generada a partir de document
+# (con un índice GIN), así se mantiene al día con la indexación incremental sin un
+# índice aparte.
+# FusionMultiQueryRetriever (multi_query.py) combina su ranking con los de las
+# búsquedas vectoriales mediante RRF y, opcionalmente, reordena los primeros
+# resultados con un cross-encoder local (CrossEncoderReranker).
+
+import json
+import re
+from typing import List, Optional
+
+import sqlalchemy
+from langchain_core.documents import Document
+
+# Configuración de text search; 'english' quita las stopwords ("the", "of", "a"...)
+# que coinciden con casi todos los chunks y aplica stemming. Los códigos y nombres se
+# conservan (en minúsculas). Para documentos en otro idioma, TEXT_SEARCH_CONFIG=spanish...
+DEFAULT_TEXT_SEARCH_CONFIG = "english"
+
+# Modelo por defecto del reranker (pequeño, corre en CPU)
+DEFAULT_RERANKER_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+# El nombre de la configuración se escribe en el SQL (debe coincidir con el del índice)
+def _check_config(config: str) -> str:
+    if not re.fullmatch(r"\w+", config):
+        raise ValueError(f"Invalid text search configuration: {config!r}")
+    return config
+
+
+# Columna tsvector de una configuración (una por configuración, así cambiarla no
+# deja chunks indexados con la anterior)
+def keyword_column(config: str = DEFAULT_TEXT_SEARCH_CONFIG) -> str:
+    return f"document_tsv_{_check_config(config)}"
+
+
+# Crear la columna tsvector generada y su índice GIN (lo llama el loader; es idempotente).
+# Añadir la columna reescribe langchain_pg_embedding una vez; después Postgres la
+# calcula al insertar cada chunk y las búsquedas no vuelven a analizar los documentos.
+def ensure_keyword_index(engine, config: str = DEFAULT_TEXT_SEARCH_CONFIG):
+    column = keyword_column(config)
+    with engine.begin() as connection:
+        connection.execute(sqlalchemy.text(
+            f"ALTER TABLE langchain_pg_embedding ADD COLUMN IF NOT EXISTS {column} tsvector "
+            f"GENERATED ALWAYS AS (to_tsvector('{config}'::regconfig, coalesce(document, ''))) STORED"
+        ))
+        connection.execute(sqlalchemy.text(
+            f"CREATE INDEX IF NOT EXISTS ix_langchain_pg_embedding_{column} ON langchain_pg_embedding USING gin ({column})"
+        ))
+
+
+class PostgresKeywordSearch:
+    def __init__(self, connection_string: str, collection_name: str, config: str = DEFAULT_TEXT_SEARCH_CONFIG, **engine_args):
+        engine_args.setdefault("pool_pre_ping", True)
+        self.engine = sqlalchemy.create_engine(connection_string, **engine_args)
+        self.collection_name = collection_name
+        self.config = config = _check_config(config)
+        column = keyword_column(config)
+        # La pregunta se convierte en un OR de sus lexemas sin stopwords ('warranti' | 'x-200' ...):
+        # websearch_to_tsquery exige todas las palabras y una pregunta en lenguaje natural casi
+        # nunca coincide entera con un chunk. ts_rank_cd ordena por las palabras que coinciden,
+        # leyendo la columna guardada. Una pregunta solo con stopwords no devuelve nada.
+        self._query = sqlalchemy.text(
+            f"""
+            SELECT e.document, e.cmetadata, ts_rank_cd(e.{column}, q) AS rank
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid,
+                 (SELECT string_agg(quote_literal(lexeme), ' | ')::tsquery AS q
+                  FROM unnest(tsvector_to_array(to_tsvector('{config}'::regconfig, :query))) AS lexeme) terms
+            WHERE c.name = :collection
+              AND e.{column} @@ q
+            ORDER BY rank DESC
+            LIMIT :k
+            """
+        )
+
+    # Documentos que contienen los términos de la pregunta, del más al menos relevante
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        with self.engine.connect() as connection:
+            rows = connection.execute(self._query, {"query": query, "collection": self.collection_name, "k": k}).fetchall()
+        docs = []
+        for document, metadata, rank in rows:
+            if isinstance(metadata, str):
+                metadata = json.loads(metadata)
+            docs.append(Document(page_content=document or "", metadata=dict(metadata or {}, keyword_rank=rank)))
+        return docs
+
+
+class CrossEncoderReranker:
+    def __init__(self, model_name: str = DEFAULT_RERANKER_MODEL, max_candidates: int = 20):
+        try:
+            from sentence_transformers import CrossEncoder
+        except ImportError:
+            raise ImportError(
+                "CrossEncoderReranker needs the sentence-transformers package: "
+                "pip install sentence-transformers"
+            )
+        self.model = CrossEncoder(model_name)
+        # Solo se puntúan los primeros candidatos de la fusión
+        self.max_candidates = max_candidates
+
+    # Reordenar los documentos por relevancia para la pregunta; cada uno lleva metadata["rerank_score"]
+    def rerank(self, question: str, docs: List[Document], top_n: Optional[int] = None) -> List[Document]:
+        candidates = docs[:self.max_candidates]
+        if not candidates:
+            return []
+        scores = self.model.predict([(question, doc.page_content) for doc in candidates])
+        ranked = sorted(zip(candidates, scores), key=lambda pair: pair[1], reverse=True)
+        if top_n is not None:
+            ranked = ranked[:top_n]
+        return [
+            Document(page_content=doc.page_content, metadata=dict(doc.metadata, rerank_score=float(score)))
+            for doc, score in ranked
+        ]
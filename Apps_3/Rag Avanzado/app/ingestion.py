@@ -0,0 +1,149 @@
+# ingestion.py
+# Trabajos de ingesta de PDFs en segundo plano para el servidor FastAPI
+#
+# Cada trabajo ejecuta rag-data-loader/rag_load_and_process.py en un subproceso
+# asíncrono, así el event loop sigue atendiendo /rag mientras se reindexa.
+# Los trabajos tienen un ID, su progreso se puede consultar y el número de
+# ingestas simultáneas está limitado por un semáforo.
+
+import asyncio
+import json
+import os
+import sys
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, field
+from typing import Optional
+
+# Ruta por defecto del script de carga
+LOADER_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag-data-loader", "rag_load_and_process.py")
+
+# Mismo prefijo que usa el script para sus líneas de progreso
+PROGRESS_PREFIX = "PROGRESS "
+
+# Caracteres de stderr que se guardan para explicar un fallo
+ERROR_TAIL_CHARS = 4000
+
+# Longitud máxima de una línea de stdout del script
+STDOUT_LINE_LIMIT = 2 ** 20
+
+
+# Últimas líneas de stderr, sin las actualizaciones de las barras de progreso
+def _error_message(stderr_tail: str, max_lines: int = 20) -> str:
+    lines = [line for line in stderr_tail.replace("\r", "\n").splitlines() if line.strip()]
+    return "\n".join(lines[-max_lines:])
+
+
+@dataclass
+class IngestionJob:
+    id: str
+    # Vaciar la colección y reindexar todo en lugar de la indexación incremental
+    rebuild: bool = False
+    status: str = "queued"  # queued | running | succeeded | failed
+    stage: Optional[str] = None
+    done: int = 0
+    total: int = 0
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def finished(self):
+        return self.status in ("succeeded", "failed")
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class IngestionJobManager:
+    def __init__(self, pdf_directory: str, script_path: str = LOADER_SCRIPT, max_concurrency: int = 1, max_jobs: int = 100):
+        self.pdf_directory = pdf_directory
+        self.script_path = script_path
+        # Número máximo de trabajos terminados que se recuerdan
+        self.max_jobs = max_jobs
+        self._jobs = OrderedDict()
+        # Limita las ingestas simultáneas; el resto queda en estado "queued"
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        # Referencias a las tareas para que no las recoja el garbage collector
+        self._tasks = set()
+
+    # Crear un trabajo y lanzarlo en segundo plano; devuelve inmediatamente
+    def submit(self, rebuild: bool = False) -> IngestionJob:
+        job = IngestionJob(id=uuid.uuid4().hex, rebuild=rebuild)
+        self._jobs[job.id] = job
+        self._forget_old_jobs()
+        task = asyncio.get_running_loop().create_task(self._run(job))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        return self._jobs.get(job_id)
+
+    def list(self):
+        return list(self._jobs.values())
+
+    # Olvidar los trabajos terminados más antiguos
+    def _forget_old_jobs(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.finished]
+        for job_id in finished[:max(0, len(self._jobs) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def _command(self, job: IngestionJob):
+        command = [sys.executable, self.script_path, "--pdf-directory", self.pdf_directory]
+        if job.rebuild:
+            command.append("--rebuild")
+        return command
+
+    async def _run(self, job: IngestionJob):
+        async with self._semaphore:
+            job.status = "running"
+            job.started_at = time.time()
+            try:
+                process = await asyncio.create_subprocess_exec(
+                    *self._command(job),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                    limit=STDOUT_LINE_LIMIT,
+                )
+                # Leer stdout y stderr a la vez para que ningún pipe se llene y bloquee al hijo
+                _, stderr_tail = await asyncio.gather(
+                    self._read_progress(job, process.stdout),
+                    self._read_tail(process.stderr),
+                )
+                returncode = await process.wait()
+            except Exception as e:
+                job.status = "failed"
+                job.error = f"Failed to execute script: {e}"
+            else:
+                if returncode == 0:
+                    job.status = "succeeded"
+                else:
+                    job.status = "failed"
+                    job.error = _error_message(stderr_tail) or f"Script exited with status {returncode}"
+            job.finished_at = time.time()
+
+    # Actualizar el trabajo con las líneas "PROGRESS {json}" del script
+    async def _read_progress(self, job: IngestionJob, stream: asyncio.StreamReader):
+        async for raw_line in stream:
+            line = raw_line.decode(errors="replace").strip()
+            if not line.startswith(PROGRESS_PREFIX):
+                continue
+            try:
+                progress = json.loads(line[len(PROGRESS_PREFIX):])
+            except ValueError:
+                continue
+            job.stage = progress.get("stage", job.stage)
+            job.done = progress.get("done", 0)
+            job.total = progress.get("total", 0)
+
+    # Consumir stderr (tqdm escribe mucho) guardando solo el final
+    async def _read_tail(self, stream: asyncio.StreamReader) -> str:
+        tail = ""
+        while True:
+            chunk = await stream.read(4096)
+            if not chunk:
+                return tail
+            tail = (tail + chunk.decode(errors="replace"))[-ERROR_TAIL_CHARS:]
@@ -0,0 +1,180 @@
+# metrics.py
+# Métricas de Prometheus de la cadena RAG (endpoint /metrics del servidor)
+#
+# -- MetricsCallbackHandler: callback de LangChain que mide las etapas con nombre
+#    de final_chain (reformulación, variantes, recuperación, selección del
+#    contexto, generación, petición completa) y cuenta los tokens de cada LLM.
+#    Solo se añade a una fracción de las peticiones (METRICS_SAMPLE_RATE), así el
+#    coste por token de los callbacks no afecta a las demás.
+# -- observe_search: duración de cada búsqueda en PGVector y por palabras clave
+#    (la llama FusionMultiQueryRetriever; es barata y se registra siempre)
+# -- /rag/sse ya mide sus etapas con StageTimer: rag_stream.py las registra con
+#    observe_stage en todas las peticiones y el callback solo cuenta tokens
+# -- StatsCollector: aciertos/fallos de las cachés y tokens de contexto ahorrados,
+#    leídos de sus stats() en cada scrape, sin coste por petición
+#
+# Las métricas son por proceso: con varios workers de uvicorn, cada uno expone las suyas.
+
+import random
+import time
+from typing import Any, Callable, Dict, List, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.messages import BaseMessage, get_buffer_string
+from langchain_core.outputs import LLMResult
+from prometheus_client import REGISTRY, Counter, Histogram
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Hasta 80 s: la generación con GPT-4 puede tardar bastante más que el resto
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+# Nombre del run en LangChain (ver rag_chain.py) -> etapa; la cadena raíz (sin padre) es "request"
+STAGE_RUN_NAMES = {
+    "rewrite": "rewrite",
+    "query_generation": "query_generation",
+    "multiquery": "retrieval",
+    "context_packing": "context_packing",
+    "generation": "generation",
+}
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds", "Duration of each stage of the RAG chain", ["stage"], buckets=LATENCY_BUCKETS,
+)
+SEARCH_SECONDS = Histogram(
+    "rag_search_duration_seconds", "Duration of each vector or keyword search", ["kind"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter("rag_llm_tokens_total", "LLM tokens in sampled requests", ["model", "type"])
+SAMPLED_REQUESTS = Counter("rag_sampled_requests_total", "Requests traced by MetricsCallbackHandler")
+
+
+def observe_stage(stage: str, seconds: float):
+    STAGE_SECONDS.labels(stage).observe(seconds)
+
+
+def observe_search(kind: str, seconds: float):
+    SEARCH_SECONDS.labels(kind).observe(seconds)
+
+
+class MetricsCallbackHandler(BaseCallbackHandler):
+    # Se ejecuta en el mismo hilo/event loop que la cadena (solo actualiza contadores)
+    run_inline = True
+
+    def __init__(self, count_tokens: Optional[Callable[[str], int]] = None, track_stages: bool = True):
+        # Para estimar los tokens del prompt si el modelo no los informa (streaming)
+        self.count_tokens = count_tokens
+        # False si las etapas se miden por otra vía (rag_stream.py) y solo interesan los tokens
+        self.track_stages = track_stages
+        # run_id -> (etapa, inicio)
+        self._stages = {}
+        # run_id -> [modelo, prompt, tokens generados]
+        self._llm_runs = {}
+
+    # --- etapas ---
+
+    def _start(self, run_id: UUID, parent_run_id: Optional[UUID], name: Optional[str]):
+        if not self.track_stages:
+            return
+        stage = "request" if parent_run_id is None else STAGE_RUN_NAMES.get(name)
+        if stage is not None:
+            if stage == "request":
+                SAMPLED_REQUESTS.inc()
+            self._stages[run_id] = (stage, time.perf_counter())
+
+    def _end(self, run_id: UUID):
+        started = self._stages.pop(run_id, None)
+        if started is not None:
+            observe_stage(started[0], time.perf_counter() - started[1])
+
+    def on_chain_start(self, serialized: Dict[str, Any], inputs: Dict[str, Any], *, run_id: UUID,
+                       parent_run_id: Optional[UUID] = None, name: Optional[str] = None, **kwargs: Any) -> None:
+        self._start(run_id, parent_run_id, name or (serialized or {}).get("name"))
+
+    def on_chain_end(self, outputs: Dict[str, Any], *, run_id: UUID, **kwargs: Any) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._stages.pop(run_id, None)
+
+    # --- tokens ---
+
+    def on_chat_model_start(self, serialized: Dict[str, Any], messages: List[List[BaseMessage]], *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_start(run_id, [get_buffer_string(m) for m in messages], kwargs)
+
+    def on_llm_start(self, serialized: Dict[str, Any], prompts: List[str], *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_start(run_id, prompts, kwargs)
+
+    def _llm_start(self, run_id: UUID, prompts: List[str], kwargs: Dict[str, Any]):
+        params = kwargs.get("invocation_params") or {}
+        model = params.get("model") or params.get("model_name") or params.get("_type") or "unknown"
+        self._llm_runs[run_id] = [model, prompts, 0]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._llm_runs.get(run_id)
+        if run is not None:
+            run[2] += 1
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs: Any) -> None:
+        run = self._llm_runs.pop(run_id, None)
+        if run is None:
+            return
+        model, prompts, streamed = run
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        prompt_tokens = usage.get("prompt_tokens")
+        if prompt_tokens is None and self.count_tokens is not None:
+            prompt_tokens = sum(self.count_tokens(prompt) for prompt in prompts)
+        # En streaming cada fragmento es aproximadamente un token
+        completion_tokens = usage.get("completion_tokens", streamed)
+        if prompt_tokens:
+            LLM_TOKENS.labels(model, "prompt").inc(prompt_tokens)
+        if completion_tokens:
+            LLM_TOKENS.labels(model, "completion").inc(completion_tokens)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._llm_runs.pop(run_id, None)
+
+
+# Callbacks para una petición: el handler de métricas con probabilidad `sample_rate`
+def sampled_callbacks(sample_rate: float, count_tokens: Optional[Callable[[str], int]] = None, track_stages: bool = True) -> list:
+    if sample_rate > 0 and random.random() < sample_rate:
+        return [MetricsCallbackHandler(count_tokens, track_stages=track_stages)]
+    return []
+
+
+class StatsCollector:
+    # sources: nombre -> función que devuelve stats() del componente, o None si aún no existe
+    def __init__(self, caches: Dict[str, Callable[[], Optional[dict]]], context: Callable[[], Optional[dict]]):
+        self.caches = caches
+        self.context = context
+
+    def collect(self):
+        hits = CounterMetricFamily("rag_cache_hits", "Cache hits", labels=["cache"])
+        misses = CounterMetricFamily("rag_cache_misses", "Cache misses", labels=["cache"])
+        hit_rate = GaugeMetricFamily("rag_cache_hit_rate", "Cache hit rate since start", labels=["cache"])
+        for name, source in self.caches.items():
+            stats = source()
+            if stats is None:
+                continue
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            hit_rate.add_metric([name], stats["hit_rate"])
+        yield hits
+        yield misses
+        yield hit_rate
+
+        stats = self.context()
+        if stats is not None:
+            yield CounterMetricFamily("rag_context_tokens_sent", "Context tokens sent to the answer prompt", value=stats["tokens_sent"])
+            yield CounterMetricFamily("rag_context_tokens_saved", "Retrieved tokens left out of the answer prompt", value=stats["tokens_saved"])
+
+
+_collector = None
+
+
+# Registrar (o sustituir) el colector de estadísticas en el registro por defecto
+def register_stats_collector(collector: StatsCollector, registry=REGISTRY):
+    global _collector
+    if _collector is not None:
+        registry.unregister(_collector)
+    registry.register(collector)
+    _collector = collector
@@ -0,0 +1,210 @@
+# multi_query.py
+# Recuperador multi-query con búsquedas en paralelo, caché de variantes y fusión RRF
+#
+# Sustituye a MultiQueryRetriever, que busca las variantes de una en una y
+# devuelve su unión sin ordenar:
+# -- las variantes generadas por el LLM se guardan por pregunta normalizada
+#    (LRU), así una pregunta repetida no vuelve a llamar al LLM
+# -- todas las variantes se vectorizan en una sola llamada a embed_documents
+# -- las búsquedas en PGVector se lanzan a la vez en un pool de hilos
+# -- los resultados se combinan con reciprocal-rank fusion (RRF): un chunk que
+#    aparece arriba en varias búsquedas queda por delante de uno que aparece en una
+# -- con keyword_search, la pregunta original también se busca por palabras clave
+#    (hybrid.py) y ese ranking entra en la fusión; con reranker, los primeros
+#    resultados se reordenan con un cross-encoder antes de cortar en top_n
+
+import asyncio
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List, Optional
+
+from langchain.retrievers.multi_query import DEFAULT_QUERY_PROMPT
+from langchain_core.callbacks import AsyncCallbackManagerForRetrieverRun, CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.language_models import BaseLanguageModel
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import BasePromptTemplate
+from langchain_core.pydantic_v1 import PrivateAttr
+from langchain_core.retrievers import BaseRetriever
+
+# Constante de RRF; 60 es el valor habitual (Cormack et al., 2009)
+DEFAULT_RRF_K = 60
+
+
+# Pregunta normalizada para la caché: minúsculas y espacios colapsados
+def normalize_question(question: str) -> str:
+    return re.sub(r"\s+", " ", question).strip().lower()
+
+
+# Una variante por línea, sin líneas vacías
+def parse_queries(text: str) -> List[str]:
+    return [line.strip() for line in text.strip().split("\n") if line.strip()]
+
+
+# Clave de un documento para la fusión: el mismo chunk devuelto por varias búsquedas cuenta una vez
+def document_key(doc: Document):
+    return doc.metadata.get("source"), doc.page_content
+
+
+# Reciprocal-rank fusion de varias listas de documentos ordenadas.
+# Cada documento devuelto lleva su puntuación en metadata["rrf_score"].
+def reciprocal_rank_fusion(rankings: List[List[Document]], k: int = DEFAULT_RRF_K, top_n: Optional[int] = None) -> List[Document]:
+    scores = {}
+    docs = {}
+    for ranking in rankings:
+        for rank, doc in enumerate(ranking):
+            key = document_key(doc)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank + 1)
+            docs.setdefault(key, doc)
+    fused = sorted(scores, key=scores.get, reverse=True)
+    if top_n is not None:
+        fused = fused[:top_n]
+    return [
+        Document(page_content=docs[key].page_content, metadata=dict(docs[key].metadata, rrf_score=scores[key]))
+        for key in fused
+    ]
+
+
+class FusionMultiQueryRetriever(BaseRetriever):
+    vector_store: Any
+    # prompt | llm | texto; la salida tiene una variante por línea
+    query_chain: Any
+    # Documentos por variante
+    k: int = 4
+    # Documentos devueltos tras la fusión (None: todos los distintos)
+    top_n: Optional[int] = None
+    rrf_k: int = DEFAULT_RRF_K
+    # Buscar también la pregunta original además de las variantes
+    include_original: bool = False
+    max_cached_questions: int = 1024
+    max_concurrency: int = 8
+    # Búsqueda por palabras clave (PostgresKeywordSearch) y documentos que devuelve
+    keyword_search: Any = None
+    keyword_k: int = 4
+    # Reordenación de los resultados fusionados (CrossEncoderReranker)
+    reranker: Any = None
+    # Función (tipo, segundos) a la que se informa de la duración de cada búsqueda ("vector" o "keyword")
+    search_observer: Any = None
+
+    _queries_cache: OrderedDict = PrivateAttr(default_factory=OrderedDict)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _executor: Any = PrivateAttr(default=None)
+
+    @classmethod
+    def from_llm(cls, vector_store: Any, llm: BaseLanguageModel, prompt: BasePromptTemplate = DEFAULT_QUERY_PROMPT, **kwargs) -> "FusionMultiQueryRetriever":
+        query_chain = (prompt | llm | StrOutputParser()).with_config(run_name="query_generation")
+        return cls(vector_store=vector_store, query_chain=query_chain, **kwargs)
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="multi-query")
+            return self._executor
+
+    def _cached_queries(self, question: str):
+        key = normalize_question(question)
+        with self._lock:
+            queries = self._queries_cache.get(key)
+            if queries is not None:
+                self._queries_cache.move_to_end(key)
+            return queries
+
+    def _remember_queries(self, question: str, queries: List[str]):
+        key = normalize_question(question)
+        with self._lock:
+            self._queries_cache[key] = queries
+            self._queries_cache.move_to_end(key)
+            while len(self._queries_cache) > self.max_cached_questions:
+                self._queries_cache.popitem(last=False)
+
+    def _with_original(self, question: str, queries: List[str]) -> List[str]:
+        if self.include_original and question not in queries:
+            return queries + [question]
+        return queries
+
+    # Variantes de la pregunta generadas por el LLM (o de la caché)
+    def generate_queries(self, question: str, callbacks=None) -> List[str]:
+        queries = self._cached_queries(question)
+        if queries is None:
+            queries = parse_queries(self.query_chain.invoke({"question": question}, config={"callbacks": callbacks}))
+            self._remember_queries(question, queries)
+        return self._with_original(question, queries)
+
+    async def agenerate_queries(self, question: str, callbacks=None) -> List[str]:
+        queries = self._cached_queries(question)
+        if queries is None:
+            queries = parse_queries(await self.query_chain.ainvoke({"question": question}, config={"callbacks": callbacks}))
+            self._remember_queries(question, queries)
+        return self._with_original(question, queries)
+
+    def _observe(self, kind: str, start: float):
+        if self.search_observer is not None:
+            self.search_observer(kind, time.perf_counter() - start)
+
+    def _search(self, embedding: List[float]) -> List[Document]:
+        start = time.perf_counter()
+        docs = self.vector_store.similarity_search_by_vector(embedding, k=self.k)
+        self._observe("vector", start)
+        return docs
+
+    def _keyword_search(self, question: str) -> List[Document]:
+        start = time.perf_counter()
+        docs = self.keyword_search.search(question, k=self.keyword_k)
+        self._observe("keyword", start)
+        return docs
+
+    # Buscar todas las variantes: una llamada de embeddings y las búsquedas en paralelo,
+    # más la búsqueda por palabras clave de la pregunta original si está configurada.
+    # Devuelve una lista ordenada de documentos por búsqueda.
+    def search(self, queries: List[str], question: Optional[str] = None) -> List[List[Document]]:
+        pool = self._pool()
+        keyword = None
+        if self.keyword_search is not None and question:
+            keyword = pool.submit(self._keyword_search, question)
+        rankings = []
+        if queries:
+            embeddings = self.vector_store.embeddings.embed_documents(queries)
+            rankings = list(pool.map(self._search, embeddings))
+        if keyword is not None:
+            rankings.append(keyword.result())
+        return rankings
+
+    async def asearch(self, queries: List[str], question: Optional[str] = None) -> List[List[Document]]:
+        loop = asyncio.get_running_loop()
+        pool = self._pool()
+        keyword = None
+        if self.keyword_search is not None and question:
+            keyword = loop.run_in_executor(pool, self._keyword_search, question)
+        rankings = []
+        if queries:
+            embeddings = await self.vector_store.embeddings.aembed_documents(queries)
+            rankings = list(await asyncio.gather(*(
+                loop.run_in_executor(pool, self._search, embedding) for embedding in embeddings
+            )))
+        if keyword is not None:
+            rankings.append(await keyword)
+        return rankings
+
+    # Fusión RRF y, si hay reranker, reordenación por relevancia para la pregunta
+    def fuse(self, rankings: List[List[Document]], question: Optional[str] = None) -> List[Document]:
+        if self.reranker is None or not question:
+            return reciprocal_rank_fusion(rankings, k=self.rrf_k, top_n=self.top_n)
+        fused = reciprocal_rank_fusion(rankings, k=self.rrf_k)
+        return self.reranker.rerank(question, fused, top_n=self.top_n)
+
+    async def afuse(self, rankings: List[List[Document]], question: Optional[str] = None) -> List[Document]:
+        if self.reranker is None:
+            return self.fuse(rankings, question)
+        # El cross-encoder usa CPU: fuera del event loop
+        return await asyncio.get_running_loop().run_in_executor(self._pool(), self.fuse, rankings, question)
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        queries = self.generate_queries(query, callbacks=run_manager.get_child())
+        return self.fuse(self.search(queries, query), query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager: AsyncCallbackManagerForRetrieverRun) -> List[Document]:
+        queries = await self.agenerate_queries(query, callbacks=run_manager.get_child())
+        return await self.afuse(await self.asearch(queries, query), query)
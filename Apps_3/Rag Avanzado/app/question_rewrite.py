@@ -0,0 +1,74 @@
+# question_rewrite.py
+# Decidir si una pregunta necesita reformularse con el historial antes de buscar
+#
+# La reformulación es una llamada completa al LLM. No hace falta:
+# -- en el primer turno (no hay historial)
+# -- si la pregunta no depende de la conversación: no tiene pronombres,
+#    demostrativos ni expresiones que remitan a turnos anteriores ("y eso?",
+#    "the second one", "más detalles"). Se comprueba con una heurística local
+#    para español e inglés, sin llamar a ningún modelo.
+# Ante la duda (preguntas muy cortas, palabras de referencia) se reformula.
+#
+# La caché de respuestas se comparte entre sesiones: con historial solo se usa con la
+# pregunta reformulada, nunca con una pregunta que se dio por independiente sin serlo.
+
+import re
+from typing import Sequence
+
+from langchain_core.messages import BaseMessage
+
+# Preguntas con menos palabras se reformulan siempre ("¿y el precio?", "why?")
+MIN_SELF_CONTAINED_WORDS = 4
+
+# Palabras que remiten a algo dicho antes (sin lo/la/los/las, que casi siempre son
+# artículos). "más", "more" y los verbos de ampliar o comparar también se cuentan:
+# "dame más detalles", "compare the methods" continúan la respuesta anterior.
+REFERENCE_WORDS = frozenset("""
+    it its it's itself this that these those they them their theirs he him his she her hers
+    there then former latter above previous previously aforementioned same such other another
+    one ones also too else again further
+    esto eso aquello este esta estos estas ese esa esos esas aquel aquella aquellos aquellas
+    él ella ello ellos ellas le les su sus suyo suya suyos suyas
+    anterior anteriores previo previa mencionado mencionada dicho dicha mismo misma mismos mismas
+    también tampoco otro otra otros otras entonces
+    more detail details elaborate expand continue compare comparison
+    más detalle detalles amplía amplia ampliar continúa continua continuar sigue seguir compara comparar comparación
+""".split())
+
+# Comienzos que continúan la pregunta anterior ("and what about...", "y en 2020?")
+CONTINUATION_STARTS = ("and ", "what about", "how about", "but ", "so ", "y ", "e ", "pero ", "entonces ", "qué hay de", "que hay de")
+
+# Pronombres pegados al verbo en español: "explícamelo", "compáralos", "dime más sobre ello"
+ENCLITIC_PATTERN = re.compile(r"\w{3,}(?:lo|la|los|las|le|les)$")
+ENCLITIC_VERBS = re.compile(r"^(?:expl[ií]ca|compara|resume|res[uú]me|dime|descr[ií]be|detalla|ampl[ií]a|traduce|muestra|mu[eé]stra)")
+
+
+def _words(question: str):
+    return re.findall(r"[\w']+", question.lower())
+
+
+# True si la pregunta parece depender de la conversación anterior
+def has_reference(question: str) -> bool:
+    text = question.strip().lower().lstrip("¿¡")
+    words = _words(text)
+    if len(words) < MIN_SELF_CONTAINED_WORDS:
+        return True
+    if text.startswith(CONTINUATION_STARTS):
+        return True
+    for word in words:
+        if word in REFERENCE_WORDS:
+            return True
+        if ENCLITIC_VERBS.match(word) and ENCLITIC_PATTERN.match(word):
+            return True
+    return False
+
+
+# Reformular solo si hay historial y la pregunta remite a él
+def needs_rewrite(question: str, chat_history: Sequence[BaseMessage]) -> bool:
+    return bool(chat_history) and has_reference(question)
+
+
+# La caché de respuestas (compartida entre sesiones) solo admite preguntas sin historial
+# o reformuladas con él
+def can_share_answer(question: str, chat_history: Sequence[BaseMessage]) -> bool:
+    return not chat_history or needs_rewrite(question, chat_history)
@@ -0,0 +1,170 @@
+# rag_stream.py
+# Versión por etapas de final_chain para el endpoint SSE /rag/sse
+#
+# final_chain (LangServe /rag/stream) no envía nada hasta que terminan la
+# reformulación de la pregunta y toda la recuperación. Aquí se ejecutan las
+# mismas etapas una a una para:
+# -- enviar los documentos fuente en cuanto termina la recuperación
+# -- enviar los tokens de la respuesta a medida que los genera el LLM
+# -- medir cada etapa (reformulación, multi-query, búsqueda vectorial, selección del contexto, primer token)
+
+import asyncio
+import time
+from typing import AsyncIterator, Tuple
+
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.output_parsers import StrOutputParser
+
+from app.chat_history import history_for_prompt
+from app.metrics import observe_stage
+from app.question_rewrite import can_share_answer, needs_rewrite
+from app.rag_chain import (
+    ANSWER_PROMPT,
+    MAX_PROMPT_HISTORY_CHARS,
+    MAX_PROMPT_HISTORY_MESSAGES,
+    get_answer_cache,
+    get_context_packer,
+    get_llm,
+    get_multiquery,
+    get_rewrite_llm,
+    get_session_history,
+    lazy,
+    metrics_callbacks,
+    standalone_question_prompt,
+)
+
+standalone_question_chain = standalone_question_prompt | lazy(get_rewrite_llm) | StrOutputParser()
+answer_chain = ANSWER_PROMPT | lazy(get_llm)
+
+
+# Componentes de la cadena; la primera vez se crean (y conectan) fuera del event loop
+def _components():
+    return get_answer_cache(), get_multiquery(), get_context_packer()
+
+
+# Cronómetro de etapas en milisegundos
+class StageTimer:
+    def __init__(self):
+        self.start = time.perf_counter()
+        self._last = self.start
+        self.timings = {}
+
+    # Guardar el tiempo transcurrido desde la etapa anterior
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.timings[f"{stage}_ms"] = round((now - self._last) * 1000, 1)
+        self._last = now
+
+    # Guardar el tiempo transcurrido desde el inicio de la petición
+    def mark(self, name: str):
+        self.timings[f"{name}_ms"] = round((time.perf_counter() - self.start) * 1000, 1)
+
+
+# Segundos de cada etapa de una petición a partir de sus tiempos, con las mismas
+# etapas que mide MetricsCallbackHandler en final_chain
+def stage_seconds(timings: dict) -> dict:
+    def seconds(*stages):
+        return sum(timings.get(f"{stage}_ms", 0) for stage in stages) / 1000
+
+    stages = {}
+    if not timings.get("rewrite_skipped"):
+        stages["rewrite"] = seconds("rewrite")
+    stages["cache_lookup"] = seconds("cache_lookup")
+    if not timings.get("cache_hit"):
+        stages["query_generation"] = seconds("multi_query")
+        stages["retrieval"] = seconds("multi_query", "vector_search", "fusion")
+        stages["context_packing"] = seconds("context_packing")
+        stages["generation"] = seconds("generation")
+    if "first_token_ms" in timings:
+        stages["first_token"] = seconds("first_token")
+    stages["request"] = seconds("total")
+    return stages
+
+
+# Registrar los tiempos de una petición en las métricas de Prometheus
+def observe_timings(timings: dict):
+    for stage, seconds in stage_seconds(timings).items():
+        observe_stage(stage, seconds)
+
+
+# Ejecutar la cadena RAG por etapas.
+# Genera pares (evento, datos): "data" con {"docs": [...]} o {"answer": {"content": ...}}
+# (el mismo formato que /rag/stream) y al final "timings" con la duración de cada etapa.
+async def astream_rag(question: str, session_id: str) -> AsyncIterator[Tuple[str, dict]]:
+    timer = StageTimer()
+    answer_cache, multiquery, context_packer = await asyncio.get_running_loop().run_in_executor(None, _components)
+    # Los tiempos de las etapas se registran siempre (StageTimer); el callback solo cuenta tokens
+    config = {"callbacks": metrics_callbacks(track_stages=False)}
+    history = get_session_history(session_id)
+    chat_history = await history.aget_messages()
+    timer.lap("history")
+
+    # 1. Reformular la pregunta de seguimiento como pregunta independiente (solo si remite al historial)
+    rewrite = needs_rewrite(question, chat_history)
+    if rewrite:
+        standalone_question = await standalone_question_chain.ainvoke({
+            "question": question,
+            "chat_history": history_for_prompt(chat_history, MAX_PROMPT_HISTORY_MESSAGES, MAX_PROMPT_HISTORY_CHARS),
+        }, config)
+    else:
+        standalone_question = question
+    timer.lap("rewrite")
+    timer.timings["rewrite_skipped"] = not rewrite
+
+    # Respuesta de la caché semántica si la pregunta ya se respondió con el mismo corpus
+    # (compartida entre sesiones: no se usa con preguntas de seguimiento sin reformular)
+    shared = can_share_answer(question, chat_history)
+    cached = corpus_version = None
+    if shared:
+        # Versión del corpus antes de buscar: la respuesta que se genere se guarda con ella
+        corpus_version = await asyncio.get_running_loop().run_in_executor(None, answer_cache.corpus_version)
+        cached = await answer_cache.alookup(standalone_question)
+    timer.lap("cache_lookup")
+    timer.timings["cache_hit"] = cached is not None
+    if cached is not None:
+        yield "data", {"docs": [doc.dict() for doc in cached.docs]}
+        timer.mark("first_token")
+        yield "data", {"answer": {"content": cached.answer}}
+        await history.aadd_messages([HumanMessage(content=question), AIMessage(content=cached.answer)])
+        timer.lap("save_history")
+        timer.mark("total")
+        observe_timings(timer.timings)
+        yield "timings", timer.timings
+        return
+
+    # 2. Generar las variantes de la pregunta y 3. buscarlas en el vector store y por palabras clave
+    #    (en paralelo, fusión RRF y reranking opcional)
+    queries = await multiquery.agenerate_queries(standalone_question, callbacks=config["callbacks"])
+    timer.lap("multi_query")
+    rankings = await multiquery.asearch(queries, standalone_question)
+    timer.lap("vector_search")
+    docs = await multiquery.afuse(rankings, standalone_question)
+    timer.lap("fusion")
+
+    # Quitar duplicados y quedarse con lo que cabe en el presupuesto de tokens
+    packed = context_packer.pack(docs)
+    docs = packed.docs
+    timer.lap("context_packing")
+    timer.timings["context_tokens"] = packed.tokens
+    timer.timings["context_tokens_saved"] = packed.tokens_saved
+
+    # Enviar las fuentes antes de empezar a generar la respuesta
+    yield "data", {"docs": [doc.dict() for doc in docs]}
+
+    # 4. Generar la respuesta token a token
+    answer = ""
+    async for chunk in answer_chain.astream({"context": context_packer.format(docs), "question": standalone_question}, config):
+        if not answer:
+            timer.mark("first_token")
+        answer += chunk.content
+        yield "data", {"answer": {"content": chunk.content}}
+    timer.lap("generation")
+    if shared:
+        await answer_cache.astore(standalone_question, answer, docs, corpus_version)
+
+    # Guardar el turno en el historial, igual que RunnableWithMessageHistory
+    await history.aadd_messages([HumanMessage(content=question), AIMessage(content=answer)])
+    timer.lap("save_history")
+    timer.mark("total")
+    observe_timings(timer.timings)
+    yield "timings", timer.timings
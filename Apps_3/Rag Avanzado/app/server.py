@@ -1,15 +1,30 @@
 # server.py
 # Servidor FastAPI para exponer la API de RAG, carga de PDFs y procesamiento
 
-from fastapi import FastAPI, File, UploadFile, HTTPException
-from fastapi.responses import RedirectResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, RedirectResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from langserve import add_routes
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+from pydantic import BaseModel
+from sse_starlette.sse import EventSourceResponse
+from starlette.concurrency import run_in_threadpool
 from starlette.staticfiles import StaticFiles
+import json
 import os
-import shutil
-import subprocess
-from app.rag_chain import final_chain
+from app.ingestion import IngestionJobManager
+from app.metrics import StatsCollector, register_stats_collector
+from app.rag_chain import (
+    check_readiness,
+    final_chain,
+    get_answer_cache,
+    get_chat_history_store,
+    get_context_packer,
+    get_embeddings,
+    metrics_callbacks,
+)
+from app.rag_stream import astream_rag
+from app.uploads import FileTooLarge, UploadStore
 
 # Inicialización de la app FastAPI
 app = FastAPI()
@@ -35,30 +50,139 @@ async def redirect_root_to_docs():
 
 pdf_directory = "./pdf-documents"
 
-# Endpoint para subir uno o varios archivos PDF
-@app.post("/upload")
-async def upload_files(files: list[UploadFile] = File(...)):
-    for file in files:
-        try:
-            file_path = os.path.join(pdf_directory, file.filename)
-            with open(file_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-        except Exception as e:
-            raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
-    
-    return {"message": "Files uploaded successfully", "filenames": [file.filename for file in files]}
+# Gestor de trabajos de ingesta en segundo plano (una ingesta a la vez)
+ingestion_jobs = IngestionJobManager(pdf_directory=os.path.abspath(pdf_directory))
 
-# Endpoint para procesar los PDFs y cargarlos en la base de datos/vector store
-@app.post("/load-and-process-pdfs")
-async def load_and_process_pdfs():
+# Guardado de las subidas por bloques, con límite de tamaño y deduplicación por hash
+upload_store = UploadStore(pdf_directory=os.path.abspath(pdf_directory))
+
+# Formulario de /upload para la documentación (el cuerpo se lee a mano, ver UploadStore.save_request)
+UPLOAD_REQUEST_BODY = {
+    "required": True,
+    "content": {"multipart/form-data": {"schema": {
+        "type": "object",
+        "required": ["files"],
+        "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+    }}},
+}
+
+# Endpoint para subir uno o varios archivos PDF (campo "files")
+# Los archivos se guardan a medida que llegan y la subida se corta en cuanto pasa del límite.
+# Con index=true se lanza la indexación incremental en cuanto terminan de guardarse
+@app.post("/upload", openapi_extra={"requestBody": UPLOAD_REQUEST_BODY})
+async def upload_files(request: Request, index: bool = False):
     try:
-        subprocess.run(["python", "./rag-data-loader/rag_load_and_process.py"], check=True)
-        return {"message": "PDFs loaded and processed successfully"}
-    except subprocess.CalledProcessError as e:
-        return {"error": "Failed to execute script"}
+        stored = await upload_store.save_request(request.headers, request.stream())
+    except FileTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Could not save file: {e}")
+
+    saved = [f.filename for f in stored if f.duplicate_of is None]
+    response = {
+        "message": "Files uploaded successfully",
+        "filenames": saved,
+        "duplicates": [{"filename": f.filename, "duplicate_of": f.duplicate_of} for f in stored if f.duplicate_of is not None],
+    }
+    if index and saved:
+        response["job_id"] = ingestion_jobs.submit().id
+    return response
+
+# Endpoint para procesar los PDFs y cargarlos en la base de datos/vector store
+# La ingesta se lanza en segundo plano y se responde enseguida con el ID del trabajo.
+# Por defecto solo se indexan los PDFs nuevos o modificados; rebuild=true reindexa todo.
+@app.post("/load-and-process-pdfs", status_code=202)
+async def load_and_process_pdfs(rebuild: bool = False):
+    job = ingestion_jobs.submit(rebuild=rebuild)
+    return {"message": "PDF processing started", "job_id": job.id, "status": job.status}
+
+# Listado de los trabajos de ingesta recientes
+@app.get("/load-and-process-pdfs")
+async def list_ingestion_jobs():
+    return [job.to_dict() for job in ingestion_jobs.list()]
+
+# Estado y progreso de un trabajo de ingesta
+@app.get("/load-and-process-pdfs/{job_id}")
+async def get_ingestion_job(job_id: str):
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict()
+
+# Estadísticas de las cachés (respuestas semánticas y embeddings) y de los tokens de contexto ahorrados
+@app.get("/cache/stats")
+async def cache_stats():
+    return {"answers": get_answer_cache().stats(), "embeddings": get_embeddings().stats(), "context": get_context_packer().stats()}
+
+# Liveness: el proceso responde (no toca bases de datos ni modelos)
+@app.get("/healthz")
+async def healthz():
+    return {"status": "ok"}
+
+# Readiness: crea los componentes de la cadena RAG la primera vez (conexiones, modelos)
+# y comprueba las bases de datos; 503 mientras alguno falle
+@app.get("/readyz")
+async def readyz():
+    checks = await run_in_threadpool(check_readiness)
+    ready = all(result == "ok" for result in checks.values())
+    return JSONResponse(
+        status_code=200 if ready else 503,
+        content={"status": "ready" if ready else "not ready", "checks": checks},
+    )
+
+# Estadísticas de un componente perezoso, sin crearlo si aún no se ha usado
+def _stats_if_created(factory):
+    return factory().stats() if factory.cache_info().currsize else None
+
+# Cachés y tokens de contexto en /metrics, leídos en cada scrape
+register_stats_collector(StatsCollector(
+    caches={
+        "answers": lambda: _stats_if_created(get_answer_cache),
+        "embeddings": lambda: _stats_if_created(get_embeddings),
+    },
+    context=lambda: _stats_if_created(get_context_packer),
+))
+
+# Métricas de Prometheus: latencia por etapa y por búsqueda, tokens y cachés
+@app.get("/metrics")
+def metrics():
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+# Al apagar, escribir los mensajes de chat pendientes (si el historial llegó a usarse)
+@app.on_event("shutdown")
+def close_chat_history():
+    if get_chat_history_store.cache_info().currsize:
+        get_chat_history_store().close()
+
+# Añadir el callback de métricas a una muestra de las peticiones de /rag
+def add_metrics_callbacks(config, request):
+    callbacks = metrics_callbacks()
+    if callbacks:
+        config = dict(config, callbacks=list(config.get("callbacks") or []) + callbacks)
+    return config
 
 # Añadir la cadena RAG como endpoint en /rag
-add_routes(app, final_chain, path="/rag")
+add_routes(app, final_chain, path="/rag", per_req_config_modifier=add_metrics_callbacks)
+
+class RagStreamRequest(BaseModel):
+    question: str
+    session_id: str
+
+# Endpoint SSE por etapas: envía las fuentes en cuanto termina la recuperación,
+# después los tokens de la respuesta y al final los tiempos de cada etapa
+@app.post("/rag/sse")
+async def rag_sse(request: RagStreamRequest):
+    async def events():
+        try:
+            async for event, data in astream_rag(request.question, request.session_id):
+                yield {"event": event, "data": json.dumps(data, default=str)}
+        except Exception as e:
+            yield {"event": "error", "data": json.dumps({"status_code": 500, "message": str(e)})}
+        yield {"event": "end"}
+
+    return EventSourceResponse(events())
 
 # Ejecución directa para desarrollo
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+# uploads.py
+# Guardado de PDFs subidos por bloques, sin bloquear el event loop
+#
+# -- el cuerpo multipart de la petición se procesa a medida que llega
+#    (save_request): cada archivo se escribe en bloques directamente en la carpeta,
+#    sin pasar por el archivo temporal del parser de formularios de Starlette; las
+#    escrituras en disco se hacen en el pool de hilos, así una subida grande no
+#    congela el servidor
+# -- el tamaño de la petición se comprueba con Content-Length antes de leerla, y el
+#    de cada archivo y el de la petición mientras se reciben: una subida demasiado
+#    grande se corta en cuanto pasa del límite
+# -- se calcula el SHA-256 del contenido; si ya hay un PDF idéntico en la carpeta,
+#    la copia se descarta
+# -- el archivo se escribe con un nombre temporal y se renombra al terminar, así el
+#    loader nunca ve un PDF a medias
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from dataclasses import dataclass
+from typing import AsyncIterator, List, Mapping, Optional
+
+from starlette.concurrency import run_in_threadpool
+from starlette.formparsers import multipart, parse_options_header
+
+# Tamaño de los bloques de lectura al calcular el hash de un PDF
+CHUNK_SIZE = 1 << 20
+
+# Tamaño máximo por archivo y por petición (varios archivos)
+DEFAULT_MAX_FILE_SIZE = 100 * (1 << 20)
+DEFAULT_MAX_REQUEST_SIZE = 10 * DEFAULT_MAX_FILE_SIZE
+
+# Campo del formulario con los archivos
+UPLOAD_FIELD = "files"
+
+# Manifiesto del loader, para no recalcular el hash de los PDFs ya indexados
+DEFAULT_MANIFEST_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag-data-loader", "index-manifest.json")
+
+
+class FileTooLarge(Exception):
+    pass
+
+
+@dataclass
+class StoredFile:
+    filename: str
+    sha256: str
+    size: int
+    # Nombre del PDF idéntico que ya existía (None si el archivo es nuevo)
+    duplicate_of: Optional[str] = None
+
+
+# Archivo que se está recibiendo: se escribe con un nombre temporal en la carpeta de destino
+class _IncomingFile:
+    def __init__(self, directory: str, filename: str, max_size: int):
+        self.filename = filename
+        self.max_size = max_size
+        fd, self.tmp_path = tempfile.mkstemp(dir=directory, prefix=".upload-", suffix=".part")
+        self.buffer = os.fdopen(fd, "wb")
+        self.digest = hashlib.sha256()
+        self.size = 0
+
+    async def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            raise FileTooLarge(f"{self.filename} is larger than {self.max_size} bytes")
+        self.digest.update(chunk)
+        await run_in_threadpool(self.buffer.write, chunk)
+
+    def discard(self):
+        self.buffer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+
+class UploadStore:
+    def __init__(self, pdf_directory: str, max_file_size: int = DEFAULT_MAX_FILE_SIZE, manifest_path: str = DEFAULT_MANIFEST_PATH,
+                 max_request_size: int = DEFAULT_MAX_REQUEST_SIZE):
+        self.pdf_directory = pdf_directory
+        self.max_file_size = max_file_size
+        self.max_request_size = max_request_size
+        self.manifest_path = manifest_path
+        self._lock = threading.Lock()
+        # sha256 -> nombre del archivo; se construye la primera vez que hace falta
+        self._hashes = None
+
+    # Hash de los PDFs que ya están en la carpeta (se reutiliza el del manifiesto si el archivo no cambió)
+    def _known_hashes(self):
+        with self._lock:
+            if self._hashes is not None:
+                return self._hashes
+        try:
+            with open(self.manifest_path) as f:
+                indexed = json.load(f).get("files", {})
+        except (OSError, ValueError):
+            indexed = {}
+        hashes = {}
+        for entry in os.scandir(self.pdf_directory):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            stat = entry.stat()
+            previous = indexed.get(entry.name)
+            if previous and previous.get("size") == stat.st_size and previous.get("mtime") == stat.st_mtime:
+                hashes[previous["sha256"]] = entry.name
+            else:
+                hashes[_file_sha256(entry.path)] = entry.name
+        with self._lock:
+            if self._hashes is None:
+                self._hashes = hashes
+            return self._hashes
+
+    # Solo el nombre, sin rutas, para no escribir fuera de la carpeta
+    @staticmethod
+    def _check_filename(filename: Optional[str]) -> str:
+        name = os.path.basename(filename or "")
+        if not name or name.startswith("."):
+            raise ValueError(f"Invalid filename: {filename!r}")
+        return name
+
+    # Mover el archivo recibido a su nombre definitivo, o descartarlo si ya hay un PDF idéntico
+    def _commit(self, incoming: _IncomingFile, known_hashes) -> StoredFile:
+        incoming.buffer.close()
+        sha256 = incoming.digest.hexdigest()
+        with self._lock:
+            existing = known_hashes.get(sha256)
+            if existing is not None and os.path.exists(os.path.join(self.pdf_directory, existing)):
+                os.remove(incoming.tmp_path)
+                return StoredFile(incoming.filename, sha256, incoming.size, duplicate_of=existing)
+            # Un archivo con el mismo nombre se sustituye: olvidar su hash anterior
+            for old_hash, old_name in list(known_hashes.items()):
+                if old_name == incoming.filename:
+                    del known_hashes[old_hash]
+            os.replace(incoming.tmp_path, os.path.join(self.pdf_directory, incoming.filename))
+            known_hashes[sha256] = incoming.filename
+        return StoredFile(incoming.filename, sha256, incoming.size)
+
+    # Guardar los archivos de una petición multipart/form-data (campo "files") a medida que
+    # llegan sus bloques (request.headers, request.stream()). Lanza FileTooLarge en cuanto
+    # un archivo o la petición pasan del límite, sin leer el resto del cuerpo, y ValueError
+    # si la petición no es un formulario con archivos.
+    async def save_request(self, headers: Mapping[str, str], stream: AsyncIterator[bytes]) -> List[StoredFile]:
+        length = headers.get("content-length")
+        if length is not None and length.isdigit() and int(length) > self.max_request_size:
+            raise FileTooLarge(f"Request is larger than {self.max_request_size} bytes")
+        content_type, params = parse_options_header(headers.get("content-type"))
+        if content_type != b"multipart/form-data" or b"boundary" not in params:
+            raise ValueError("Expected a multipart/form-data request")
+
+        # Los callbacks del parser son síncronos: anotan los eventos y se procesan
+        # (con escrituras asíncronas) después de cada bloque
+        events = []
+        header = {"field": b"", "value": b"", "disposition": b""}
+
+        def on_header_field(data, start, end):
+            header["field"] += data[start:end]
+
+        def on_header_value(data, start, end):
+            header["value"] += data[start:end]
+
+        def on_header_end():
+            if header["field"].lower() == b"content-disposition":
+                header["disposition"] = header["value"]
+            header["field"] = header["value"] = b""
+
+        def on_headers_finished():
+            events.append(("headers", header["disposition"]))
+            header["disposition"] = b""
+
+        parser = multipart.MultipartParser(params[b"boundary"], {
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": lambda data, start, end: events.append(("data", data[start:end])),
+            "on_part_end": lambda: events.append(("end", None)),
+        })
+
+        known_hashes = await run_in_threadpool(self._known_hashes)
+        stored = []
+        incoming = None
+        received = 0
+        try:
+            async for chunk in stream:
+                received += len(chunk)
+                if received > self.max_request_size:
+                    raise FileTooLarge(f"Request is larger than {self.max_request_size} bytes")
+                parser.write(chunk)
+                for event, data in events:
+                    if event == "headers":
+                        _, options = parse_options_header(data)
+                        # Los campos que no son archivos se ignoran
+                        if options.get(b"name") == UPLOAD_FIELD.encode() and b"filename" in options:
+                            filename = self._check_filename(options[b"filename"].decode("utf-8", "replace"))
+                            incoming = _IncomingFile(self.pdf_directory, filename, self.max_file_size)
+                    elif event == "data" and incoming is not None:
+                        await incoming.write(data)
+                    elif event == "end" and incoming is not None:
+                        stored.append(self._commit(incoming, known_hashes))
+                        incoming = None
+                events.clear()
+            parser.finalize()
+        except BaseException:
+            if incoming is not None:
+                incoming.discard()
+            raise
+        if incoming is not None:
+            # El cuerpo terminó a mitad de un archivo
+            incoming.discard()
+            raise ValueError(f"Incomplete upload of {incoming.filename}")
+        if not stored:
+            raise ValueError(f"No files in the {UPLOAD_FIELD!r} field")
+        return stored
+
+
+def _file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(CHUNK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,153 @@
+# vector_index.py
+# Índices aproximados (ANN) de pgvector para la colección de PGVector
+#
+# Sin índice, cada búsqueda recorre todos los vectores de langchain_pg_embedding
+# (la latencia crece linealmente con el corpus). Aquí se gestionan:
+# -- HNSW (m, ef_construction al construir; hnsw.ef_search al buscar)
+# -- IVFFlat (lists al construir; ivfflat.probes al buscar)
+# El loader crea o actualiza el índice tras indexar (nunca se hace en una petición)
+# y la cadena RAG pasa los parámetros de búsqueda a cada conexión de PGVector
+# (ann_search_engine_args).
+#
+# PGVector crea la columna embedding sin dimensión y la tabla la comparten todas
+# las colecciones, que pueden tener dimensiones distintas. En lugar de cambiar el
+# tipo de la columna (reescribir y bloquear la tabla), cada colección tiene su
+# índice parcial sobre la expresión embedding::vector(N) con
+# WHERE collection_id = '<uuid>'; IndexedPGVector busca con esa misma expresión
+# para que Postgres use el índice, que además solo contiene la colección.
+
+import math
+import re
+from typing import Optional
+
+import sqlalchemy
+from langchain_community.vectorstores.pgvector import PGVector
+
+TABLE_NAME = "langchain_pg_embedding"
+
+# Prefijo de los índices ANN gestionados aquí; el nombre incluye la colección y los parámetros
+INDEX_PREFIX = "ix_ann_"
+
+# Dimensiones de text-embedding-ada-002
+DEFAULT_DIMENSIONS = 1536
+
+# Clase de operadores según la estrategia de distancia de PGVector
+OPERATOR_CLASSES = {
+    "cosine": "vector_cosine_ops",
+    "l2": "vector_l2_ops",
+    "inner": "vector_ip_ops",
+}
+
+
+# Prefijo de los índices de una colección (los nombres de Postgres tienen como máximo 63 caracteres)
+def collection_prefix(collection_id) -> str:
+    return f"{INDEX_PREFIX}{str(collection_id).replace('-', '')[:12]}_"
+
+
+# Nombre del índice a partir de la colección, su tipo y parámetros, p. ej. ix_ann_<uuid>_hnsw_cosine_d1536_m16_efc64
+def index_name(collection_id, kind: str, distance: str = "cosine", dimensions: int = DEFAULT_DIMENSIONS, m: int = 16,
+               ef_construction: int = 64, lists: Optional[int] = None) -> str:
+    prefix = f"{collection_prefix(collection_id)}{kind}_{distance}_d{dimensions}"
+    if kind == "hnsw":
+        return f"{prefix}_m{m}_efc{ef_construction}"
+    if kind == "ivfflat":
+        return f"{prefix}_lists{lists}"
+    raise ValueError(f"Unknown ANN index type: {kind!r}")
+
+
+# Número de listas recomendado por pgvector: filas/1000 hasta 1M filas, sqrt(filas) a partir de ahí
+def recommended_lists(rows: int) -> int:
+    if rows <= 1_000_000:
+        return max(1, rows // 1000)
+    return int(math.sqrt(rows))
+
+
+# Índices ANN de una colección
+def _existing_indexes(connection, collection_id):
+    rows = connection.execute(
+        sqlalchemy.text("SELECT indexname FROM pg_indexes WHERE tablename = :table AND indexname LIKE :prefix"),
+        {"table": TABLE_NAME, "prefix": collection_prefix(collection_id).replace("_", r"\_") + "%"},
+    ).fetchall()
+    return [row.indexname for row in rows]
+
+
+def _collection_id(connection, collection_name: str):
+    collection_id = connection.execute(
+        sqlalchemy.text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"), {"name": collection_name},
+    ).scalar()
+    if collection_id is None:
+        raise ValueError(f"Collection not found: {collection_name!r}")
+    # Se escribe en el SQL del índice
+    if not re.fullmatch(r"[0-9a-fA-F-]+", str(collection_id)):
+        raise ValueError(f"Invalid collection id: {collection_id!r}")
+    return collection_id
+
+
+# Crear el índice ANN pedido para la colección (si no existe ya con los mismos parámetros)
+# y borrar los demás de esa colección; los de otras colecciones no se tocan.
+# kind: "hnsw", "ivfflat" o "none" (borra los índices y vuelve a la búsqueda exacta).
+# Devuelve el nombre del índice o None.
+def ensure_ann_index(engine, collection_name: str, kind: str = "hnsw", distance: str = "cosine",
+                     dimensions: int = DEFAULT_DIMENSIONS, m: int = 16, ef_construction: int = 64,
+                     lists: Optional[int] = None) -> Optional[str]:
+    if distance not in OPERATOR_CLASSES:
+        raise ValueError(f"Unknown distance: {distance!r}")
+    # CREATE/DROP INDEX CONCURRENTLY no puede ir dentro de una transacción
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        collection_id = _collection_id(connection, collection_name)
+        existing = _existing_indexes(connection, collection_id)
+        name = None
+        if kind != "none":
+            if kind == "ivfflat" and lists is None:
+                rows = connection.execute(
+                    sqlalchemy.text(f"SELECT count(*) FROM {TABLE_NAME} WHERE collection_id = :collection"),
+                    {"collection": collection_id},
+                ).scalar()
+                lists = recommended_lists(rows)
+            name = index_name(collection_id, kind, distance, dimensions=int(dimensions), m=m,
+                              ef_construction=ef_construction, lists=lists)
+            if name not in existing:
+                if kind == "hnsw":
+                    options = f"WITH (m = {int(m)}, ef_construction = {int(ef_construction)})"
+                else:
+                    options = f"WITH (lists = {int(lists)})"
+                # CONCURRENTLY: las búsquedas y las escrituras siguen funcionando mientras se construye
+                connection.execute(sqlalchemy.text(
+                    f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON {TABLE_NAME} "
+                    f"USING {kind} ((embedding::vector({int(dimensions)})) {OPERATOR_CLASSES[distance]}) {options} "
+                    f"WHERE collection_id = '{collection_id}'"
+                ))
+        for old_name in existing:
+            if old_name != name and re.fullmatch(r"\w+", old_name):
+                connection.execute(sqlalchemy.text(f"DROP INDEX CONCURRENTLY IF EXISTS {old_name}"))
+    return name
+
+
+# PGVector que calcula las distancias sobre embedding::vector(dimensions), la expresión
+# de los índices de ensure_ann_index (con la columna sin dimensión, Postgres no los usaría)
+class IndexedPGVector(PGVector):
+    def __init__(self, *args, dimensions: int = DEFAULT_DIMENSIONS, **kwargs):
+        self.dimensions = dimensions
+        super().__init__(*args, **kwargs)
+
+    @property
+    def distance_strategy(self):
+        from pgvector.sqlalchemy import Vector
+
+        # embedding.cosine_distance, embedding.l2_distance... de la columna
+        column_strategy = super().distance_strategy
+        embedding = sqlalchemy.cast(self.EmbeddingStore.embedding, Vector(self.dimensions))
+        return getattr(embedding, column_strategy.__name__)
+
+
+# Parámetros de búsqueda para cada conexión, en el formato de engine_args de PGVector.
+# ef_search (HNSW) y probes (IVFFlat) cambian precisión por latencia.
+def ann_search_engine_args(ef_search: Optional[int] = None, probes: Optional[int] = None) -> dict:
+    settings = []
+    if ef_search is not None:
+        settings.append(f"-c hnsw.ef_search={int(ef_search)}")
+    if probes is not None:
+        settings.append(f"-c ivfflat.probes={int(probes)}")
+    if not settings:
+        return {}
+    return {"connect_args": {"options": " ".join(settings)}}
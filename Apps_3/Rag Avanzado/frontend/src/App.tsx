@@ -58,25 +58,21 @@ function App() {
   const handleSendMessage = async (message: string) => {
     setInputValue("")
     setMessages(prevMessages => [...prevMessages, {message, isUser: true}]);
-    await fetchEventSource(`http://localhost:8000/rag/stream`, {
+    await fetchEventSource(`http://localhost:8000/rag/sse`, {
       method: 'POST',
       openWhenHidden: true,
       headers: {
         'Content-Type': 'application/json',
       },
       body: JSON.stringify({
-        input: {
-          question: message,
-        },
-        config: {
-          configurable: {
-            sessionId: sessionIdRef.current
-          }
-        }
+        question: message,
+        session_id: sessionIdRef.current
       }),
       onmessage(event) {
         if (event.event === "data") {
           handleReceiveMessage(event.data);
+        } else if (event.event === "timings") {
+          console.log('RAG timings (ms):', JSON.parse(event.data));
         }
       },
     })
@@ -118,16 +114,27 @@ function App() {
     }
   };
 
-  // Llama al endpoint para procesar e indexar los PDFs
+  // Llama al endpoint para procesar e indexar los PDFs y consulta el progreso del trabajo
   const loadAndProcessPDFs = async () => {
     try {
       const response = await fetch('http://localhost:8000/load-and-process-pdfs', {
         method: 'POST',
       });
-      if (response.ok) {
+      if (!response.ok) {
+        console.error('Failed to load and process PDFs');
+        return;
+      }
+      const {job_id} = await response.json();
+      let job;
+      do {
+        await new Promise(resolve => setTimeout(resolve, 2000));
+        job = await (await fetch(`http://localhost:8000/load-and-process-pdfs/${job_id}`)).json();
+        console.log(`PDF processing: ${job.status} ${job.stage ?? ''} ${job.done}/${job.total}`);
+      } while (job.status === 'queued' || job.status === 'running');
+      if (job.status === 'succeeded') {
         console.log('PDFs loaded and processed successfully');
       } else {
-        console.error('Failed to load and process PDFs');
+        console.error('Failed to load and process PDFs', job.error);
       }
     } catch (error) {
       console.error('Error:', error);
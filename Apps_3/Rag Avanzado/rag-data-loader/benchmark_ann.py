@@ -0,0 +1,123 @@
+# benchmark_ann.py
+# Benchmark de recall y latencia del índice aproximado de vectores (HNSW/IVFFlat)
+#
+# Uso:
+#   python rag-data-loader/benchmark_ann.py [--queries 100] [--k 4] [--ef-search 10 20 40 80] [--probes 1 5 10]
+#
+# Toma como consultas embeddings ya guardados en la colección, calcula los k
+# vecinos exactos (búsqueda secuencial, sin índice) y los compara con los del
+# índice para cada valor de hnsw.ef_search / ivfflat.probes. Para cada valor
+# informa del recall@k y de la latencia p50/p95, y con ello se elige el valor de
+# HNSW_EF_SEARCH o IVFFLAT_PROBES que usa el servidor (app/rag_chain.py).
+
+import argparse
+import statistics
+import sys
+import time
+
+import sqlalchemy
+
+from rag_load_and_process import COLLECTION_NAME, CONNECTION_STRING
+# rag_load_and_process añade la raíz del proyecto al path
+from app.settings import get_settings
+from app.vector_index import collection_prefix
+
+# Misma consulta que hace IndexedPGVector con la distancia coseno (la expresión del índice)
+DIMENSIONS = int(get_settings().embedding_dimensions)
+SEARCH_QUERY = sqlalchemy.text(
+    "SELECT uuid FROM langchain_pg_embedding "
+    "WHERE collection_id = :collection_id "
+    f"ORDER BY embedding::vector({DIMENSIONS}) <=> CAST(:vector AS vector({DIMENSIONS})) "
+    "LIMIT :k"
+)
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def collection_id(connection):
+    row = connection.execute(
+        sqlalchemy.text("SELECT uuid FROM langchain_pg_collection WHERE name = :name"),
+        {"name": COLLECTION_NAME},
+    ).first()
+    if row is None:
+        raise SystemExit(f"Collection {COLLECTION_NAME!r} not found; run rag_load_and_process.py first")
+    return row.uuid
+
+
+# Vectores de consulta: una muestra aleatoria de los embeddings de la colección
+def sample_vectors(connection, collection, n):
+    rows = connection.execute(
+        sqlalchemy.text(
+            "SELECT embedding::text AS vector FROM langchain_pg_embedding "
+            "WHERE collection_id = :collection_id ORDER BY random() LIMIT :n"
+        ),
+        {"collection_id": collection, "n": n},
+    ).fetchall()
+    return [row.vector for row in rows]
+
+
+# Ejecutar cada consulta con los ajustes dados; devuelve los IDs encontrados y las latencias en ms
+def run_queries(engine, collection, vectors, k, settings):
+    results, latencies = [], []
+    for vector in vectors:
+        with engine.begin() as connection:
+            # SET LOCAL: los ajustes solo valen para esta transacción
+            for setting in settings:
+                connection.execute(sqlalchemy.text(f"SET LOCAL {setting}"))
+            start = time.perf_counter()
+            rows = connection.execute(SEARCH_QUERY, {"collection_id": collection, "vector": vector, "k": k}).fetchall()
+            latencies.append((time.perf_counter() - start) * 1000)
+        results.append({row.uuid for row in rows})
+    return results, latencies
+
+
+def report(label, results, latencies, exact, k):
+    recall = statistics.mean(len(found & truth) / min(k, len(truth)) for found, truth in zip(results, exact) if truth)
+    print(f"{label:<24} recall@{k}={recall:.3f}  p50={percentile(latencies, 0.5):.2f}ms  p95={percentile(latencies, 0.95):.2f}ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Recall y latencia del índice ANN de pgvector")
+    parser.add_argument("--queries", type=int, default=100, help="número de consultas")
+    parser.add_argument("--k", type=int, default=4, help="vecinos por consulta")
+    parser.add_argument("--ef-search", type=int, nargs="*", default=[10, 20, 40, 80, 160], help="valores de hnsw.ef_search")
+    parser.add_argument("--probes", type=int, nargs="*", default=[1, 5, 10, 20], help="valores de ivfflat.probes")
+    args = parser.parse_args(argv)
+
+    engine = sqlalchemy.create_engine(CONNECTION_STRING)
+    try:
+        with engine.connect() as connection:
+            collection = collection_id(connection)
+            vectors = sample_vectors(connection, collection, args.queries)
+            indexes = [row.indexdef for row in connection.execute(sqlalchemy.text(
+                "SELECT indexdef FROM pg_indexes WHERE tablename = 'langchain_pg_embedding' "
+                "AND indexname LIKE :prefix "
+                "AND (indexdef LIKE '%USING hnsw%' OR indexdef LIKE '%USING ivfflat%')"
+            ), {"prefix": collection_prefix(collection).replace("_", r"\_") + "%"})]
+        if not vectors:
+            raise SystemExit("The collection is empty")
+        print(f"{len(vectors)} queries, k={args.k}")
+        print("ANN indexes: " + ("; ".join(indexes) if indexes else "none"))
+
+        # Búsqueda exacta: sin índices, Postgres recorre todos los vectores
+        exact, latencies = run_queries(engine, collection, vectors, args.k, ["enable_indexscan = off"])
+        report("exact", exact, latencies, exact, args.k)
+
+        if any("USING hnsw" in index for index in indexes):
+            for ef_search in args.ef_search:
+                results, latencies = run_queries(engine, collection, vectors, args.k, [f"hnsw.ef_search = {int(ef_search)}"])
+                report(f"hnsw ef_search={ef_search}", results, latencies, exact, args.k)
+        if any("USING ivfflat" in index for index in indexes):
+            for probes in args.probes:
+                results, latencies = run_queries(engine, collection, vectors, args.k, [f"ivfflat.probes = {int(probes)}"])
+                report(f"ivfflat probes={probes}", results, latencies, exact, args.k)
+    finally:
+        engine.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
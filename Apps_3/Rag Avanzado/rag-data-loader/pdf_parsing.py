@@ -0,0 +1,171 @@
+# pdf_parsing.py
+# Parseo de PDFs en procesos separados, con tiempo máximo por archivo y reintentos
+#
+# El parseo de unstructured es CPU: en hilos, el GIL lo serializa. PdfParserPool
+# reparte los PDFs entre procesos trabajadores:
+# -- cada trabajador parsea un PDF a la vez y devuelve todos sus documentos
+#    (no se descarta ninguna página ni elemento)
+# -- si un PDF supera el tiempo máximo o el trabajador muere, el proceso se mata,
+#    se sustituye por otro y el PDF se reintenta; un PDF problemático no bloquea el lote
+# -- el arranque del trabajador (importar unstructured) tiene su propio tiempo máximo:
+#    un trabajador que se cuelga al arrancar se mata y el PDF se reintenta en otro
+# -- los resultados se entregan según terminan (imap_unordered), así el loader
+#    divide y vectoriza un PDF mientras los trabajadores parsean los siguientes
+
+import multiprocessing
+import os
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from multiprocessing.connection import wait
+from typing import Callable, Iterable, Iterator, List, Optional
+
+from langchain_community.document_loaders import UnstructuredPDFLoader
+from langchain_core.documents import Document
+
+# Segundos máximos para parsear un PDF
+DEFAULT_TIMEOUT = 300
+
+# Segundos máximos para que un trabajador nuevo esté listo
+DEFAULT_STARTUP_TIMEOUT = 120
+
+# Reintentos por PDF tras un error, un tiempo agotado o la muerte del trabajador
+DEFAULT_RETRIES = 1
+
+# "spawn": los trabajadores no heredan hilos ni conexiones abiertas del loader
+START_METHOD = "spawn"
+
+# Mensaje del trabajador al terminar de arrancar (importar unstructured tarda varios segundos)
+READY = "ready"
+
+
+def parse_pdf(path: str) -> List[Document]:
+    return UnstructuredPDFLoader(path).load()
+
+
+@dataclass
+class ParsedPdf:
+    path: str
+    docs: List[Document] = field(default_factory=list)
+    # Mensaje del último fallo si no se pudo parsear (docs queda vacío)
+    error: Optional[str] = None
+    attempts: int = 1
+
+
+# Bucle de un proceso trabajador: avisa de que está listo, recibe rutas por la conexión
+# y devuelve (ok, documentos o error)
+def _worker_main(connection, parse):
+    connection.send(READY)
+    while True:
+        path = connection.recv()
+        if path is None:
+            return
+        try:
+            connection.send((True, parse(path)))
+        except Exception as e:
+            connection.send((False, f"{type(e).__name__}: {e}"))
+
+
+class _Worker:
+    def __init__(self, context, parse):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_connection, parse), daemon=True)
+        self.process.start()
+        child_connection.close()
+        self.ready = False
+        # (ruta, intento) en curso y hora límite; hasta que el trabajador está listo la
+        # hora límite es la del arranque, así el arranque no se cuenta como parseo
+        self.task = None
+        self.deadline = None
+
+    def submit(self, path, attempt, timeout, startup_timeout):
+        self.task = (path, attempt)
+        self.deadline = time.monotonic() + (timeout if self.ready else startup_timeout)
+        self.connection.send(path)
+
+    def kill(self):
+        self.process.kill()
+        self.process.join()
+        self.connection.close()
+
+    def stop(self):
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        self.connection.close()
+
+
+class PdfParserPool:
+    def __init__(self, workers: Optional[int] = None, timeout: float = DEFAULT_TIMEOUT, retries: int = DEFAULT_RETRIES,
+                 parse: Callable[[str], List[Document]] = parse_pdf, startup_timeout: float = DEFAULT_STARTUP_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self.retries = retries
+        self.startup_timeout = startup_timeout
+        # Debe poder importarse desde el trabajador (función a nivel de módulo)
+        self.parse = parse
+        self._context = multiprocessing.get_context(START_METHOD)
+
+    # Parsear los PDFs y entregar cada resultado en cuanto está listo (en orden de finalización).
+    # Todos los PDFs aparecen una vez en la salida; los que fallan llevan `error`.
+    def imap_unordered(self, paths: Iterable[str]) -> Iterator[ParsedPdf]:
+        pending = deque((path, 1) for path in paths)
+        idle, busy = [], []
+        try:
+            while pending or busy:
+                # Repartir trabajo; los procesos se crean solo si hacen falta
+                while pending and (idle or len(busy) < self.workers):
+                    worker = idle.pop() if idle else _Worker(self._context, self.parse)
+                    worker.submit(*pending.popleft(), self.timeout, self.startup_timeout)
+                    busy.append(worker)
+
+                timeout = max(0.0, min(worker.deadline for worker in busy) - time.monotonic()) if busy else None
+                ready = set(wait([worker.connection for worker in busy], timeout=timeout))
+                now = time.monotonic()
+                for worker in list(busy):
+                    path, attempt = worker.task
+                    if worker.connection in ready:
+                        try:
+                            message = worker.connection.recv()
+                        except (EOFError, OSError):
+                            # El trabajador murió (p. ej. un fallo en código nativo)
+                            busy.remove(worker)
+                            worker.kill()
+                            error = f"worker exited with code {worker.process.exitcode}"
+                        else:
+                            if message == READY:
+                                worker.ready = True
+                                worker.deadline = now + self.timeout
+                                continue
+                            ok, payload = message
+                            busy.remove(worker)
+                            worker.task = None
+                            idle.append(worker)
+                            if ok:
+                                yield ParsedPdf(path, payload, attempts=attempt)
+                                continue
+                            error = payload
+                    elif now >= worker.deadline:
+                        busy.remove(worker)
+                        worker.kill()
+                        if worker.ready:
+                            error = f"timed out after {self.timeout}s"
+                        else:
+                            error = f"worker did not start within {self.startup_timeout}s"
+                    else:
+                        continue
+
+                    if attempt <= self.retries:
+                        pending.append((path, attempt + 1))
+                    else:
+                        yield ParsedPdf(path, error=error, attempts=attempt)
+        finally:
+            for worker in busy:
+                worker.kill()
+            for worker in idle:
+                worker.stop()
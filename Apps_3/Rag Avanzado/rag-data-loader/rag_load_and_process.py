@@ -1,46 +1,292 @@
 # rag_load_and_process.py
 # Script para cargar, procesar y vectorizar PDFs usando LangChain y PGVector
+#
+# Uso:
+#   python rag-data-loader/rag_load_and_process.py [--pdf-directory DIR] [--rebuild]
+#       [--ann-index {hnsw,ivfflat,none}] [--hnsw-m M] [--hnsw-ef-construction N] [--ivfflat-lists N]
+#       [--parse-workers N] [--parse-timeout SECONDS] [--parse-retries N]
+#
+# La indexación es incremental: un manifiesto guarda el hash de cada PDF y los
+# IDs de sus chunks. En cada ejecución solo se procesan los PDFs nuevos o
+# modificados, se borran los vectores de los PDFs eliminados y los chunks que
+# no han cambiado no se vuelven a generar ni a insertar.
+#
+# Al terminar se crea (o se actualiza, si cambian los parámetros) el índice ANN
+# de pgvector sobre los embeddings; ver app/vector_index.py.
+#
+# Los PDFs se parsean en procesos separados (pdf_parsing.py) con un tiempo máximo
+# por archivo; los que fallan no entran en el manifiesto y se reintentan en la
+# siguiente ejecución.
+#
+# El progreso se escribe en stdout como líneas "PROGRESS {json}", que el
+# servidor (app/ingestion.py) lee para informar del estado de cada trabajo.
 
+import argparse
+import hashlib
+import json
 import os
+import sys
+import tempfile
+
+import sqlalchemy
 
 from dotenv import load_dotenv
-from langchain_community.document_loaders import DirectoryLoader, UnstructuredPDFLoader
 from langchain_community.vectorstores.pgvector import PGVector
 from langchain_experimental.text_splitter import SemanticChunker
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_openai import OpenAIEmbeddings
 
-# Cargar variables de entorno (por ejemplo, claves de API)
+LOADER_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+# Permitir importar el paquete app, que comparte la caché de embeddings con el servidor
+sys.path.insert(0, os.path.dirname(LOADER_DIRECTORY))
+from app.embedding_cache import CachedEmbeddings  # noqa: E402
+from app.hybrid import ensure_keyword_index  # noqa: E402
+from app.settings import get_settings  # noqa: E402
+from app.vector_index import ensure_ann_index  # noqa: E402
+from pdf_parsing import DEFAULT_RETRIES, DEFAULT_TIMEOUT, PdfParserPool  # noqa: E402
+
+# Carpeta de PDFs por defecto: pdf-documents en la raíz del proyecto
+DEFAULT_PDF_DIRECTORY = os.path.join(os.path.dirname(LOADER_DIRECTORY), "pdf-documents")
+
+# Manifiesto de lo que ya está indexado (fuera de pdf-documents, que se sirve como estático)
+DEFAULT_MANIFEST_PATH = os.path.join(LOADER_DIRECTORY, "index-manifest.json")
+
+# Cargar variables de entorno (por ejemplo, claves de API y DATABASE_URL)
 load_dotenv()
 
-# Cargar todos los PDFs de la carpeta especificada usando un loader multihilo
-loader = DirectoryLoader(
-    os.path.abspath("/Users/juliocolomer/Documents/000-BOOTCAMP-LLM-APPS/003-NOTEBOOKS/005-RAG-IN-DEPTH/003-RAG-PDFS/167-part4/167-part4/pdf-documents"),
-    glob="**/*.pdf",
-    use_multithreading=True,
-    show_progress=True,
-    max_concurrency=50,
-    loader_cls=UnstructuredPDFLoader,
-)
-docs = loader.load()
-
-# Inicializar embeddings de OpenAI
-embeddings = OpenAIEmbeddings(model='text-embedding-ada-002', )
-
-# Dividir los documentos en chunks semánticos usando SemanticChunker
-text_splitter = SemanticChunker(
-    embeddings=embeddings
-)
-
-# Aplanar la lista de documentos cargados
-flattened_docs = [doc[0] for doc in docs if doc]
-chunks = text_splitter.split_documents(flattened_docs)
-
-# Indexar los chunks en PGVector (PostgreSQL)
-PGVector.from_documents(
-    documents=chunks,
-    embedding=embeddings,
-    collection_name="collection164",
-    connection_string="postgresql+psycopg://postgres@localhost:5432/database164",
-    pre_delete_collection=True,
-)
\ No newline at end of file
+# Misma base de datos y colección que el servidor (app/settings.py)
+COLLECTION_NAME = get_settings().collection_name
+CONNECTION_STRING = get_settings().database_url
+EMBEDDING_MODEL = "text-embedding-ada-002"
+
+# Versión del formato del manifiesto; si cambia se reconstruye todo
+MANIFEST_VERSION = 1
+
+PROGRESS_PREFIX = "PROGRESS "
+
+
+# Informar del progreso de una etapa (una línea JSON por actualización)
+def report_progress(stage, done=0, total=0):
+    print(PROGRESS_PREFIX + json.dumps({"stage": stage, "done": done, "total": total}), flush=True)
+
+
+# Hash SHA-256 del contenido de un archivo, leído por bloques
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ID estable de un chunk: depende del PDF y del texto, así un chunk sin cambios conserva su ID
+def chunk_ids(relative_path, chunks):
+    ids = []
+    seen = {}
+    for chunk in chunks:
+        chunk_hash = hashlib.sha256(f"{relative_path}\0{chunk.page_content}".encode()).hexdigest()
+        # Dos chunks con el mismo texto en el mismo PDF se distinguen por su número de aparición
+        occurrence = seen.get(chunk_hash, 0)
+        seen[chunk_hash] = occurrence + 1
+        ids.append(chunk_hash if occurrence == 0 else f"{chunk_hash}-{occurrence}")
+    return ids
+
+
+def empty_manifest():
+    return {
+        "version": MANIFEST_VERSION,
+        "collection": COLLECTION_NAME,
+        "embedding_model": EMBEDDING_MODEL,
+        "corpus_version": None,
+        "files": {},
+    }
+
+
+# Leer el manifiesto; si no existe o es de otra colección/modelo se empieza de cero
+def load_manifest(path):
+    try:
+        with open(path) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return empty_manifest()
+    if (manifest.get("version") != MANIFEST_VERSION
+            or manifest.get("collection") != COLLECTION_NAME
+            or manifest.get("embedding_model") != EMBEDDING_MODEL):
+        return empty_manifest()
+    return manifest
+
+
+# Guardar el manifiesto de forma atómica (archivo temporal + rename)
+def save_manifest(path, manifest):
+    manifest["corpus_version"] = corpus_version(manifest)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), prefix=".manifest-")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+
+# Versión del corpus: cambia cada vez que cambia el conjunto de PDFs indexados
+def corpus_version(manifest):
+    digest = hashlib.sha256()
+    for relative_path, entry in sorted(manifest["files"].items()):
+        digest.update(f"{relative_path}\0{entry['sha256']}\n".encode())
+    return digest.hexdigest()[:16]
+
+
+# Recorrer la carpeta y calcular el hash de cada PDF.
+# Si el tamaño y la fecha de modificación no han cambiado se reutiliza el hash del manifiesto.
+def scan_pdfs(pdf_directory, manifest):
+    current = {}
+    for root, _, filenames in os.walk(pdf_directory):
+        for filename in filenames:
+            if not filename.lower().endswith(".pdf"):
+                continue
+            path = os.path.join(root, filename)
+            relative_path = os.path.relpath(path, pdf_directory)
+            stat = os.stat(path)
+            previous = manifest["files"].get(relative_path)
+            if previous and previous["size"] == stat.st_size and previous["mtime"] == stat.st_mtime:
+                sha256 = previous["sha256"]
+            else:
+                sha256 = file_sha256(path)
+            current[relative_path] = {"sha256": sha256, "size": stat.st_size, "mtime": stat.st_mtime}
+    return current
+
+
+def load_and_process(pdf_directory, manifest_path=DEFAULT_MANIFEST_PATH, rebuild=False,
+                     ann_index="hnsw", hnsw_m=16, hnsw_ef_construction=64, ivfflat_lists=None,
+                     parse_workers=None, parse_timeout=DEFAULT_TIMEOUT, parse_retries=DEFAULT_RETRIES):
+    pdf_directory = os.path.abspath(pdf_directory)
+    manifest = empty_manifest() if rebuild else load_manifest(manifest_path)
+
+    # Inicializar embeddings de OpenAI; la caché evita pagar de nuevo por los textos ya vectorizados
+    # (frases del SemanticChunker y chunks de ejecuciones anteriores)
+    embeddings = CachedEmbeddings(OpenAIEmbeddings(model=EMBEDDING_MODEL, ))
+
+    # Dividir los documentos en chunks semánticos usando SemanticChunker
+    text_splitter = SemanticChunker(
+        embeddings=embeddings
+    )
+
+    # Vector store en PGVector (PostgreSQL); solo se vacía al reconstruir
+    vector_store = PGVector(
+        collection_name=COLLECTION_NAME,
+        connection_string=CONNECTION_STRING,
+        embedding_function=embeddings,
+        pre_delete_collection=rebuild or not manifest["files"],
+    )
+
+    # Comparar la carpeta con el manifiesto
+    report_progress("scanning")
+    current = scan_pdfs(pdf_directory, manifest)
+    removed = [path for path in manifest["files"] if path not in current]
+    changed = [
+        path for path, entry in sorted(current.items())
+        if manifest["files"].get(path, {}).get("sha256") != entry["sha256"]
+    ]
+    unchanged = len(current) - len(changed)
+    print(f"{len(changed)} new or changed, {len(removed)} removed, {unchanged} unchanged PDFs")
+
+    # Borrar los vectores de los PDFs eliminados
+    for relative_path in removed:
+        vector_store.delete(ids=manifest["files"][relative_path]["chunks"], collection_only=True)
+        del manifest["files"][relative_path]
+        save_manifest(manifest_path, manifest)
+
+    # Procesar los PDFs nuevos o modificados. El parseo se hace en procesos y cada PDF
+    # se divide y vectoriza en cuanto está parseado, mientras se parsean los siguientes.
+    report_progress("indexing", 0, len(changed))
+    parser = PdfParserPool(workers=parse_workers, timeout=parse_timeout, retries=parse_retries)
+    paths = [os.path.join(pdf_directory, relative_path) for relative_path in changed]
+    failed = {}
+    for done, parsed in enumerate(parser.imap_unordered(paths), 1):
+        relative_path = os.path.relpath(parsed.path, pdf_directory)
+        if parsed.error is not None:
+            # No se toca el manifiesto: el PDF se vuelve a intentar en la siguiente ejecución
+            # (si ya estaba indexado, sigue su versión anterior)
+            print(f"Could not parse {relative_path} after {parsed.attempts} attempts: {parsed.error}", file=sys.stderr)
+            failed[relative_path] = parsed.error
+            report_progress("indexing", done, len(changed))
+            continue
+        chunks = text_splitter.split_documents(parsed.docs)
+        ids = chunk_ids(relative_path, chunks)
+        previous_ids = set(manifest["files"].get(relative_path, {}).get("chunks", []))
+
+        # Insertar solo los chunks nuevos y después borrar los que ya no existen,
+        # así el PDF nunca queda sin vectores mientras se actualiza
+        new_chunks = [(chunk_id, chunk) for chunk_id, chunk in zip(ids, chunks) if chunk_id not in previous_ids]
+        if new_chunks:
+            vector_store.add_documents(
+                [chunk for _, chunk in new_chunks],
+                ids=[chunk_id for chunk_id, _ in new_chunks],
+            )
+        stale_ids = previous_ids.difference(ids)
+        if stale_ids:
+            vector_store.delete(ids=list(stale_ids), collection_only=True)
+
+        manifest["files"][relative_path] = dict(current[relative_path], chunks=ids)
+        save_manifest(manifest_path, manifest)
+        report_progress("indexing", done, len(changed))
+
+    # Guardar también si solo cambiaron fechas de modificación
+    for relative_path, entry in current.items():
+        if relative_path in manifest["files"] and relative_path not in failed:
+            manifest["files"][relative_path].update(entry)
+    save_manifest(manifest_path, manifest)
+
+    # Índice de full-text para la búsqueda por palabras clave de la recuperación híbrida
+    report_progress("keyword_index")
+    engine = sqlalchemy.create_engine(CONNECTION_STRING)
+    try:
+        ensure_keyword_index(engine, get_settings().text_search_config)
+        # Índice aproximado de vectores (HNSW o IVFFlat); "none" vuelve a la búsqueda exacta
+        report_progress("ann_index")
+        index = ensure_ann_index(engine, COLLECTION_NAME, ann_index, dimensions=get_settings().embedding_dimensions,
+                                 m=hnsw_m, ef_construction=hnsw_ef_construction, lists=ivfflat_lists)
+        print(f"ANN index: {index or 'none'}")
+    finally:
+        engine.dispose()
+    # PDFs que no se pudieron parsear: ruta relativa -> error
+    return failed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Carga, divide y vectoriza los PDFs en PGVector")
+    parser.add_argument("--pdf-directory", default=DEFAULT_PDF_DIRECTORY, help="carpeta con los PDFs a indexar")
+    parser.add_argument("--manifest", default=DEFAULT_MANIFEST_PATH, help="manifiesto de la indexación incremental")
+    parser.add_argument("--rebuild", action="store_true", help="vaciar la colección y volver a indexar todos los PDFs")
+    parser.add_argument("--ann-index", choices=["hnsw", "ivfflat", "none"], default="hnsw", help="tipo de índice aproximado de vectores")
+    parser.add_argument("--hnsw-m", type=int, default=16, help="conexiones por nodo del grafo HNSW")
+    parser.add_argument("--hnsw-ef-construction", type=int, default=64, help="tamaño de la lista de candidatos al construir HNSW")
+    parser.add_argument("--ivfflat-lists", type=int, default=None, help="listas de IVFFlat (por defecto filas/1000)")
+    parser.add_argument("--parse-workers", type=int, default=None, help="procesos de parseo (por defecto, uno por CPU)")
+    parser.add_argument("--parse-timeout", type=float, default=DEFAULT_TIMEOUT, help="segundos máximos para parsear un PDF")
+    parser.add_argument("--parse-retries", type=int, default=DEFAULT_RETRIES, help="reintentos por PDF que falla o se agota")
+    args = parser.parse_args(argv)
+
+    failed = load_and_process(
+        args.pdf_directory,
+        manifest_path=args.manifest,
+        rebuild=args.rebuild,
+        ann_index=args.ann_index,
+        hnsw_m=args.hnsw_m,
+        hnsw_ef_construction=args.hnsw_ef_construction,
+        ivfflat_lists=args.ivfflat_lists,
+        parse_workers=args.parse_workers,
+        parse_timeout=args.parse_timeout,
+        parse_retries=args.parse_retries,
+    )
+    if failed:
+        # El resto de PDFs sí quedó indexado; el código de salida marca el trabajo como fallido
+        print(f"{len(failed)} PDFs could not be parsed: {', '.join(sorted(failed))}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,408 @@
+# benchmark.py
+# Benchmark de carga y evaluación de la recuperación contra un backend local
+#
+# Uso (desde la raíz del proyecto):
+#   python -m tests.benchmark [--sessions 50] [--turns 3] [--concurrency 10] [--mode chain invoke sse]
+#                             [--llm-latency 0.3] [--embed-latency 0.05] [--search-latency 0.005] [--json out.json]
+#
+# fake_backend() sustituye en app.rag_chain los componentes externos por los de
+# tests/fakes.py (LLM, embeddings, PGVector y búsqueda por palabras clave en
+# memoria); el resto es el código real: caché de embeddings, multi-query con
+# fusión RRF, selección del contexto, caché semántica de respuestas e historial
+# de chat (ChatHistoryStore sobre SQLite). Sin red ni Postgres, así cada
+# optimización se mide en local y con resultados reproducibles.
+#
+# -- sesiones de chat concurrentes: una primera pregunta etiquetada y preguntas
+#    de seguimiento del mismo tema, contra final_chain (chain), /rag/invoke
+#    (invoke) o /rag/sse (sse) de la app FastAPI
+# -- throughput y latencia p50/p95/p99 por etapa: las de /metrics
+#    (STAGE_RUN_NAMES en final_chain, stage_seconds en /rag/sse)
+# -- recall@k y MRR de la recuperación frente a las preguntas etiquetadas de
+#    tests/dataset.py, y recall del contexto que llega al prompt
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from dataclasses import asdict, dataclass
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+import app.rag_chain as rag_chain
+from app.answer_cache import SemanticAnswerCache
+from app.context_packing import ContextPacker
+from app.embedding_cache import CachedEmbeddings
+from app.metrics import MetricsCallbackHandler
+from app.settings import Settings
+from tests.dataset import corpus, follow_ups, labeled_questions
+from tests.fakes import FakeChatModel, HashEmbeddings, InMemoryKeywordSearch, InMemoryVectorStore, WhitespaceEncoding
+
+# Funciones get_*() de rag_chain con lru_cache; se vacían al montar y desmontar el backend
+GETTERS = (
+    "get_embeddings", "get_vector_store", "get_keyword_search", "get_reranker", "get_llm", "get_rewrite_llm",
+    "get_multiquery", "get_context_packer", "get_answer_cache", "get_chat_history_store",
+)
+
+# Atributos de rag_chain que sustituye fake_backend
+PATCHED = (
+    "get_settings", "ChatOpenAI", "OpenAIEmbeddings", "CachedEmbeddings", "IndexedPGVector", "PostgresKeywordSearch",
+    "SemanticAnswerCache", "ContextPacker",
+)
+
+PERCENTILES = (50, 95, 99)
+
+MODES = ("chain", "invoke", "sse")
+
+
+@dataclass
+class BenchmarkConfig:
+    # Chunks de relleno además de los de los temas
+    filler: int = 200
+    seed: int = 0
+    # Latencias simuladas en segundos
+    llm_latency: float = 0.0
+    token_latency: float = 0.0
+    embed_latency: float = 0.0
+    search_latency: float = 0.0
+    context_max_tokens: int = 3000
+    answer_cache: bool = True
+    # Contar tokens con tiktoken (necesita su vocabulario) en vez de por palabras
+    tiktoken: bool = False
+
+
+class WordContextPacker(ContextPacker):
+    @property
+    def encoding(self):
+        return WhitespaceEncoding()
+
+
+def _clear_caches():
+    for name in GETTERS:
+        getattr(rag_chain, name).cache_clear()
+
+
+# Montar el backend local en app.rag_chain; al salir se restaura el original
+@contextlib.contextmanager
+def fake_backend(config: BenchmarkConfig = BenchmarkConfig()):
+    original = {name: getattr(rag_chain, name) for name in PATCHED}
+    with tempfile.TemporaryDirectory(prefix="rag-benchmark-") as tmp:
+        docs = corpus(config.filler, config.seed)
+        base_embeddings = HashEmbeddings(latency=config.embed_latency)
+        answer_cache_args = {"manifest_path": os.path.join(tmp, "index-manifest.json")}
+        if not config.answer_cache:
+            # Ninguna similitud llega al umbral: todas las preguntas recorren la cadena completa
+            answer_cache_args["threshold"] = float("inf")
+
+        # Subclase y no una función: rag_chain también usa SemanticAnswerCache.as_output
+        class AnswerCache(SemanticAnswerCache):
+            def __init__(self, embeddings):
+                super().__init__(embeddings, **answer_cache_args)
+
+        settings = Settings(
+            history_database_url=f"sqlite:///{os.path.join(tmp, 'history.sqlite3')}",
+            answer_model="fake-answer-model",
+            rewrite_model="fake-rewrite-model",
+            reranker_model=None,
+            context_max_tokens=config.context_max_tokens,
+        )
+        replacements = {
+            "get_settings": lambda: settings,
+            "ChatOpenAI": lambda model, **kwargs: FakeChatModel(
+                model_name=model, latency=config.llm_latency, token_latency=config.token_latency,
+            ),
+            "OpenAIEmbeddings": lambda: HashEmbeddings(latency=config.embed_latency),
+            "CachedEmbeddings": lambda embeddings: CachedEmbeddings(embeddings, path=os.path.join(tmp, "embeddings.sqlite3")),
+            "IndexedPGVector": lambda embedding_function, **kwargs: InMemoryVectorStore(
+                embedding_function, search_latency=config.search_latency, docs=docs, index_embeddings=base_embeddings,
+            ),
+            "PostgresKeywordSearch": lambda **kwargs: InMemoryKeywordSearch(docs, search_latency=config.search_latency),
+            "SemanticAnswerCache": AnswerCache,
+            "ContextPacker": ContextPacker if config.tiktoken else WordContextPacker,
+        }
+        _clear_caches()
+        for name, value in replacements.items():
+            setattr(rag_chain, name, value)
+        try:
+            # Crear los componentes (e indexar el corpus) antes de medir, como hace /readyz al desplegar
+            rag_chain.get_multiquery()
+            rag_chain.get_answer_cache()
+            rag_chain.get_context_packer()
+            rag_chain.get_chat_history_store()
+            yield docs
+        finally:
+            if rag_chain.get_chat_history_store.cache_info().currsize:
+                rag_chain.get_chat_history_store().close()
+            _clear_caches()
+            for name, value in original.items():
+                setattr(rag_chain, name, value)
+
+
+# --- latencias ---
+
+class LatencyStats:
+    def __init__(self):
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def add(self, stage: str, seconds: float):
+        self.samples[stage].append(seconds)
+
+    def update(self, stages: Dict[str, float]):
+        for stage, seconds in stages.items():
+            self.add(stage, seconds)
+
+    # etapa -> count, mean y percentiles en milisegundos
+    def summary(self) -> Dict[str, dict]:
+        result = {}
+        for stage, values in self.samples.items():
+            ms = np.array(values) * 1000
+            result[stage] = {"count": len(values), "mean_ms": float(ms.mean())}
+            for p in PERCENTILES:
+                result[stage][f"p{p}_ms"] = float(np.percentile(ms, p))
+        return result
+
+
+# Las mismas etapas que MetricsCallbackHandler registra en /metrics, pero guardadas en LatencyStats
+class StageRecorder(MetricsCallbackHandler):
+    def __init__(self, stats: LatencyStats):
+        super().__init__()
+        self.stats = stats
+
+    def _end(self, run_id):
+        started = self._stages.pop(run_id, None)
+        if started is not None:
+            self.stats.add(started[0], time.perf_counter() - started[1])
+
+
+# --- sesiones ---
+
+# Preguntas de una sesión: una etiquetada y después preguntas de seguimiento del mismo tema
+def session_script(rng: random.Random, turns: int) -> List[str]:
+    labeled = rng.choice(labeled_questions())
+    extra = follow_ups(labeled.topic)
+    return [labeled.question] + [extra[i % len(extra)] for i in range(turns - 1)]
+
+
+@dataclass
+class LoadResult:
+    mode: str
+    sessions: int
+    requests: int
+    errors: int
+    seconds: float
+    throughput: float
+    stages: Dict[str, dict]
+    cache: Dict[str, dict]
+    # Primer error, para no tener que repetir la medida para verlo
+    first_error: Optional[str] = None
+
+
+async def _run_sessions(scripts: List[List[str]], concurrency: int, ask) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    result = {"requests": 0, "errors": 0, "first_error": None}
+
+    async def session(questions):
+        session_id = f"bench-{uuid.uuid4().hex}"
+        async with semaphore:
+            for question in questions:
+                result["requests"] += 1
+                try:
+                    await ask(question, session_id)
+                except Exception as e:
+                    result["errors"] += 1
+                    result["first_error"] = result["first_error"] or f"{type(e).__name__}: {e}"
+
+    start = time.perf_counter()
+    await asyncio.gather(*(session(script) for script in scripts))
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def _cache_stats() -> Dict[str, dict]:
+    return {
+        "embeddings": rag_chain.get_embeddings().stats(),
+        "answers": rag_chain.get_answer_cache().stats(),
+        "context": rag_chain.get_context_packer().stats(),
+    }
+
+
+async def run_load(mode: str, sessions: int = 20, turns: int = 3, concurrency: int = 5, seed: int = 0) -> LoadResult:
+    if mode not in MODES:
+        raise ValueError(f"Unknown mode {mode!r}; expected one of {', '.join(MODES)}")
+    rng = random.Random(seed)
+    scripts = [session_script(rng, turns) for _ in range(sessions)]
+    stats = LatencyStats()
+
+    if mode == "chain":
+        recorder = StageRecorder(stats)
+
+        async def ask(question, session_id):
+            await rag_chain.final_chain.ainvoke(
+                {"question": question}, config={"configurable": {"session_id": session_id}, "callbacks": [recorder]},
+            )
+
+        run = await _run_sessions(scripts, concurrency, ask)
+    else:
+        import httpx
+        from app.rag_stream import stage_seconds
+        from app.server import app
+
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+            async def ask(question, session_id):
+                start = time.perf_counter()
+                if mode == "invoke":
+                    response = await client.post("/rag/invoke", json={
+                        "input": {"question": question}, "config": {"configurable": {"session_id": session_id}},
+                    })
+                    response.raise_for_status()
+                    stats.add("request", time.perf_counter() - start)
+                    return
+                response = await client.post("/rag/sse", json={"question": question, "session_id": session_id})
+                response.raise_for_status()
+                events = parse_sse(response.text)
+                if any(event == "error" for event, _ in events):
+                    raise RuntimeError(next(data for event, data in events if event == "error"))
+                # Etapas medidas en el servidor y la petición completa vista por el cliente
+                stats.update({f"server_{stage}": s for stage, s in stage_seconds(dict(events)["timings"]).items()})
+                stats.add("request", time.perf_counter() - start)
+
+            run = await _run_sessions(scripts, concurrency, ask)
+
+    return LoadResult(
+        mode=mode, sessions=sessions, requests=run["requests"], errors=run["errors"], seconds=run["seconds"],
+        throughput=run["requests"] / run["seconds"] if run["seconds"] else 0.0, stages=stats.summary(),
+        cache=_cache_stats(), first_error=run["first_error"],
+    )
+
+
+# Eventos (nombre, datos) de una respuesta SSE completa
+def parse_sse(text: str) -> List[tuple]:
+    events = []
+    for block in text.replace("\r\n", "\n").split("\n\n"):
+        event, data = None, []
+        for line in block.splitlines():
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+        if event is not None:
+            events.append((event, json.loads("\n".join(data)) if data else None))
+    return events
+
+
+# --- calidad de la recuperación ---
+
+def _doc_id(doc) -> Optional[str]:
+    return doc.metadata.get("id")
+
+
+def _recall(found: Sequence[str], relevant: Sequence[str]) -> float:
+    return len(set(found) & set(relevant)) / len(relevant)
+
+
+# recall@k y MRR de la lista fusionada del multi-query y recall del contexto seleccionado para el prompt
+async def evaluate_retrieval(ks: Sequence[int] = (1, 3, 5)) -> dict:
+    retriever = rag_chain.get_multiquery()
+    packer = rag_chain.get_context_packer()
+    recall = {k: [] for k in ks}
+    reciprocal_ranks, context_recall = [], []
+    for labeled in labeled_questions():
+        docs = await retriever.ainvoke(labeled.question)
+        ranking = [_doc_id(doc) for doc in docs]
+        for k in ks:
+            recall[k].append(_recall(ranking[:k], labeled.relevant))
+        rank = next((i + 1 for i, doc_id in enumerate(ranking) if doc_id in labeled.relevant), None)
+        reciprocal_ranks.append(1.0 / rank if rank else 0.0)
+        context_recall.append(_recall([_doc_id(doc) for doc in packer.pack_documents(docs)], labeled.relevant))
+    return {
+        "questions": len(reciprocal_ranks),
+        "recall": {f"@{k}": float(np.mean(values)) for k, values in recall.items()},
+        "mrr": float(np.mean(reciprocal_ranks)),
+        "context_recall": float(np.mean(context_recall)),
+    }
+
+
+# --- informe ---
+
+def format_load(result: LoadResult) -> str:
+    lines = [
+        f"[{result.mode}] {result.sessions} sessions, {result.requests} requests, {result.errors} errors, "
+        f"{result.seconds:.2f}s, {result.throughput:.1f} req/s",
+        f"  {'stage':<24}{'count':>7}{'mean':>10}" + "".join(f"{f'p{p}':>10}" for p in PERCENTILES) + "  (ms)",
+    ]
+    for stage, summary in result.stages.items():
+        lines.append(
+            f"  {stage:<24}{summary['count']:>7}{summary['mean_ms']:>10.1f}"
+            + "".join(f"{summary[f'p{p}_ms']:>10.1f}" for p in PERCENTILES)
+        )
+    if result.first_error:
+        lines.append(f"  first error: {result.first_error}")
+    answers, embeddings = result.cache["answers"], result.cache["embeddings"]
+    lines.append(
+        f"  answer cache hit rate {answers['hit_rate']:.2f}, embedding cache hit rate {embeddings['hit_rate']:.2f}, "
+        f"avg context tokens {result.cache['context']['avg_tokens_sent']:.0f}"
+    )
+    return "\n".join(lines)
+
+
+def format_retrieval(quality: dict) -> str:
+    recall = "  ".join(f"recall{k}={value:.3f}" for k, value in quality["recall"].items())
+    return f"[retrieval] {quality['questions']} labeled questions  {recall}  mrr={quality['mrr']:.3f}  " \
+           f"context_recall={quality['context_recall']:.3f}"
+
+
+async def run_benchmark(config: BenchmarkConfig, modes: Sequence[str], sessions: int, turns: int, concurrency: int,
+                        ks: Sequence[int]) -> dict:
+    report = {"config": asdict(config), "load": [], "retrieval": None}
+    # Backend nuevo por modo: las cachés empiezan vacías en cada medida
+    for mode in modes:
+        with fake_backend(config):
+            result = await run_load(mode, sessions, turns, concurrency, config.seed)
+        print(format_load(result))
+        report["load"].append(asdict(result))
+    with fake_backend(config):
+        report["retrieval"] = await evaluate_retrieval(ks)
+    print(format_retrieval(report["retrieval"]))
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark de carga y recall de la cadena RAG con un backend local")
+    parser.add_argument("--sessions", type=int, default=50, help="sesiones de chat")
+    parser.add_argument("--turns", type=int, default=3, help="preguntas por sesión")
+    parser.add_argument("--concurrency", type=int, default=10, help="sesiones simultáneas")
+    parser.add_argument("--mode", nargs="*", choices=MODES, default=list(MODES), help="qué se ejecuta")
+    parser.add_argument("--k", type=int, nargs="*", default=[1, 3, 5], help="valores de k para recall@k")
+    parser.add_argument("--filler", type=int, default=200, help="chunks de relleno en el corpus")
+    parser.add_argument("--llm-latency", type=float, default=0.3, help="segundos hasta el primer token del LLM")
+    parser.add_argument("--token-latency", type=float, default=0.01, help="segundos por token del LLM")
+    parser.add_argument("--embed-latency", type=float, default=0.05, help="segundos por llamada de embeddings")
+    parser.add_argument("--search-latency", type=float, default=0.005, help="segundos por búsqueda")
+    parser.add_argument("--context-max-tokens", type=int, default=3000, help="presupuesto de tokens del contexto")
+    parser.add_argument("--no-answer-cache", action="store_true", help="desactivar la caché semántica de respuestas")
+    parser.add_argument("--tiktoken", action="store_true", help="contar tokens con tiktoken en vez de por palabras")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", help="guardar el informe en este archivo")
+    args = parser.parse_args(argv)
+
+    config = BenchmarkConfig(
+        filler=args.filler, seed=args.seed, llm_latency=args.llm_latency, token_latency=args.token_latency,
+        embed_latency=args.embed_latency, search_latency=args.search_latency,
+        context_max_tokens=args.context_max_tokens, answer_cache=not args.no_answer_cache, tiktoken=args.tiktoken,
+    )
+    report = asyncio.run(run_benchmark(config, args.mode, args.sessions, args.turns, args.concurrency, args.k))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return 1 if any(result["errors"] for result in report["load"]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,194 @@
+# dataset.py
+# Corpus sintético y preguntas etiquetadas para los benchmarks
+#
+# -- TOPICS: chunks de varios "PDFs" ficticios (políticas de una empresa) y, por
+#    tema, preguntas con los chunks que las responden (para recall@k) y preguntas
+#    de seguimiento (para las sesiones de chat con reformulación)
+# -- filler_chunks: chunks de relleno deterministas (semilla fija) que no
+#    responden a ninguna pregunta; una parte de sus palabras son de un tema, así
+#    compiten con los chunks buenos en la búsqueda vectorial y por palabras clave
+#
+# Cada chunk lleva metadata {"source", "page", "id"}; las etiquetas son los "id".
+
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+
+@dataclass(frozen=True)
+class LabeledQuestion:
+    question: str
+    # id de los chunks que contienen la respuesta
+    relevant: Tuple[str, ...]
+    topic: str
+
+
+# tema -> (chunks, [(pregunta, índices de los chunks relevantes)], preguntas de seguimiento)
+TOPICS: Dict[str, Tuple[List[str], List[Tuple[str, Tuple[int, ...]]], List[str]]] = {
+    "refunds": (
+        [
+            "Customers can request a refund within 30 days of purchase. Refund requests must include the order number "
+            "and the original receipt.",
+            "Approved refunds are credited to the original payment method within 5 to 7 business days. Shipping fees "
+            "are not refundable unless the product arrived damaged.",
+            "Digital downloads and gift cards are excluded from the refund policy once they have been redeemed.",
+        ],
+        [
+            ("How many days do customers have to request a refund?", (0,)),
+            ("When are approved refunds credited to the payment method?", (1,)),
+            ("Are gift cards and digital downloads refundable?", (2,)),
+        ],
+        ["And are shipping fees included?", "What do I need to send with it?"],
+    ),
+    "shipping": (
+        [
+            "Standard shipping takes 3 to 5 business days inside the country. Express shipping delivers the next "
+            "business day for orders placed before 2 pm.",
+            "International shipping is available to 40 countries. Customs duties and import taxes are paid by the "
+            "recipient on delivery.",
+            "Every shipment includes a tracking number sent by email when the parcel leaves the warehouse.",
+        ],
+        [
+            ("How long does standard shipping take?", (0,)),
+            ("Who pays customs duties on international shipping?", (1,)),
+            ("When is the parcel tracking number sent?", (2,)),
+        ],
+        ["And express?", "Is that also true for international orders?"],
+    ),
+    "warranty": (
+        [
+            "All hardware products carry a two year limited warranty covering manufacturing defects. Accidental damage "
+            "and water damage are not covered.",
+            "To file a warranty claim, register the product serial number on the support portal and attach a photo of "
+            "the defect.",
+            "Warranty repairs are completed within 15 days; if the product cannot be repaired it is replaced with an "
+            "equivalent model.",
+        ],
+        [
+            ("How long is the hardware warranty?", (0,)),
+            ("How do I file a warranty claim?", (1,)),
+            ("What happens if a product cannot be repaired under warranty?", (2,)),
+        ],
+        ["Does it cover water damage?", "How long do those repairs take?"],
+    ),
+    "invoices": (
+        [
+            "Invoices are issued on the first day of each month and payment terms are net 30 days from the invoice "
+            "date.",
+            "Late invoice payments accrue interest of 1.5 percent per month. Accounts more than 60 days overdue are "
+            "suspended.",
+            "Invoices can be downloaded as PDF from the billing section of the customer dashboard.",
+        ],
+        [
+            ("What are the payment terms for invoices?", (0,)),
+            ("What interest is charged on late invoice payments?", (1,)),
+            ("Where can I download my invoices?", (2,)),
+        ],
+        ["What happens after 60 days?", "Can I get them in another format?"],
+    ),
+    "security": (
+        [
+            "Employees must enable two factor authentication on every company account. Hardware security keys are "
+            "provided by the IT department.",
+            "Passwords must be at least 14 characters long and are rotated every 180 days. Password reuse across "
+            "services is forbidden.",
+            "Security incidents such as phishing emails must be reported to the security team within one hour using "
+            "the incident form.",
+        ],
+        [
+            ("Is two factor authentication required for company accounts?", (0,)),
+            ("What is the minimum password length?", (1,)),
+            ("How quickly must phishing emails be reported?", (2,)),
+        ],
+        ["Who provides the security keys?", "How often do they have to be changed?"],
+    ),
+    "vacation": (
+        [
+            "Full time employees accrue 25 vacation days per year. Up to 5 unused vacation days can be carried over to "
+            "the next year.",
+            "Vacation requests longer than one week must be approved by the manager at least 30 days in advance.",
+            "Public holidays are not deducted from the vacation balance and follow the calendar of each office.",
+        ],
+        [
+            ("How many vacation days do full time employees get?", (0,)),
+            ("How far in advance must long vacation requests be approved?", (1,)),
+            ("Are public holidays deducted from the vacation balance?", (2,)),
+        ],
+        ["Can unused days be carried over?", "Who approves them?"],
+    ),
+    "expenses": (
+        [
+            "Travel expenses are reimbursed when submitted with itemized receipts within 60 days of the trip.",
+            "Hotel costs are capped at 180 euros per night in capital cities and 120 euros per night elsewhere.",
+            "Meals during business travel are covered up to a daily allowance of 50 euros; alcohol is never "
+            "reimbursed.",
+        ],
+        [
+            ("How long do I have to submit travel expense receipts?", (0,)),
+            ("What is the hotel cost cap per night?", (1,)),
+            ("What is the daily meal allowance during business travel?", (2,)),
+        ],
+        ["Does that include alcohol?", "And outside capital cities?"],
+    ),
+    "product_zx104": (
+        [
+            "The ZX-104 router supports WiFi 6 with a maximum throughput of 2400 Mbps and up to 64 connected devices.",
+            "Firmware updates for the ZX-104 router are installed automatically every Sunday at 3 am local time.",
+            "To factory reset the ZX-104, hold the reset button for 10 seconds until the status light blinks red.",
+        ],
+        [
+            ("What is the maximum throughput of the ZX-104 router?", (0,)),
+            ("When are ZX-104 firmware updates installed?", (1,)),
+            ("How do I factory reset the ZX-104?", (2,)),
+        ],
+        ["How many devices can it handle?", "Can I disable them?"],
+    ),
+}
+
+# Vocabulario de los chunks de relleno (sin las palabras clave de los temas)
+FILLER_WORDS = """
+    quarterly roadmap strategy synergy alignment stakeholder workshop agenda minutes offsite initiative framework
+    governance milestone deliverable backlog retrospective sprint velocity cadence onboarding mentoring feedback
+    newsletter cafeteria parking badge lobby reception printer stationery furniture plants recycling lighting
+    elevator meeting room whiteboard projector catering volunteer charity sustainability diversity wellbeing
+    training webinar certification library archive glossary template branding logo typography colour palette
+""".split()
+
+
+def topic_chunks() -> List[Document]:
+    docs = []
+    for topic, (chunks, _, _) in TOPICS.items():
+        for page, text in enumerate(chunks):
+            docs.append(Document(page_content=text, metadata={"source": f"{topic}.pdf", "page": page, "id": f"{topic}#{page}"}))
+    return docs
+
+
+def filler_chunks(count: int, seed: int = 0, words: int = 40, topic_share: float = 0.3) -> List[Document]:
+    rng = random.Random(seed)
+    topic_words = [[word for text in chunks for word in text.lower().split()] for chunks, _, _ in TOPICS.values()]
+    docs = []
+    for i in range(count):
+        vocabulary = rng.choice(topic_words)
+        text = " ".join(
+            rng.choice(vocabulary) if rng.random() < topic_share else rng.choice(FILLER_WORDS) for _ in range(words)
+        ).capitalize() + "."
+        docs.append(Document(page_content=text, metadata={"source": f"filler-{i // 10}.pdf", "page": i % 10, "id": f"filler#{i}"}))
+    return docs
+
+
+def corpus(filler: int = 200, seed: int = 0) -> List[Document]:
+    return topic_chunks() + filler_chunks(filler, seed)
+
+
+def labeled_questions() -> List[LabeledQuestion]:
+    return [
+        LabeledQuestion(question, tuple(f"{topic}#{i}" for i in relevant), topic)
+        for topic, (_, questions, _) in TOPICS.items()
+        for question, relevant in questions
+    ]
+
+
+def follow_ups(topic: str) -> List[str]:
+    return TOPICS[topic][2]
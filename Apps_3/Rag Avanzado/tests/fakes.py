@@ -0,0 +1,227 @@
+# fakes.py
+# Sustitutos locales y deterministas de OpenAI y Postgres para los benchmarks
+#
+# -- FakeChatModel: responde según el prompt que recibe (variantes de multi-query,
+#    reformulación de la pregunta o respuesta con el contexto) con una latencia
+#    configurable hasta el primer token y por token
+# -- HashEmbeddings: bolsa de palabras con feature hashing; las preguntas y los
+#    chunks que comparten palabras quedan cerca, sin descargar ningún modelo
+# -- InMemoryVectorStore / InMemoryKeywordSearch: búsqueda por coseno y por
+#    palabras clave sobre los chunks en memoria, con la interfaz que usa
+#    FusionMultiQueryRetriever (PGVector / PostgresKeywordSearch)
+# -- WhitespaceEncoding: tokenizador por palabras para ContextPacker (tiktoken
+#    descarga su vocabulario la primera vez)
+
+import asyncio
+import hashlib
+import math
+import re
+import time
+from collections import Counter
+from typing import Any, AsyncIterator, Iterable, Iterator, List, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.vectorstores import VectorStore
+
+# Palabras que no cuentan para embeddings ni búsqueda por palabras clave
+STOPWORDS = frozenset("""
+    a an and are as at be by can do does for from how i in is it of on or that the this to was what when where which who
+    why will with you your about my me we our they them their its there then than so if not no any all also
+""".split())
+
+# Palabras de la respuesta que se toman del contexto
+ANSWER_WORDS = 40
+
+
+def tokenize(text: str) -> List[str]:
+    return [word for word in re.findall(r"\w+", text.lower()) if word not in STOPWORDS]
+
+
+def _stable_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), "big")
+
+
+class FakeChatModel(BaseChatModel):
+    model_name: str = "fake-rag-model"
+    # Segundos hasta el primer token y entre tokens
+    latency: float = 0.0
+    token_latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-rag"
+
+    @property
+    def _identifying_params(self) -> dict:
+        return {"model_name": self.model_name}
+
+    # Respuesta determinista según el tipo de prompt
+    @staticmethod
+    def respond(prompt: str) -> str:
+        if "Original question:" in prompt:
+            return "\n".join(multi_query_variants(prompt.rsplit("Original question:", 1)[1].strip()))
+        if "Standalone question:" in prompt:
+            return rewrite_follow_up(prompt)
+        if "Answer given the following context:" in prompt:
+            context = prompt.partition("Question:")[0]
+            words = context.replace("Answer given the following context:", "").split()[:ANSWER_WORDS]
+            return f"According to the documents: {' '.join(words)}"
+        return prompt[-200:]
+
+    def _tokens(self, messages: List[BaseMessage]) -> List[str]:
+        text = self.respond("\n".join(str(message.content) for message in messages))
+        return re.findall(r"\S+\s*", text)
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                  **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        time.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                         **kwargs: Any) -> ChatResult:
+        tokens = self._tokens(messages)
+        await asyncio.sleep(self.latency + self.token_latency * len(tokens))
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content="".join(tokens)))])
+
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.latency)
+        for token in self._tokens(messages):
+            time.sleep(self.token_latency)
+            if run_manager:
+                run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager: Any = None,
+                       **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.latency)
+        for token in self._tokens(messages):
+            await asyncio.sleep(self.token_latency)
+            if run_manager:
+                await run_manager.on_llm_new_token(token)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=token))
+
+
+# Tres variantes de la pregunta, una por línea, como pide DEFAULT_QUERY_PROMPT
+def multi_query_variants(question: str) -> List[str]:
+    words = tokenize(question)
+    return [
+        question,
+        f"Information about {' '.join(words)}",
+        " ".join(sorted(words)),
+    ]
+
+
+# Pregunta de seguimiento completada con la última pregunta del historial
+def rewrite_follow_up(prompt: str) -> str:
+    follow_up = prompt.rsplit("Follow Up Input:", 1)[1].split("Standalone question:", 1)[0].strip()
+    history = prompt.split("Chat History:", 1)[1].split("Follow Up Input:", 1)[0]
+    previous = [line[len("Human:"):].strip() for line in history.splitlines() if line.startswith("Human:")]
+    return f"{follow_up} (regarding: {previous[-1]})" if previous else follow_up
+
+
+class HashEmbeddings(Embeddings):
+    def __init__(self, size: int = 256, latency: float = 0.0):
+        self.size = size
+        # Segundos por llamada (una llamada a la API vectoriza todos los textos)
+        self.latency = latency
+        self.model = f"hash-{size}"
+
+    def _embed(self, text: str) -> List[float]:
+        vector = np.zeros(self.size)
+        for word, count in Counter(tokenize(text)).items():
+            h = _stable_hash(word)
+            vector[h % self.size] += (1.0 if (h >> 32) & 1 else -1.0) * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._embed(text) for text in texts]
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+
+class InMemoryVectorStore(VectorStore):
+    # docs se indexan con index_embeddings si se indica (los del loader), así no pasan por la
+    # caché de embeddings de las consultas
+    def __init__(self, embedding_function: Embeddings, search_latency: float = 0.0, docs: Optional[List[Document]] = None,
+                 index_embeddings: Optional[Embeddings] = None, **kwargs: Any):
+        self._embeddings = embedding_function
+        # Segundos por búsqueda (ida y vuelta a la base de datos)
+        self.search_latency = search_latency
+        self.docs: List[Document] = []
+        self._matrix = np.zeros((0, 0))
+        if docs:
+            self.add_documents(docs, embeddings=index_embeddings)
+
+    @property
+    def embeddings(self) -> Embeddings:
+        return self._embeddings
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[List[dict]] = None, embeddings: Optional[Embeddings] = None,
+                  **kwargs: Any) -> List[str]:
+        texts = list(texts)
+        metadatas = metadatas or [{} for _ in texts]
+        vectors = np.array((embeddings or self._embeddings).embed_documents(texts))
+        self._matrix = vectors if not self.docs else np.vstack([self._matrix, vectors])
+        self.docs.extend(Document(page_content=text, metadata=metadata) for text, metadata in zip(texts, metadatas))
+        return [str(len(self.docs) - len(texts) + i) for i in range(len(texts))]
+
+    @classmethod
+    def from_texts(cls, texts: List[str], embedding: Embeddings, metadatas: Optional[List[dict]] = None,
+                   **kwargs: Any) -> "InMemoryVectorStore":
+        store = cls(embedding, **kwargs)
+        store.add_texts(texts, metadatas)
+        return store
+
+    def similarity_search_by_vector(self, embedding: List[float], k: int = 4, **kwargs: Any) -> List[Document]:
+        time.sleep(self.search_latency)
+        if not self.docs:
+            return []
+        scores = self._matrix @ np.asarray(embedding)
+        top = np.argsort(-scores, kind="stable")[:k]
+        return [self.docs[i] for i in top]
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> List[Document]:
+        return self.similarity_search_by_vector(self._embeddings.embed_query(query), k=k)
+
+
+class InMemoryKeywordSearch:
+    # Ranking por palabras en común ponderadas por IDF (lo que hace ts_rank_cd a grandes rasgos)
+    def __init__(self, docs: List[Document], search_latency: float = 0.0):
+        self.docs = docs
+        self.search_latency = search_latency
+        self._terms = [set(tokenize(doc.page_content)) for doc in docs]
+        frequency = Counter(term for terms in self._terms for term in terms)
+        self._idf = {term: math.log(1 + len(docs) / count) for term, count in frequency.items()}
+
+    def search(self, question: str, k: int = 4) -> List[Document]:
+        time.sleep(self.search_latency)
+        query = set(tokenize(question))
+        scored = [(sum(self._idf[t] for t in query & terms), i) for i, terms in enumerate(self._terms)]
+        scored = sorted((item for item in scored if item[0] > 0), key=lambda item: -item[0])[:k]
+        return [Document(page_content=self.docs[i].page_content, metadata=dict(self.docs[i].metadata, keyword_rank=rank))
+                for rank, (score, i) in enumerate(scored)]
+
+
+class WhitespaceEncoding:
+    def encode(self, text: str) -> List[str]:
+        return text.split(" ")
+
+    def decode(self, tokens: List[str]) -> str:
+        return " ".join(tokens)
@@ -0,0 +1,78 @@
+# test_answer_cache.py
+# Pruebas de SemanticAnswerCache
+#
+#   python -m pytest -q tests
+
+import json
+import os
+import re
+
+import pytest
+from langchain_core.documents import Document
+
+from app.answer_cache import SemanticAnswerCache, key_terms
+from tests.fakes import HashEmbeddings
+
+
+class LettersOnlyEmbeddings(HashEmbeddings):
+    # Como ada-002 con preguntas casi iguales: los números apenas cambian el vector
+    def _embed(self, text):
+        return super()._embed(re.sub(r"\d", "", text))
+
+
+def write_manifest(path, version):
+    with open(path, "w") as f:
+        json.dump({"corpus_version": version}, f)
+    # El caché compara el mtime del manifiesto
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + (1 if version == "v2" else 0)))
+
+
+@pytest.fixture
+def cache(tmp_path):
+    manifest = tmp_path / "index-manifest.json"
+    write_manifest(manifest, "v1")
+    return SemanticAnswerCache(LettersOnlyEmbeddings(), manifest_path=str(manifest))
+
+
+def test_key_terms():
+    assert key_terms("What was the 2019 revenue of the ZX-104?") == {"2019", "zx-104"}
+    assert key_terms("How do I reset the router in Madrid?") == {"madrid"}
+    assert key_terms("How long is the hardware warranty?") == frozenset()
+
+
+def test_questions_with_other_numbers_or_names_are_not_the_same(cache):
+    docs = [Document(page_content="Revenue in 2019 was 10M.")]
+    cache.store("What was the 2019 revenue?", "10M", docs)
+    assert cache.lookup("What was the 2020 revenue?") is None
+    assert cache.lookup("What was the revenue?") is None
+    assert cache.lookup("what was the 2019 revenue").answer == "10M"
+
+    cache.store("What was the revenue in Madrid?", "5M", docs)
+    assert cache.lookup("What was the revenue in Paris?") is None
+    assert cache.lookup("What was the revenue in Madrid").answer == "5M"
+
+
+def test_answers_from_an_older_corpus_are_not_stored(cache, tmp_path):
+    docs = [Document(page_content="Two years.")]
+    version = cache.corpus_version()
+    assert cache.lookup("How long is the hardware warranty?") is None
+    # Reindexación mientras se generaba la respuesta
+    write_manifest(tmp_path / "index-manifest.json", "v2")
+    cache.store("How long is the hardware warranty?", "Two years.", docs, corpus_version=version)
+    assert cache.stats()["entries"] == 0
+    assert cache.lookup("How long is the hardware warranty?") is None
+
+    cache.store("How long is the hardware warranty?", "Two years.", docs, corpus_version=cache.corpus_version())
+    assert cache.lookup("How long is the hardware warranty?").corpus_version == "v2"
+
+
+def test_storing_uses_the_version_from_before_generation(cache, tmp_path):
+    version = cache.corpus_version()
+    write_manifest(tmp_path / "index-manifest.json", "v2")
+    storing = cache.storing("How long is the hardware warranty?", version)
+    assert storing.invoke({"docs": []}) == {"docs": []}
+    assert cache.stats()["entries"] == 0
+    # Con la versión actual sí se guarda
+    cache.storing("How long is the hardware warranty?", cache.corpus_version()).invoke({"docs": []})
+    assert cache.stats()["entries"] == 1
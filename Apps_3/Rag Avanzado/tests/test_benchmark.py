@@ -0,0 +1,116 @@
+# test_benchmark.py
+# Pruebas de la cadena RAG y de la app con el backend local de tests/benchmark.py
+#
+# Son los mismos recorridos del benchmark con pocas sesiones y sin latencias
+# simuladas: comprueban que final_chain, /rag/invoke y /rag/sse responden sin
+# errores y que la recuperación encuentra los chunks etiquetados.
+#
+#   python -m pytest -q tests
+
+import asyncio
+import random
+
+import pytest
+
+import app.rag_chain as rag_chain
+from tests.benchmark import (
+    PATCHED,
+    BenchmarkConfig,
+    LatencyStats,
+    evaluate_retrieval,
+    fake_backend,
+    parse_sse,
+    run_load,
+    session_script,
+)
+from tests.dataset import corpus, labeled_questions
+from tests.fakes import FakeChatModel, HashEmbeddings, InMemoryVectorStore
+
+CONFIG = BenchmarkConfig(filler=50)
+
+
+def test_labeled_questions_point_to_corpus_chunks():
+    ids = {doc.metadata["id"] for doc in corpus(filler=10)}
+    for labeled in labeled_questions():
+        assert set(labeled.relevant) <= ids
+
+
+def test_fake_embeddings_find_the_answer_chunk():
+    docs = corpus(filler=50)
+    store = InMemoryVectorStore(HashEmbeddings(), docs=docs)
+    for labeled in labeled_questions():
+        found = store.similarity_search(labeled.question, k=4)
+        assert labeled.relevant[0] in [doc.metadata["id"] for doc in found]
+
+
+def test_fake_llm_rewrites_follow_ups_with_history():
+    prompt = rag_chain.standalone_question_prompt.format(
+        chat_history="Human: How long is the hardware warranty?\nAI: Two years.",
+        question="Does it cover water damage?",
+    )
+    assert FakeChatModel.respond(prompt) == "Does it cover water damage? (regarding: How long is the hardware warranty?)"
+
+
+def test_fake_backend_restores_rag_chain():
+    original = {name: getattr(rag_chain, name) for name in PATCHED}
+    with fake_backend(CONFIG):
+        assert rag_chain.ChatOpenAI is not original["ChatOpenAI"]
+    assert {name: getattr(rag_chain, name) for name in PATCHED} == original
+    assert rag_chain.get_llm.cache_info().currsize == 0
+
+
+def test_retrieval_quality():
+    with fake_backend(CONFIG):
+        quality = asyncio.run(evaluate_retrieval(ks=(1, 5)))
+    assert quality["questions"] == len(labeled_questions())
+    assert quality["recall"]["@5"] >= 0.9
+    assert quality["context_recall"] >= 0.9
+
+
+@pytest.mark.parametrize("mode", ["chain", "invoke", "sse"])
+def test_concurrent_sessions(mode):
+    with fake_backend(CONFIG):
+        result = asyncio.run(run_load(mode, sessions=4, turns=3, concurrency=2))
+    assert (result.requests, result.errors) == (12, 0), result.first_error
+    assert result.stages["request"]["count"] == 12
+    stage_prefix = "" if mode == "chain" else "server_"
+    if mode != "invoke":
+        # Las preguntas de seguimiento pasan por la reformulación
+        assert result.stages[f"{stage_prefix}rewrite"]["count"] > 0
+        assert result.stages[f"{stage_prefix}generation"]["count"] > 0
+
+
+def test_chain_saves_history_and_caches_answers():
+    question = labeled_questions()[0].question
+    with fake_backend(CONFIG):
+        first = rag_chain.final_chain.invoke({"question": question}, config={"configurable": {"session_id": "history-test"}})
+        # La misma pregunta en otra sesión nueva sale de la caché
+        second = rag_chain.final_chain.invoke({"question": question}, config={"configurable": {"session_id": "other"}})
+        third = rag_chain.final_chain.invoke({"question": question}, config={"configurable": {"session_id": "history-test"}})
+        messages = rag_chain.get_session_history("history-test").messages
+        stats = rag_chain.get_answer_cache().stats()
+    assert first["answer"].content.startswith("According to the documents:")
+    assert second["answer"].content == third["answer"].content == first["answer"].content
+    assert len(messages) == 4
+    # Con historial y sin reformular, la pregunta no pasa por la caché
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_session_script_is_deterministic():
+    assert session_script(random.Random(3), 3) == session_script(random.Random(3), 3)
+    assert len(session_script(random.Random(3), 3)) == 3
+
+
+def test_latency_percentiles():
+    stats = LatencyStats()
+    for ms in range(1, 101):
+        stats.add("request", ms / 1000)
+    summary = stats.summary()["request"]
+    assert summary["count"] == 100
+    assert summary["p50_ms"] == pytest.approx(50.5)
+    assert summary["p99_ms"] == pytest.approx(99.01)
+
+
+def test_parse_sse():
+    text = 'event: data\r\ndata: {"docs": []}\r\n\r\nevent: timings\r\ndata: {"total_ms": 1.5}\r\n\r\nevent: end\r\n\r\n'
+    assert parse_sse(text) == [("data", {"docs": []}), ("timings", {"total_ms": 1.5}), ("end", None)]
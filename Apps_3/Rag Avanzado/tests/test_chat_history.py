@@ -0,0 +1,71 @@
+# test_chat_history.py
+# Pruebas de ChatHistoryStore sobre SQLite
+#
+#   python -m pytest -q tests
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+from app.chat_history import ChatHistoryStore
+
+
+@pytest.fixture
+def make_store(tmp_path):
+    stores = []
+
+    def make(**kwargs):
+        store = ChatHistoryStore(f"sqlite:///{tmp_path / 'history.sqlite3'}", flush_interval=0.01, **kwargs)
+        stores.append(store)
+        return store
+
+    yield make
+    for store in stores:
+        store.close()
+
+
+def contents(messages):
+    return [message.content for message in messages]
+
+
+def test_messages_are_saved_and_windowed(make_store):
+    store = make_store(window=3)
+    history = store.session("s")
+    history.add_messages([HumanMessage(content=str(i)) for i in range(5)])
+    assert contents(history.messages) == ["2", "3", "4"]
+    store.close()
+    assert contents(make_store(window=3).session("s").messages) == ["2", "3", "4"]
+
+
+def test_turn_added_during_a_load_is_not_lost(make_store):
+    store = make_store(max_sessions=10)
+    load = store._load
+
+    # Un turno que llega mientras se lee la ventana de la base de datos
+    def load_with_concurrent_turn(session_id):
+        messages = load(session_id)
+        store.add_messages(session_id, [HumanMessage(content="question"), AIMessage(content="answer")])
+        return messages
+
+    store._load = load_with_concurrent_turn
+    assert store.get_messages("s") == []
+    store._load = load
+    assert contents(store.get_messages("s")) == ["question", "answer"]
+    assert store._loading == {} and store._versions == {}
+
+
+def test_cache_is_disabled_by_default(make_store):
+    # Con varios workers cada uno lee siempre de la base de datos lo que escriben los demás
+    first, second = make_store(), make_store()
+    assert second.get_messages("s") == []
+    first.add_messages("s", [HumanMessage(content="hello")])
+    first.flush()
+    assert contents(second.get_messages("s")) == ["hello"]
+    assert second._cache == {}
+
+    # Con la caché activada (un único worker), el segundo proceso no ve el turno nuevo
+    cached = make_store(max_sessions=10)
+    assert contents(cached.get_messages("s")) == ["hello"]
+    first.add_messages("s", [AIMessage(content="hi")])
+    first.flush()
+    assert contents(cached.get_messages("s")) == ["hello"]
+    assert contents(second.get_messages("s")) == ["hello", "hi"]
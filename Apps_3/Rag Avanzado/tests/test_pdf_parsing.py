@@ -0,0 +1,113 @@
+# test_pdf_parsing.py
+# Pruebas de PdfParserPool con funciones de parseo de prueba (sin unstructured)
+#
+# Los trabajadores arrancan con "spawn" e importan el módulo de la función de parseo,
+# así que esas funciones se escriben en un módulo temporal.
+#
+#   python -m pytest -q tests
+
+import os
+import sys
+import textwrap
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "rag-data-loader"))
+from pdf_parsing import PdfParserPool  # noqa: E402
+
+PARSERS = '''
+import os
+import time
+
+from langchain_core.documents import Document
+
+# El primer trabajador que importa el módulo se cuelga al arrancar
+HANG_MARKER = {marker!r}
+if os.path.exists(HANG_MARKER):
+    os.remove(HANG_MARKER)
+    time.sleep(600)
+
+
+def parse(path):
+    return [Document(page_content=path)]
+
+
+# Los PDFs con "slow" en el nombre no terminan nunca
+def parse_slowly(path):
+    if "slow" in path:
+        time.sleep(600)
+    return parse(path)
+
+
+# Los PDFs con "crash" en el nombre matan siempre al trabajador; los que tienen
+# un archivo .crash al lado, solo la primera vez
+def parse_or_crash(path):
+    if os.path.exists(path + ".crash"):
+        os.remove(path + ".crash")
+        os._exit(3)
+    if "crash" in path:
+        os._exit(3)
+    return parse(path)
+'''
+
+
+@pytest.fixture
+def parsers(tmp_path, monkeypatch):
+    marker = tmp_path / "hang-once"
+    (tmp_path / "test_parsers.py").write_text(textwrap.dedent(PARSERS.format(marker=str(marker))))
+    monkeypatch.syspath_prepend(str(tmp_path))
+    sys.modules.pop("test_parsers", None)
+    import test_parsers
+    yield test_parsers, marker
+    sys.modules.pop("test_parsers", None)
+
+
+def test_all_pdfs_are_parsed(parsers):
+    module, _ = parsers
+    pool = PdfParserPool(workers=2, parse=module.parse)
+    results = sorted(pool.imap_unordered(["a.pdf", "b.pdf", "c.pdf"]), key=lambda parsed: parsed.path)
+    assert [(parsed.path, parsed.docs[0].page_content, parsed.error) for parsed in results] == [
+        ("a.pdf", "a.pdf", None), ("b.pdf", "b.pdf", None), ("c.pdf", "c.pdf", None),
+    ]
+
+
+def test_worker_that_hangs_while_starting_is_replaced(parsers):
+    module, marker = parsers
+    marker.touch()
+    pool = PdfParserPool(workers=1, parse=module.parse, startup_timeout=5)
+    [parsed] = pool.imap_unordered(["a.pdf"])
+    assert (parsed.path, parsed.error, parsed.attempts) == ("a.pdf", None, 2)
+    assert not marker.exists()
+
+    # Sin reintentos, el PDF se entrega con el error del arranque
+    marker.touch()
+    pool = PdfParserPool(workers=1, parse=module.parse, startup_timeout=5, retries=0)
+    [parsed] = pool.imap_unordered(["a.pdf"])
+    assert parsed.error == "worker did not start within 5s"
+
+
+def test_pdf_that_exceeds_the_timeout_is_reported(parsers):
+    module, _ = parsers
+    pool = PdfParserPool(workers=2, parse=module.parse_slowly, timeout=2)
+    results = {parsed.path: parsed for parsed in pool.imap_unordered(["slow.pdf", "a.pdf", "b.pdf"])}
+    slow = results.pop("slow.pdf")
+    assert (slow.docs, slow.error, slow.attempts) == ([], "timed out after 2s", 2)
+    # Los demás PDFs se parsean en los trabajadores que sustituyen a los que se mataron
+    ordered = sorted(results.values(), key=lambda parsed: parsed.path)
+    assert [(parsed.path, parsed.docs[0].page_content, parsed.error) for parsed in ordered] == [
+        ("a.pdf", "a.pdf", None), ("b.pdf", "b.pdf", None),
+    ]
+
+
+def test_pdf_that_kills_its_worker_is_retried(parsers, tmp_path):
+    module, _ = parsers
+    flaky = str(tmp_path / "flaky.pdf")
+    (tmp_path / "flaky.pdf.crash").touch()
+    pool = PdfParserPool(workers=1, parse=module.parse_or_crash)
+    results = {parsed.path: parsed for parsed in pool.imap_unordered(["crash.pdf", flaky, "a.pdf"])}
+    assert (results["crash.pdf"].docs, results["crash.pdf"].error, results["crash.pdf"].attempts) == (
+        [], "worker exited with code 3", 2,
+    )
+    # Un fallo en un intento no impide que el reintento funcione
+    assert (results[flaky].docs[0].page_content, results[flaky].error, results[flaky].attempts) == (flaky, None, 2)
+    assert (results["a.pdf"].error, results["a.pdf"].attempts) == (None, 1)
@@ -0,0 +1,70 @@
+# test_question_rewrite.py
+# Pruebas de la heurística que decide si una pregunta remite al historial y de su
+# efecto en la caché de respuestas, compartida entre sesiones
+#
+#   python -m pytest -q tests
+
+import asyncio
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+
+import app.rag_chain as rag_chain
+from app.question_rewrite import can_share_answer, has_reference, needs_rewrite
+from app.rag_stream import astream_rag
+from tests.benchmark import BenchmarkConfig, fake_backend
+from tests.dataset import labeled_questions
+
+HISTORY = [HumanMessage(content="How long is the hardware warranty?"), AIMessage(content="Two years.")]
+
+
+@pytest.mark.parametrize("question", [
+    "Give me more details",
+    "Tell me more about the architecture",
+    "Can you elaborate on the second point?",
+    "Compare the methods in terms of accuracy",
+    "Please continue with the explanation",
+    "What about the refund policy?",
+    "Does it cover water damage?",
+    "Why?",
+    "Dame más detalles sobre la arquitectura",
+    "¿Puedes ampliar la explicación anterior?",
+    "Compara los métodos en términos de precisión",
+    "Explícamelo con un ejemplo sencillo",
+    "¿Y en el año 2020?",
+    "Continúa con la lista de requisitos",
+])
+def test_follow_ups_have_references(question):
+    assert has_reference(question)
+    assert needs_rewrite(question, HISTORY)
+    assert can_share_answer(question, HISTORY)
+
+
+@pytest.mark.parametrize("question", [
+    "How many days do customers have to request a refund?",
+    "What is the minimum password length for company accounts?",
+    "¿Cuántos días de vacaciones tienen los empleados a tiempo completo?",
+    "¿Cuál es el límite del coste de hotel por noche?",
+])
+def test_self_contained_questions(question):
+    assert not has_reference(question)
+    assert not needs_rewrite(question, HISTORY)
+    # Sin reformular, su respuesta solo se comparte si no hay historial
+    assert can_share_answer(question, [])
+    assert not can_share_answer(question, HISTORY)
+
+
+def test_unrewritten_follow_ups_skip_the_answer_cache():
+    first, second = (labeled.question for labeled in labeled_questions()[:2])
+    with fake_backend(BenchmarkConfig(filler=50)):
+        rag_chain.final_chain.invoke({"question": first}, config={"configurable": {"session_id": "a"}})
+        rag_chain.final_chain.invoke({"question": second}, config={"configurable": {"session_id": "a"}})
+
+        async def stream():
+            return [event async for event in astream_rag(second, "b")]
+
+        # "b" no tiene historial: su respuesta se guarda
+        timings = asyncio.run(stream())[-1][1]
+        stats = rag_chain.get_answer_cache().stats()
+    assert not timings["cache_hit"]
+    assert (stats["hits"], stats["entries"]) == (0, 2)
@@ -0,0 +1,50 @@
+# test_rag_chain.py
+# Pruebas de la creación perezosa de componentes y de /readyz en app.rag_chain
+#
+#   python -m pytest -q tests
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import sqlalchemy
+
+import app.rag_chain as rag_chain
+
+
+def test_concurrent_first_calls_build_one_component():
+    built = []
+
+    @rag_chain.component
+    def get_store():
+        # Una creación lenta (pool de conexiones, hilo de escritura...)
+        time.sleep(0.05)
+        built.append(threading.get_ident())
+        return object()
+
+    with ThreadPoolExecutor(8) as pool:
+        stores = list(pool.map(lambda _: get_store(), range(8)))
+    assert len(built) == 1
+    assert all(store is stores[0] for store in stores)
+    assert get_store.cache_info().currsize == 1
+    get_store.cache_clear()
+    assert get_store() is not stores[0]
+
+
+class _Store:
+    def __init__(self, engine):
+        self._bind = self.engine = self.encoding = engine
+
+
+def test_readiness_pings_the_vector_store_engine(monkeypatch):
+    working = sqlalchemy.create_engine("sqlite://")
+    broken = sqlalchemy.create_engine("sqlite:////nonexistent/dir/db.sqlite3")
+    for name in ("get_embeddings", "get_llm", "get_rewrite_llm", "get_multiquery", "get_reranker", "get_answer_cache"):
+        monkeypatch.setattr(rag_chain, name, object)
+    monkeypatch.setattr(rag_chain, "get_context_packer", lambda: _Store(working))
+    monkeypatch.setattr(rag_chain, "get_chat_history_store", lambda: _Store(working))
+    monkeypatch.setattr(rag_chain, "get_vector_store", lambda: _Store(broken))
+    monkeypatch.setattr(rag_chain, "get_keyword_search", lambda: _Store(working))
+    checks = rag_chain.check_readiness()
+    assert checks["vector_store"].startswith("OperationalError")
+    assert {name for name, result in checks.items() if result != "ok"} == {"vector_store"}
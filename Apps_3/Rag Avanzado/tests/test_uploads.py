@@ -0,0 +1,102 @@
+# test_uploads.py
+# Pruebas de UploadStore.save_request con cuerpos multipart generados por httpx
+#
+#   python -m pytest -q tests
+
+import asyncio
+import os
+
+import httpx
+import pytest
+
+from app.uploads import FileTooLarge, UploadStore
+
+
+def multipart_request(files, chunk_size=1024):
+    request = httpx.Request("POST", "http://test/upload", files=files, data={"note": "ignored"})
+    body = request.read()
+    chunks = [body[i:i + chunk_size] for i in range(0, len(body), chunk_size)]
+    return {key.lower(): value for key, value in request.headers.items()}, chunks
+
+
+class Stream:
+    # Cuerpo de la petición por bloques; cuenta los que se han leído
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.read = 0
+
+    async def __aiter__(self):
+        for chunk in self.chunks:
+            self.read += 1
+            yield chunk
+
+
+def save(store, headers, stream):
+    return asyncio.run(store.save_request(headers, stream))
+
+
+@pytest.fixture
+def store(tmp_path):
+    return UploadStore(str(tmp_path), max_file_size=10_000, manifest_path=str(tmp_path / "manifest.json"))
+
+
+def test_files_are_saved_and_duplicates_skipped(store, tmp_path):
+    content = os.urandom(5000)
+    headers, chunks = multipart_request([
+        ("files", ("a.pdf", content, "application/pdf")),
+        ("files", ("b.pdf", content, "application/pdf")),
+        ("files", ("../c.pdf", b"other", "application/pdf")),
+    ])
+    stored = save(store, headers, Stream(chunks))
+    assert [(f.filename, f.size, f.duplicate_of) for f in stored] == [
+        ("a.pdf", 5000, None), ("b.pdf", 5000, "a.pdf"), ("c.pdf", 5, None),
+    ]
+    assert (tmp_path / "a.pdf").read_bytes() == content
+    assert sorted(os.listdir(tmp_path)) == ["a.pdf", "c.pdf"]
+
+
+def test_oversized_file_is_rejected_while_receiving(store, tmp_path):
+    headers, chunks = multipart_request([("files", ("big.pdf", os.urandom(100_000), "application/pdf"))])
+    stream = Stream(chunks)
+    with pytest.raises(FileTooLarge):
+        save(store, headers, stream)
+    # Se deja de leer en cuanto el archivo pasa del límite
+    assert stream.read < len(chunks) / 2
+    assert os.listdir(tmp_path) == []
+
+
+def test_content_length_is_checked_before_reading(tmp_path):
+    store = UploadStore(str(tmp_path), max_file_size=10_000, max_request_size=20_000)
+    headers, chunks = multipart_request([("files", ("big.pdf", os.urandom(30_000), "application/pdf"))])
+    stream = Stream(chunks)
+    with pytest.raises(FileTooLarge):
+        save(store, headers, stream)
+    assert stream.read == 0
+
+
+def test_invalid_requests(store):
+    headers, chunks = multipart_request([("other", ("a.pdf", b"data", "application/pdf"))])
+    with pytest.raises(ValueError):
+        save(store, headers, Stream(chunks))
+    with pytest.raises(ValueError):
+        save(store, {"content-type": "application/json"}, Stream([b"{}"]))
+    headers, chunks = multipart_request([("files", ("a.pdf", os.urandom(5000), "application/pdf"))])
+    # Cuerpo cortado a mitad del archivo
+    with pytest.raises(ValueError):
+        save(store, headers, Stream(chunks[:2]))
+
+
+def test_upload_endpoint(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import app.server as server
+
+    store = UploadStore(str(tmp_path), max_file_size=10_000, manifest_path=str(tmp_path / "manifest.json"))
+    monkeypatch.setattr(server, "upload_store", store)
+    client = TestClient(server.app)
+    response = client.post("/upload", files=[("files", ("a.pdf", b"%PDF-1.4", "application/pdf"))])
+    assert response.status_code == 200
+    assert response.json()["filenames"] == ["a.pdf"]
+    response = client.post("/upload", files=[("files", ("big.pdf", os.urandom(20_000), "application/pdf"))])
+    assert response.status_code == 413
+    assert client.get("/openapi.json").json()["paths"]["/upload"]["post"]["requestBody"]["content"]["multipart/form-data"]
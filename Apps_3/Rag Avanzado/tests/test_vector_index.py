@@ -0,0 +1,112 @@
+# test_vector_index.py
+# Pruebas del SQL de ensure_ann_index (con una conexión que lo registra) y de IndexedPGVector
+#
+#   python -m pytest -q tests
+
+import uuid
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.vector_index import IndexedPGVector, collection_prefix, ensure_ann_index, index_name
+
+COLLECTION = uuid.UUID("6f1c3a52-9d0e-4b7a-8c1f-2e3d4a5b6c7d")
+
+
+class Result:
+    def __init__(self, scalar=None, rows=()):
+        self._scalar = scalar
+        self._rows = list(rows)
+
+    def scalar(self):
+        return self._scalar
+
+    def fetchall(self):
+        return self._rows
+
+
+class RecordingEngine:
+    # Responde a las consultas de ensure_ann_index y guarda todo el SQL ejecutado
+    def __init__(self, collection=COLLECTION, existing=(), rows=5000):
+        self.collection = collection
+        self.existing = list(existing)
+        self.rows = rows
+        self.statements = []
+
+    def connect(self):
+        return self
+
+    def execution_options(self, **options):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, statement, params=None):
+        sql = " ".join(str(statement).split())
+        self.statements.append((sql, params))
+        if "FROM langchain_pg_collection" in sql:
+            return Result(scalar=self.collection)
+        if "FROM pg_indexes" in sql:
+            assert params["prefix"] == collection_prefix(self.collection).replace("_", r"\_") + "%"
+            return Result(rows=[SimpleNamespace(indexname=name) for name in self.existing])
+        if "count(*)" in sql:
+            return Result(scalar=self.rows)
+        return Result()
+
+    def ddl(self):
+        return [sql for sql, _ in self.statements if not sql.startswith("SELECT")]
+
+
+def test_index_is_partial_on_the_collection_and_the_dimension():
+    old = index_name(COLLECTION, "hnsw", m=8)
+    engine = RecordingEngine(existing=[old])
+    name = ensure_ann_index(engine, "docs", "hnsw", dimensions=1536)
+    assert name == index_name(COLLECTION, "hnsw") and len(name) <= 63
+    create, drop = engine.ddl()
+    # Sin ALTER TABLE: la columna compartida no cambia
+    assert create == (
+        f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {name} ON langchain_pg_embedding "
+        "USING hnsw ((embedding::vector(1536)) vector_cosine_ops) WITH (m = 16, ef_construction = 64) "
+        f"WHERE collection_id = '{COLLECTION}'"
+    )
+    assert drop == f"DROP INDEX CONCURRENTLY IF EXISTS {old}"
+
+
+def test_ivfflat_lists_follow_the_collection_size():
+    engine = RecordingEngine(rows=5000)
+    name = ensure_ann_index(engine, "docs", "ivfflat", distance="l2", dimensions=768)
+    assert name.endswith("ivfflat_l2_d768_lists5")
+    [(count, params)] = [(sql, params) for sql, params in engine.statements if "count(*)" in sql]
+    assert "WHERE collection_id = :collection" in count and params == {"collection": COLLECTION}
+    assert "USING ivfflat ((embedding::vector(768)) vector_l2_ops) WITH (lists = 5)" in engine.ddl()[0]
+
+
+def test_none_only_drops_the_collection_indexes():
+    existing = index_name(COLLECTION, "hnsw")
+    engine = RecordingEngine(existing=[existing])
+    assert ensure_ann_index(engine, "docs", "none") is None
+    assert engine.ddl() == [f"DROP INDEX CONCURRENTLY IF EXISTS {existing}"]
+
+
+def test_unknown_collection():
+    with pytest.raises(ValueError):
+        ensure_ann_index(RecordingEngine(collection=None), "docs")
+
+
+def test_distances_use_the_index_expression():
+    pytest.importorskip("pgvector")
+    from langchain_community.vectorstores.pgvector import DistanceStrategy, _get_embedding_collection_store
+
+    # Sin __init__, que conecta con la base de datos
+    store = object.__new__(IndexedPGVector)
+    store._bind = None
+    store.dimensions = 1536
+    store._distance_strategy = DistanceStrategy.COSINE
+    store.EmbeddingStore, _ = _get_embedding_collection_store()
+    sql = str(store.distance_strategy([0.0] * 1536).compile(dialect=postgresql.dialect()))
+    assert sql.startswith("CAST(langchain_pg_embedding.embedding AS VECTOR(1536)) <=>")
@@ -16,6 +16,9 @@ class Settings(BaseSettings):
     AWS_KEY: str  # Clave de AWS
     AWS_SECRET: str  # Secreto de AWS
     AWS_S3_BUCKET: str = "pdf-basic-app"  # Nombre del bucket S3
+    VECTOR_CACHE_DIR: str = ".vector_cache"  # Carpeta de los índices FAISS en caché
+    VECTOR_CACHE_MAX_DISK_ENTRIES: int = 100  # Máximo de índices guardados en disco
+    VECTOR_CACHE_MAX_MEMORY_ENTRIES: int = 8  # Máximo de índices cargados en memoria
 
     # Método estático para obtener un cliente S3 autenticado
     @staticmethod
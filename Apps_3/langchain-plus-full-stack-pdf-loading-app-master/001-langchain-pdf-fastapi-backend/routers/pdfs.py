@@ -1,3 +1,4 @@
+from functools import lru_cache
 from typing import List
 from sqlalchemy.orm import Session
 from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File
@@ -11,12 +12,10 @@ from langchain import OpenAI, PromptTemplate
 from langchain.chains import LLMChain
 
 # Necessary imports to chat with a PDF file
-from langchain.document_loaders import PyPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain.embeddings.openai import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
 from langchain.chains import RetrievalQA
 from schemas import QuestionRequest
+from config import Settings
+from vector_cache import VectorIndexCache
 llm = OpenAI()
 
 router = APIRouter(prefix="/pdfs")
@@ -57,8 +56,10 @@ def update_pdf(id: int, pdf: schemas.PDFRequest, db: Session = Depends(get_db)):
 
 @router.delete("/{id}", status_code=status.HTTP_200_OK)
 def delete_pdf(id: int, db: Session = Depends(get_db)):
+    pdf = crud.read_pdf(db, id)
     if not crud.delete_pdf(db, id):
         raise HTTPException(status_code=404, detail="PDF not found")
+    get_vector_cache().forget(pdf.file)
     return {"message": "PDF successfully deleted"}
 
 
@@ -86,6 +87,16 @@ async def summarize_text(text: str):
     return {'summary': summary}
 
 
+# One FAISS index cache per worker, shared by every question
+@lru_cache()
+def get_vector_cache():
+    settings = Settings()
+    return VectorIndexCache(
+        settings.VECTOR_CACHE_DIR,
+        max_disk_entries=settings.VECTOR_CACHE_MAX_DISK_ENTRIES,
+        max_memory_entries=settings.VECTOR_CACHE_MAX_MEMORY_ENTRIES,
+    )
+
 # Ask a question about one PDF file
 @router.post("/qa-pdf/{id}")
 def qa_pdf_by_id(id: int, question_request: QuestionRequest,db: Session = Depends(get_db)):
@@ -93,12 +104,7 @@ def qa_pdf_by_id(id: int, question_request: QuestionRequest,db: Session = Depend
     if pdf is None:
         raise HTTPException(status_code=404, detail="PDF not found")
     print(pdf.file)
-    loader = PyPDFLoader(pdf.file)
-    document = loader.load()
-    text_splitter = RecursiveCharacterTextSplitter(chunk_size=3000,chunk_overlap=400)
-    document_chunks = text_splitter.split_documents(document)
-    embeddings = OpenAIEmbeddings()
-    stored_embeddings = FAISS.from_documents(document_chunks, embeddings)
+    stored_embeddings = get_vector_cache().get(pdf.file)
     QA_chain = RetrievalQA.from_chain_type(llm=llm,chain_type="stuff",retriever=stored_embeddings.as_retriever())
     question = question_request.question
     answer = QA_chain.run(question)
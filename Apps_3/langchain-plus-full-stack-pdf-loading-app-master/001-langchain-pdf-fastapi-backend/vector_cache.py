@@ -0,0 +1,164 @@
+# vector_cache.py
+# Caché de índices FAISS por PDF, indexados por el hash del contenido del archivo.
+#
+# Dos niveles:
+# -- memoria: los índices más usados quedan cargados (LRU en un OrderedDict)
+# -- disco: cada índice se guarda con FAISS.save_local en <cache_dir>/<hash>/
+#    y se expulsa el menos usado cuando se supera el máximo de entradas
+#
+# Así las preguntas repetidas sobre el mismo PDF no vuelven a descargar,
+# dividir ni generar embeddings del documento.
+
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+
+import requests
+from langchain.document_loaders import PyPDFLoader
+from langchain.text_splitter import RecursiveCharacterTextSplitter
+from langchain.embeddings.openai import OpenAIEmbeddings
+from langchain.vectorstores import FAISS
+
+# Parámetros del splitter; forman parte de la clave para que un cambio invalide la caché
+CHUNK_SIZE = 3000
+CHUNK_OVERLAP = 400
+
+
+# Leer los bytes del PDF, ya sea una URL (S3) o una ruta local
+def _read_pdf_bytes(location: str) -> bytes:
+    if os.path.isfile(location):
+        with open(location, "rb") as f:
+            return f.read()
+    response = requests.get(location, timeout=60)
+    response.raise_for_status()
+    return response.content
+
+
+# Dividir el PDF en chunks y crear el índice FAISS (la parte costosa)
+def _build_index(content: bytes, embeddings: OpenAIEmbeddings) -> FAISS:
+    with tempfile.NamedTemporaryFile(suffix=".pdf", delete=False) as tmp:
+        tmp.write(content)
+        tmp_path = tmp.name
+    try:
+        document = PyPDFLoader(tmp_path).load()
+    finally:
+        os.remove(tmp_path)
+    text_splitter = RecursiveCharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+    document_chunks = text_splitter.split_documents(document)
+    return FAISS.from_documents(document_chunks, embeddings)
+
+
+class VectorIndexCache:
+    def __init__(self, cache_dir: str, max_disk_entries: int = 100, max_memory_entries: int = 8):
+        self.cache_dir = cache_dir
+        self.max_disk_entries = max_disk_entries
+        self.max_memory_entries = max_memory_entries
+        self.embeddings = OpenAIEmbeddings()
+        # hash del contenido -> índice FAISS cargado
+        self._memory = OrderedDict()
+        # URL del PDF -> hash del contenido; evita descargar el archivo en cada pregunta
+        self._hashes = {}
+        self._lock = threading.Lock()
+        # Un lock por hash para que dos peticiones simultáneas no construyan el mismo índice
+        self._build_locks = {}
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+    # Clave del índice: contenido del PDF + configuración que afecta a los vectores
+    def _content_key(self, content: bytes) -> str:
+        digest = hashlib.sha256(content)
+        model = getattr(self.embeddings, "model", "")
+        digest.update(f"|{CHUNK_SIZE}|{CHUNK_OVERLAP}|{model}".encode())
+        return digest.hexdigest()
+
+    def _index_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    def _remember(self, key: str, store: FAISS):
+        with self._lock:
+            self._memory[key] = store
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+
+    def _from_memory(self, key: str):
+        with self._lock:
+            store = self._memory.get(key)
+            if store is not None:
+                self._memory.move_to_end(key)
+            return store
+
+    def _load_from_disk(self, key: str):
+        path = self._index_path(key)
+        if not os.path.isdir(path):
+            return None
+        # Actualizar la fecha de modificación para que la expulsión LRU la respete
+        os.utime(path)
+        try:
+            return FAISS.load_local(path, self.embeddings, allow_dangerous_deserialization=True)
+        except TypeError:
+            # Versiones anteriores de langchain no aceptan allow_dangerous_deserialization
+            return FAISS.load_local(path, self.embeddings)
+
+    def _save_to_disk(self, key: str, store: FAISS):
+        path = self._index_path(key)
+        # Guardar en un directorio temporal y renombrar, para no dejar índices a medias
+        tmp_path = tempfile.mkdtemp(dir=self.cache_dir, prefix=".tmp-")
+        try:
+            store.save_local(tmp_path)
+            os.replace(tmp_path, path)
+        except OSError:
+            shutil.rmtree(tmp_path, ignore_errors=True)
+            if not os.path.isdir(path):
+                raise
+        self._evict_disk()
+
+    # Eliminar del disco los índices menos usados recientemente
+    def _evict_disk(self):
+        entries = [
+            os.path.join(self.cache_dir, name)
+            for name in os.listdir(self.cache_dir)
+            if not name.startswith(".")
+        ]
+        if len(entries) <= self.max_disk_entries:
+            return
+        entries.sort(key=os.path.getmtime)
+        for path in entries[:len(entries) - self.max_disk_entries]:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _build_lock(self, key: str) -> threading.Lock:
+        with self._lock:
+            return self._build_locks.setdefault(key, threading.Lock())
+
+    # Obtener el índice FAISS del PDF: memoria, luego disco, y solo si no existe se construye
+    def get(self, location: str) -> FAISS:
+        key = self._hashes.get(location)
+        if key is not None:
+            store = self._from_memory(key)
+            if store is not None:
+                return store
+
+        content = None
+        if key is None:
+            content = _read_pdf_bytes(location)
+            key = self._content_key(content)
+            self._hashes[location] = key
+
+        with self._build_lock(key):
+            store = self._from_memory(key) or self._load_from_disk(key)
+            if store is None:
+                if content is None:
+                    content = _read_pdf_bytes(location)
+                store = _build_index(content, self.embeddings)
+                self._save_to_disk(key, store)
+            self._remember(key, store)
+        return store
+
+    # Olvidar una URL (por ejemplo, al borrar o actualizar el registro PDF)
+    def forget(self, location: str):
+        key = self._hashes.pop(location, None)
+        if key is not None:
+            with self._lock:
+                self._memory.pop(key, None)
@@ -1,14 +1,41 @@
-from timeit import timeit
-import math
+"""
+Benchmarks for thefuzz.
+
+Times utils.full_process, every fuzz scorer on ASCII and unicode inputs and
+the process.* functions on corpora of several sizes. The results can be
+written as JSON and compared with a previous run:
+
+    python benchmarks.py --output baseline.json
+    # ... change the code ...
+    python benchmarks.py --baseline baseline.json --threshold 0.1
+
+The second run exits with status 1 if a benchmark got slower than the
+baseline by more than the threshold (10% here) and by more than the noise
+floor (--noise-floor, in nanoseconds per call). Baselines are only
+meaningful on the machine they were recorded on.
+
+The benchmarks call the same strings over and over, so the full_process
+cache is disabled while they run: they time the processing, not cache hits.
+"""
+import argparse
 import csv
+import json
+import math
+import os
+import platform
+import random
+import string
+import sys
+from timeit import Timer
 
-iterations = 100000
+import rapidfuzz
 
+from thefuzz import __version__, fuzz, process, utils
 
-reader = csv.DictReader(open('data/titledata.csv'), delimiter='|')
-titles = [i['custom_title'] for i in reader]
-title_blob = '\n'.join(titles)
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
 
+with open(os.path.join(DATA_DIR, 'titledata.csv')) as f:
+    titles = [i['custom_title'] for i in csv.DictReader(f, delimiter='|')]
 
 cirque_strings = [
     "cirque du soleil - zarkana - las vegas",
@@ -38,73 +65,170 @@ mixed_strings = [
     "a\xac\u1234\u20ac\U00008000"
 ]
 
-common_setup = "from thefuzz import fuzz, utils; "
+scorers = {
+    'ratio': fuzz.ratio,
+    'partial_ratio': fuzz.partial_ratio,
+    'token_sort_ratio': fuzz.token_sort_ratio,
+    'token_set_ratio': fuzz.token_set_ratio,
+    'partial_token_sort_ratio': fuzz.partial_token_sort_ratio,
+    'partial_token_set_ratio': fuzz.partial_token_set_ratio,
+    'QRatio': fuzz.QRatio,
+    'UQRatio': fuzz.UQRatio,
+    'WRatio': fuzz.WRatio,
+    'UWRatio': fuzz.UWRatio,
+}
+
+inputs = {
+    'ascii': ("cirque du soleil", "zarakana - cirque du soleil - bellagio"),
+    'unicode': ("Cães danados à noite", "\xacCamarões assados e cães danados"),
+}
+
+
+def corpus(size, seed=18):
+    """
+    size choices: real event titles, some of them lightly mangled, padded
+    with random strings when there are not enough titles
+    """
+    rng = random.Random(seed)
+    result = []
+    while len(result) < size:
+        if len(result) < len(titles):
+            title = titles[len(result)]
+            if rng.random() < 0.3:
+                title = title[:-rng.randint(1, 5)]
+        else:
+            title = ''.join(rng.choice(string.ascii_uppercase + string.digits + ' ') for _ in range(30))
+        result.append(title)
+    return result
+
+
+def benchmarks(sizes, dedupe_sizes):
+    """
+    Yield (name, function, number of calls per measurement)
+    """
+    for i, s in enumerate(mixed_strings + cirque_strings):
+        yield 'utils.full_process[%d]' % i, lambda s=s: utils.full_process(s), 10000
+        yield 'utils.full_process[%d,force_ascii]' % i, lambda s=s: utils.full_process(s, force_ascii=True), 10000
+
+    for name, scorer in scorers.items():
+        for kind, (s1, s2) in inputs.items():
+            yield 'fuzz.%s[%s]' % (name, kind), lambda scorer=scorer, s1=s1, s2=s2: scorer(s1, s2), 10000
+
+    query = 'new york yankees at boston red sox'
+    yield 'process.extractOne[choices with None]', lambda: process.extractOne(query, choices), 10000
+    for size in sizes:
+        c = corpus(size)
+        number = max(1, 100000 // size)
+        for name in ('ratio', 'token_set_ratio', 'QRatio', 'WRatio', 'UWRatio'):
+            scorer = scorers[name]
+            yield ('process.extract[%s,%d]' % (name, size),
+                   lambda c=c, scorer=scorer: process.extract(query, c, scorer=scorer), number)
+            yield ('process.extractOne[%s,%d]' % (name, size),
+                   lambda c=c, scorer=scorer: process.extractOne(query, c, scorer=scorer), number)
+
+    for size in dedupe_sizes:
+        c = corpus(size)
+        yield 'process.dedupe[%d]' % size, lambda c=c: process.dedupe(c), 1
+
+
+def run(sizes, dedupe_sizes, repeat, min_time=0.2):
+    """
+    Best time per call of every benchmark, in seconds. Fast benchmarks are
+    called more times than requested, so that every measurement lasts at
+    least min_time seconds, and the repeats are interleaved (one round over
+    all benchmarks per repeat) so that a slow phase of the machine does not
+    affect every measurement of the same benchmark.
+    """
+    maxsize = utils.full_process_cache_info().maxsize
+    utils.set_full_process_cache_size(0)
+    try:
+        timers = []
+        for name, func, number in benchmarks(sizes, dedupe_sizes):
+            timer = Timer(func)
+            elapsed = timer.timeit(number)
+            if elapsed < min_time:
+                number = int(number * min_time / max(elapsed, 1e-9)) + 1
+            timers.append((name, timer, number))
+        results = {}
+        for _ in range(repeat):
+            for name, timer, number in timers:
+                duration = timer.timeit(number) / number
+                results[name] = min(results.get(name, duration), duration)
+    finally:
+        utils.set_full_process_cache_size(maxsize)
+    for name, duration in results.items():
+        print('%-50s %s' % (name, format_duration(duration)))
+    return results
+
+
+def format_duration(duration):
+    units = ["s", "ms", "us", "ns"]
+    thousands = min(max(int(math.floor(math.log(duration, 1000))), -3), 0) if duration > 0 else -3
+    return "{:.3f}{}".format(duration * (1000 ** -thousands), units[-thousands])
 
 
-def print_result_from_timeit(stmt='pass', setup='pass', number=1000000):
+def compare(results, baseline, threshold, noise_floor=0):
     """
-    Clean function to know how much time took the execution of one statement
+    Print the change of every benchmark against the baseline and return
+    the names of the ones slower by more than threshold and by more than
+    noise_floor seconds per call
     """
-    units = ["s", "ms", "us", "ns"]
-    duration = timeit(stmt, setup, number=int(number))
-    avg_duration = duration / float(number)
-    thousands = int(math.floor(math.log(avg_duration, 1000)))
-
-    print("Total time: {:f}s. Average run: {:.3f}{}.".format(
-        duration, avg_duration * (1000 ** -thousands), units[-thousands]))
-
-
-for s in mixed_strings + cirque_strings + choices:
-    print('Test full_process for: "%s"' % s)
-    print_result_from_timeit('utils.full_process(u\'%s\')' % s,
-                             common_setup, number=iterations)
-
-# benchmarking the core matching methods...
-
-for s in cirque_strings:
-    print('Test fuzz.ratio for string: "%s"' % s)
-    print('-------------------------------')
-    print_result_from_timeit('fuzz.ratio(u\'cirque du soleil\', u\'%s\')' % s,
-                             common_setup, number=iterations / 100)
-
-for s in cirque_strings:
-    print('Test fuzz.partial_ratio for string: "%s"' % s)
-    print('-------------------------------')
-    print_result_from_timeit('fuzz.partial_ratio(u\'cirque du soleil\', u\'%s\')'
-                             % s, common_setup, number=iterations / 100)
-
-for s in cirque_strings:
-    print('Test fuzz.WRatio for string: "%s"' % s)
-    print('-------------------------------')
-    print_result_from_timeit('fuzz.WRatio(u\'cirque du soleil\', u\'%s\')' % s,
-                             common_setup, number=iterations / 100)
-
-print('Test process.extract(scorer =  fuzz.QRatio) for string: "%s"' % s)
-print('-------------------------------')
-print_result_from_timeit('process.extract(u\'cirque du soleil\', choices, scorer =  fuzz.QRatio)',
-                             common_setup + " from thefuzz import process; import string,random; random.seed(18);"
-                             " choices = [\'\'.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(30)) for s in range(5000)]",
-                              number=10)
-
-print('Test process.extract(scorer =  fuzz.WRatio) for string: "%s"' % s)
-print('-------------------------------')
-print_result_from_timeit('process.extract(u\'cirque du soleil\', choices, scorer =  fuzz.WRatio)',
-                             common_setup + " from thefuzz import process; import string,random; random.seed(18);"
-                             " choices = [\'\'.join(random.choice(string.ascii_uppercase + string.digits) for _ in range(30)) for s in range(5000)]",
-                              number=10)
-
-
-# let me show you something
-
-s = 'New York Yankees'
-
-test = 'import functools\n'
-test += 'title_blob = """%s"""\n' % title_blob
-test += 'title_blob = title_blob.strip()\n'
-test += 'titles = title_blob.split("\\n")\n'
-
-print('Real world ratio(): "%s"' % s)
-print('-------------------------------')
-test += 'prepared_ratio = functools.partial(fuzz.ratio, "%s")\n' % s
-test += 'titles.sort(key=prepared_ratio)\n'
-print_result_from_timeit(test, common_setup, number=100)
+    regressions = []
+    print()
+    print('%-50s %10s %10s %8s' % ('benchmark', 'baseline', 'current', 'change'))
+    for name, duration in results.items():
+        if name not in baseline:
+            continue
+        change = duration / baseline[name] - 1
+        flag = ''
+        if change > threshold and duration - baseline[name] > noise_floor:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print('%-50s %10s %10s %+7.1f%%%s' % (
+            name, format_duration(baseline[name]), format_duration(duration), change * 100, flag))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', help='write the results to this JSON file')
+    parser.add_argument('--baseline', help='compare the results with this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.2,
+                        help='allowed slowdown against the baseline, as a fraction (default: 0.2)')
+    parser.add_argument('--noise-floor', type=float, default=100,
+                        help='slowdowns smaller than this many nanoseconds per call are ignored (default: 100)')
+    parser.add_argument('--repeat', type=int, default=5, help='measurements per benchmark, the best is kept')
+    parser.add_argument('--quick', action='store_true', help='only run the small corpus sizes')
+    args = parser.parse_args(argv)
+
+    if args.quick:
+        sizes, dedupe_sizes = [100, 1000], [100]
+    else:
+        sizes, dedupe_sizes = [100, 1000, 10000, 100000], [100, 1000, 5000]
+
+    results = run(sizes, dedupe_sizes, args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'thefuzz': __version__,
+                'rapidfuzz': rapidfuzz.__version__,
+                'python': platform.python_version(),
+                'machine': platform.machine(),
+                'results': results,
+            }, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.threshold, args.noise_floor * 1e-9)
+        if regressions:
+            print('\n%d benchmark(s) slower than the baseline by more than %d%%'
+                  % (len(regressions), args.threshold * 100))
+            return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,5 +1,10 @@
+import os
+import random
+import tempfile
 import unittest
 import re
+import subprocess
+import sys
 import pycodestyle
 
 from thefuzz import fuzz
@@ -75,6 +80,30 @@ class UtilsTest(unittest.TestCase):
         for s in self.mixed_strings:
             utils.full_process(s, force_ascii=True)
 
+    def test_fullProcessMany(self):
+        for force_ascii in (False, True):
+            self.assertEqual(utils.full_process_many(self.mixed_strings, force_ascii=force_ascii),
+                             [utils.full_process(s, force_ascii=force_ascii) for s in self.mixed_strings])
+        self.assertEqual(utils.full_process_many([("test", "test")], force_ascii=True), ["test    test"])
+
+    def test_fullProcessCache(self):
+        utils.full_process_cache_clear()
+        utils.full_process(self.s2)
+        utils.full_process(self.s2)
+        utils.full_process(self.s2, force_ascii=True)
+        info = utils.full_process_cache_info()
+        self.assertEqual((info.hits, info.misses), (1, 2))
+
+        try:
+            utils.set_full_process_cache_size(1)
+            utils.full_process(self.s1)
+            utils.full_process(self.s2)
+            self.assertEqual(utils.full_process(self.s1), "new york mets")
+            info = utils.full_process_cache_info()
+            self.assertEqual((info.hits, info.misses, info.currsize), (0, 3, 1))
+        finally:
+            utils.set_full_process_cache_size(utils.FULL_PROCESS_CACHE_SIZE)
+
 
 class RatioTest(unittest.TestCase):
 
@@ -289,7 +318,8 @@ class RatioTest(unittest.TestCase):
 
     def testCheckEmptyString(self):
         for scorer in scorers:
-            if scorer in {fuzz.token_set_ratio, fuzz.partial_token_set_ratio, fuzz.WRatio, fuzz.UWRatio, fuzz.QRatio, fuzz.UQRatio}:
+            if scorer in {fuzz.token_set_ratio, fuzz.partial_token_set_ratio, fuzz.WRatio, fuzz.UWRatio, fuzz.QRatio,
+                          fuzz.UQRatio}:
                 self.assertEqual(scorer('', ''), 0)
             else:
                 self.assertEqual(scorer('', ''), 100)
@@ -491,7 +521,8 @@ class ProcessTest(unittest.TestCase):
         """We should be able to use a list-like object for contains_dupes
         """
         # Test 1
-        contains_dupes = ['Frodo Baggins', 'Tom Sawyer', 'Bilbo Baggin', 'Samuel L. Jackson', 'F. Baggins', 'Frody Baggins', 'Bilbo Baggins']
+        contains_dupes = ['Frodo Baggins', 'Tom Sawyer', 'Bilbo Baggin', 'Samuel L. Jackson', 'F. Baggins',
+                          'Frody Baggins', 'Bilbo Baggins']
 
         result = process.dedupe(contains_dupes)
         self.assertLess(len(result), len(contains_dupes))
@@ -499,12 +530,244 @@ class ProcessTest(unittest.TestCase):
         # Test 2
         contains_dupes = ['Tom', 'Dick', 'Harry']
 
-        # we should end up with the same list since no duplicates are contained in the list (e.g. original list is returned)
+        # we should end up with the same list since no duplicates are contained in the list
+        # (e.g. original list is returned)
         deduped_list = ['Tom', 'Dick', 'Harry']
 
         result = process.dedupe(contains_dupes)
         self.assertEqual(result, deduped_list)
 
+    def test_extract_many(self):
+        queries = ["new york mets at atlanta braves", "chicago cubs vs new york mets", "cirque du soleil"]
+        choices = self.baseball_strings + [None, ""]
+
+        for scorer in scorers:
+            result = process.extract_many(queries, choices, scorer=scorer, limit=3)
+            expected = [process.extractBests(query, choices, scorer=scorer, limit=3) for query in queries]
+            self.assertEqual(result, expected)
+
+        choices_dict = dict(enumerate(self.baseball_strings))
+        result = process.extract_many(queries, choices_dict, score_cutoff=50, limit=None, workers=2)
+        expected = [process.extractBests(query, choices_dict, score_cutoff=50, limit=None) for query in queries]
+        self.assertEqual(result, expected)
+
+        for scorer in scorers + [lambda s1, s2: fuzz.ratio(s1, s2)]:
+            self.assertEqual(process.extract_many(queries, choices, scorer=scorer, limit=0), [[], [], []])
+            self.assertEqual(process.extractBests(queries[0], choices, scorer=scorer, limit=0), [])
+
+    def test_cdist(self):
+        queries = ["new york mets at atlanta braves", "cirque du soleil"]
+        scores = process.cdist(queries, self.baseball_strings, scorer=fuzz.token_sort_ratio, score_cutoff=40)
+
+        self.assertEqual(scores.shape, (len(queries), len(self.baseball_strings)))
+        for i, query in enumerate(queries):
+            for j, choice in enumerate(self.baseball_strings):
+                score = fuzz.token_sort_ratio(query, choice)
+                self.assertEqual(scores[i, j], score if score >= 40 else 0)
+
+        # the choices go through the full_process cache, repeated ones are only processed once
+        utils.full_process_cache_clear()
+        process.cdist(queries, self.baseball_strings * 2)
+        self.assertGreaterEqual(utils.full_process_cache_info().hits, len(self.baseball_strings))
+
+    def test_dedupe_clusters(self):
+        contains_dupes = ['Frodo Baggins', 'Tom Sawyer', 'Bilbo Baggin', 'Samuel L. Jackson', 'F. Baggins',
+                          'Frody Baggins', 'Bilbo Baggins']
+
+        clusters = process.dedupe(contains_dupes, return_clusters=True)
+        self.assertEqual(sorted(clusters), sorted(process.dedupe(contains_dupes)))
+        self.assertEqual(sorted(sum(clusters.values(), [])), sorted(contains_dupes))
+
+        # identical items are always duplicates, even without candidates
+        result = process.dedupe(['Tom', 'tom', 'Dick'], return_clusters=True, exact=False, max_candidates=0)
+        self.assertEqual(result, {'tom': ['Tom', 'tom'], 'Dick': ['Dick']})
+
+    def test_dedupe_transitive(self):
+        contains_dupes = ['new york', 'new york mets', 'mets', 'boston']
+
+        # 'new york' and 'mets' are not duplicates of each other, but both are of 'new york mets'
+        self.assertEqual(process.dedupe(contains_dupes, threshold=90, scorer=fuzz.token_set_ratio),
+                         ['new york mets', 'boston'])
+        self.assertEqual(process.dedupe(contains_dupes, threshold=90, scorer=fuzz.ratio), contains_dupes)
+
+        clusters = process.dedupe(['ab cd', 'ab cd ef', 'cd ef'], threshold=100, return_clusters=True, transitive=True)
+        self.assertEqual(clusters, {'ab cd ef': ['ab cd', 'ab cd ef', 'cd ef']})
+
+    def test_dedupe_scores_every_possible_pair(self):
+        def full_dedupe(contains_dupes, threshold=70, scorer=fuzz.token_set_ratio):
+            # every item scored against all the others, as dedupe did before skipping pairs
+            extractor = set()
+            for item in contains_dupes:
+                matches = process.extractBests(item, contains_dupes, scorer=scorer, score_cutoff=threshold, limit=None)
+                extractor.add(max([item] + [x[0] for x in matches], key=lambda x: (len(x), x)))
+            return sorted(extractor)
+
+        self.assertEqual(process.dedupe(['Jon Smith', 'Jhon Smyth']), ['Jhon Smyth'])
+        self.assertEqual(process.dedupe(['abcd', 'abxd']), ['abxd'])
+
+        rng = random.Random(0)
+        words = ['ab', 'abc', 'jon', 'jhon', 'smith', 'smyth', 'x', 'new york', 'yankees']
+        inputs = [
+            ['Jon Smith', 'Jhon Smyth', 'J. Smith', 'Smith Jon', ''],
+            ['abcd', 'abxd', 'abc', 'xbcd', 'dcba', 'a', 'b'],
+            self.baseball_strings,
+        ]
+        for _ in range(20):
+            items = []
+            for _ in range(rng.randint(2, 12)):
+                item = list(' '.join(rng.choice(words) for _ in range(rng.randint(1, 3))))
+                # near misses: one or two edits of a common string
+                for _ in range(rng.randint(0, 2)):
+                    item[rng.randrange(len(item))] = rng.choice('abjxyz ')
+                items.append(''.join(item))
+            inputs.append(items)
+
+        for contains_dupes in inputs:
+            for scorer in (fuzz.token_set_ratio, fuzz.token_sort_ratio, fuzz.ratio, fuzz.QRatio, fuzz.WRatio):
+                for threshold in (50, 70, 90, 100):
+                    result = process.dedupe(contains_dupes, threshold=threshold, scorer=scorer)
+                    self.assertEqual(sorted(result), full_dedupe(contains_dupes, threshold, scorer),
+                                     (contains_dupes, scorer, threshold))
+
+    def test_dedupe_blocking(self):
+        contains_dupes = ['Frodo Baggins', 'Tom Sawyer', 'Bilbo Baggin', 'Samuel L. Jackson', 'F. Baggins',
+                          'Frody Baggins', 'Bilbo Baggins']
+        self.assertEqual(process.dedupe(contains_dupes, exact=False), process.dedupe(contains_dupes))
+
+        rng = random.Random(0)
+        letters = 'abcdefghijklmnopqrstuvwxyz'
+        words = [''.join(rng.choice(letters) for _ in range(rng.randint(4, 9))) for _ in range(5000)]
+        items = [' '.join(rng.sample(words, 3)) for _ in range(process.DEDUPE_EXACT_LIMIT + 500)]
+        # a typo in the last character of every tenth item
+        typos = {item[:-1] + ('x' if item[-1] != 'x' else 'y'): item for item in items[::10]}
+
+        calls = []
+
+        def scorer(s1, s2):
+            calls.append(1)
+            return fuzz.ratio(s1, s2)
+
+        n = len(items) + len(typos)
+        clusters = process.dedupe(items + list(typos), threshold=90, scorer=scorer, return_clusters=True)
+        self.assertLess(len(calls), n * (n - 1) // 2)
+        kept = {member: item for item, members in clusters.items() for member in members}
+        for typo, item in typos.items():
+            self.assertEqual(kept[typo], kept[item])
+
+    def test_choice_index(self):
+        queries = ["new york mets at atlanta braves", "chicago cubs", "cirque du soleil", "Cães danados", ""]
+        choices = self.baseball_strings + self.cirque_strings + [None, "", "Ça va"]
+        choices_dict = dict(enumerate(choices))
+
+        for scorer in scorers:
+            for c in (choices, choices_dict):
+                index = process.ChoiceIndex(c, scorer=scorer)
+                self.assertEqual(len(index), len(choices))
+                for query in queries:
+                    for score_cutoff in (0, 50, 90):
+                        self.assertEqual(index.extractBests(query, score_cutoff=score_cutoff),
+                                         process.extractBests(query, c, scorer=scorer, score_cutoff=score_cutoff))
+                        self.assertEqual(index.extractOne(query, score_cutoff=score_cutoff),
+                                         process.extractOne(query, c, scorer=scorer, score_cutoff=score_cutoff))
+                        expected = process.extractWithoutOrder(query, c, scorer=scorer, score_cutoff=score_cutoff)
+                        self.assertEqual(list(index.extractWithoutOrder(query, score_cutoff=score_cutoff)),
+                                         list(expected))
+                    self.assertEqual(index.extract(query, limit=2), process.extract(query, c, scorer=scorer, limit=2))
+
+    def test_choice_index_with_processor(self):
+        events = [
+            ["chicago cubs vs new york mets", "CitiField", "2011-05-11", "8pm"],
+            ["new york yankees vs boston red sox", "Fenway Park", "2011-05-11", "8pm"],
+            ["atlanta braves vs pittsburgh pirates", "PNC Park", "2011-05-11", "8pm"],
+        ]
+        query = ["new york mets vs chicago cubs", "CitiField", "2017-03-19", "8pm"],
+
+        index = process.ChoiceIndex(events, processor=lambda event: event[0])
+        self.assertEqual(index.extractOne(query), process.extractOne(query, events, processor=lambda event: event[0]))
+
+    def test_extract_workers(self):
+        queries = ["new york mets at atlanta braves", "cirque du soleil", ""]
+        choices = (self.baseball_strings + self.cirque_strings + [None, ""]) * 3
+        choices_dict = dict(enumerate(choices))
+
+        for scorer in scorers:
+            for c in (choices, choices_dict):
+                for query in queries:
+                    for limit in (0, 7):
+                        self.assertEqual(process.extractBests(query, c, scorer=scorer, limit=limit, workers=4),
+                                         process.extractBests(query, c, scorer=scorer, limit=limit))
+                    self.assertEqual(process.extractOne(query, c, scorer=scorer, score_cutoff=50, workers=-1),
+                                     process.extractOne(query, c, scorer=scorer, score_cutoff=50))
+
+        self.assertEqual(process.extract(queries[0], choices, workers=2, use_processes=True),
+                         process.extract(queries[0], choices))
+        self.assertIsNone(process.extractOne(queries[0], [], workers=2))
+        self.assertEqual(process.extractBests(queries[0], choices, limit=0, workers=2), [])
+        self.assertEqual(process.extractBests(queries[0], choices, limit=0), [])
+
+        for workers in (0, -2, 1.5, True):
+            with self.assertRaises(ValueError):
+                process.extractBests(queries[0], choices, workers=workers)
+            with self.assertRaises(ValueError):
+                process.extractOne(queries[0], choices, workers=workers)
+
+    def test_extract_stream(self):
+        choices = (self.baseball_strings + self.cirque_strings + [None, ""]) * 3
+        choices_dict = dict(enumerate(choices))
+        query = "new york mets at atlanta braves"
+
+        for scorer in scorers:
+            for limit in (0, 1, 5, None):
+                self.assertEqual(process.extract_stream(query, iter(choices), scorer=scorer, limit=limit, batch_size=4),
+                                 process.extractBests(query, choices, scorer=scorer, limit=limit))
+            self.assertEqual(process.extract_stream(query, choices_dict, scorer=scorer, score_cutoff=50, batch_size=7),
+                             process.extractBests(query, choices_dict, scorer=scorer, score_cutoff=50))
+
+    def test_extract_stream_from_file(self):
+        fd, path = tempfile.mkstemp(suffix=".txt")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write("\n".join(self.baseball_strings) + "\n")
+
+            self.assertEqual(list(process.read_choices(path)), self.baseball_strings)
+            self.assertEqual(process.extract_stream("chicago cubs vs new york mets", path, batch_size=2),
+                             process.extractBests("chicago cubs vs new york mets", self.baseball_strings))
+        finally:
+            os.remove(path)
+
+    def test_minhash_index(self):
+        choices = self.baseball_strings + self.cirque_strings + [None, ""]
+        index = process.MinHashIndex(choices, max_candidates=3)
+        exact = process.ChoiceIndex(choices)
+
+        for query in self.cirque_strings + self.baseball_strings:
+            self.assertEqual(index.extractOne(query), (query, 100))
+            self.assertLessEqual(len(index.extractBests(query, limit=None, score_cutoff=1)), 3)
+            self.assertEqual(index.extractBests(query, exact=True), exact.extractBests(query))
+        self.assertEqual(index.extract("new york mets", limit=1), [("new york mets vs chicago cubs", 90)])
+        self.assertRaises(ValueError, process.MinHashIndex, choices, num_perm=10, bands=3)
+
+    def test_minhash_index_is_reproducible(self):
+        # the band keys must not depend on the per-process salt of hash()
+        script = ("from thefuzz import process; "
+                  "print(process.MinHashIndex(['new york mets', 'Ça va', 'x'], seed=3)._band_keys.tolist())")
+        outputs = set()
+        for hash_seed in ('1', '2'):
+            env = dict(os.environ, PYTHONHASHSEED=hash_seed)
+            outputs.add(subprocess.check_output([sys.executable, '-c', script], env=env))
+        self.assertEqual(len(outputs), 1)
+
+    def test_minhash_index_fallback(self):
+        choices = {"a": "zzzz", "b": "qqqq"}
+        index = process.MinHashIndex(choices, scorer=fuzz.ratio)
+        no_fallback = process.MinHashIndex(choices, scorer=fuzz.ratio, fallback=False)
+
+        self.assertEqual(index.extractOne("zzqq"), process.extractOne("zzqq", choices, scorer=fuzz.ratio))
+        self.assertEqual(list(index.extractWithoutOrder("zzqq")),
+                         list(process.extractWithoutOrder("zzqq", choices, scorer=fuzz.ratio)))
+        self.assertIsNone(no_fallback.extractOne("zzqq"))
+        self.assertEqual(no_fallback.extractBests("zzqq"), [])
+
     def test_simplematch(self):
         basic_string = 'a, b'
         match_strings = ['a, b']
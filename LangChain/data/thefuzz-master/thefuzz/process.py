@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 from . import fuzz
 from . import utils
+import bisect
+import heapq
 import logging
+import math
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
 from rapidfuzz import fuzz as rfuzz
 from rapidfuzz import process as rprocess
 from functools import partial
@@ -12,16 +19,20 @@ default_scorer = fuzz.WRatio
 default_processor = utils.full_process
 
 
+# scorers that run utils.full_process on their arguments
+_full_process_scorers = (fuzz.WRatio, fuzz.QRatio,
+                         fuzz.token_set_ratio, fuzz.token_sort_ratio,
+                         fuzz.partial_token_set_ratio, fuzz.partial_token_sort_ratio,
+                         fuzz.UWRatio, fuzz.UQRatio)
+
+
 def _get_processor(processor, scorer):
     """
     thefuzz runs both the default preprocessing of the function and the preprocessing
     function passed into process.* while rapidfuzz only runs the one passed into
     process.*. This function wraps the processor to mimic this behavior
     """
-    if scorer not in (fuzz.WRatio, fuzz.QRatio,
-                      fuzz.token_set_ratio, fuzz.token_sort_ratio,
-                      fuzz.partial_token_set_ratio, fuzz.partial_token_sort_ratio,
-                      fuzz.UWRatio, fuzz.UQRatio):
+    if scorer not in _full_process_scorers:
         return processor
 
     force_ascii = scorer not in [fuzz.UWRatio, fuzz.UQRatio]
@@ -36,6 +47,22 @@ def _get_processor(processor, scorer):
     return wrapper
 
 
+def _process_many(items, processor, scorer):
+    """
+    _get_processor(processor, scorer) applied to every item, with the
+    utils.full_process step done in bulk by utils.full_process_many.
+    None items are kept as None, rapidfuzz skips them.
+    """
+    if scorer not in _full_process_scorers and processor != utils.full_process:
+        return [item if item is None or not processor else processor(item) for item in items]
+
+    force_ascii = scorer in _full_process_scorers and scorer not in [fuzz.UWRatio, fuzz.UQRatio]
+    if processor and processor != utils.full_process:
+        items = [None if item is None else processor(item) for item in items]
+    processed = iter(utils.full_process_many([item for item in items if item is not None], force_ascii=force_ascii))
+    return [None if item is None else next(processed) for item in items]
+
+
 # this allows lowering the scorers back to the scorers used in rapidfuzz
 # this allows rapidfuzz to perform more optimizations behind the scenes.
 # These mapped scorers are the same with two expceptions
@@ -142,7 +169,8 @@ def extractWithoutOrder(query, choices, processor=default_processor, scorer=defa
         yield (choice, score, key) if is_mapping else (choice, score)
 
 
-def extract(query, choices, processor=default_processor, scorer=default_scorer, limit=5):
+def extract(query, choices, processor=default_processor, scorer=default_scorer, limit=5, workers=1,
+            use_processes=False):
     """
     Select the best match in a list or dictionary of choices.
 
@@ -172,6 +200,16 @@ def extract(query, choices, processor=default_processor, scorer=default_scorer,
             choice to be strings.
         limit: Optional maximum for the number of elements returned. Defaults
             to 5.
+        workers: Optional number of threads used to score the choices in
+            parallel. The choices are split into this many shards. -1 uses
+            all available cores; 0 and other negative values raise
+            ValueError. A new pool is started for every call, which costs a
+            fraction of a millisecond for threads and far more for
+            processes, so it only pays off for long lists of choices.
+            Defaults to 1.
+        use_processes: Use a process pool instead of a thread pool for
+            workers. The processor and scorer must be picklable. Defaults
+            to False.
 
     Returns:
         List of tuples containing the match and its score.
@@ -188,10 +226,12 @@ def extract(query, choices, processor=default_processor, scorer=default_scorer,
 
         [('train', 22, 'bard'), ('man', 0, 'dog')]
     """
-    return extractBests(query, choices, processor=processor, scorer=scorer, limit=limit)
+    return extractBests(query, choices, processor=processor, scorer=scorer, limit=limit, workers=workers,
+                        use_processes=use_processes)
 
 
-def extractBests(query, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0, limit=5):
+def extractBests(query, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0, limit=5,
+                 workers=1, use_processes=False):
     """
     Get a list of the best matches to a collection of choices.
 
@@ -208,20 +248,34 @@ def extractBests(query, choices, processor=default_processor, scorer=default_sco
             a score less than this number will be returned. Defaults to 0.
         limit: Optional maximum for the number of elements returned. Defaults
             to 5.
+        workers: Optional number of threads used to score the choices in
+            parallel. The choices are split into this many shards. -1 uses
+            all available cores; 0 and other negative values raise
+            ValueError. A new pool is started for every call, which costs a
+            fraction of a millisecond for threads and far more for
+            processes, so it only pays off for long lists of choices.
+            Defaults to 1.
+        use_processes: Use a process pool instead of a thread pool for
+            workers. The processor and scorer must be picklable. Defaults
+            to False.
 
     Returns: A a list of (match, score) tuples.
     """
     is_mapping = hasattr(choices, "items")
     is_lowered = scorer in _scorer_lowering
 
+    workers = _worker_count(workers)
     query = _preprocess_query(query, processor)
-    results = rprocess.extract(
-        query, choices,
-        processor=_get_processor(processor, scorer),
-        scorer=_get_scorer(scorer),
-        score_cutoff=score_cutoff,
-        limit=limit
-    )
+    if workers != 1:
+        results = _extract_sharded(query, choices, processor, scorer, score_cutoff, limit, workers, use_processes)
+    else:
+        results = rprocess.extract(
+            query, choices,
+            processor=_get_processor(processor, scorer),
+            scorer=_get_scorer(scorer),
+            score_cutoff=score_cutoff,
+            limit=limit
+        )
 
     for i, (choice, score, key) in enumerate(results):
         if is_lowered:
@@ -232,7 +286,8 @@ def extractBests(query, choices, processor=default_processor, scorer=default_sco
     return results
 
 
-def extractOne(query, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0):
+def extractOne(query, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0, workers=1,
+               use_processes=False):
     """
     Find the single best match above a score in a list of choices.
 
@@ -249,6 +304,16 @@ def extractOne(query, choices, processor=default_processor, scorer=default_score
         score_cutoff: Optional argument for score threshold. If the best
             match is found, but it is not greater than this number, then
             return None anyway ("not a good enough match").  Defaults to 0.
+        workers: Optional number of threads used to score the choices in
+            parallel. The choices are split into this many shards. -1 uses
+            all available cores; 0 and other negative values raise
+            ValueError. A new pool is started for every call, which costs a
+            fraction of a millisecond for threads and far more for
+            processes, so it only pays off for long lists of choices.
+            Defaults to 1.
+        use_processes: Use a process pool instead of a thread pool for
+            workers. The processor and scorer must be picklable. Defaults
+            to False.
 
     Returns:
         A tuple containing a single match and its score, if a match
@@ -257,13 +322,18 @@ def extractOne(query, choices, processor=default_processor, scorer=default_score
     is_mapping = hasattr(choices, "items")
     is_lowered = scorer in _scorer_lowering
 
+    workers = _worker_count(workers)
     query = _preprocess_query(query, processor)
-    res = rprocess.extractOne(
-        query, choices,
-        processor=_get_processor(processor, scorer),
-        scorer=_get_scorer(scorer),
-        score_cutoff=score_cutoff
-    )
+    if workers != 1:
+        res = next(iter(_extract_sharded(query, choices, processor, scorer, score_cutoff, 1, workers, use_processes)),
+                   None)
+    else:
+        res = rprocess.extractOne(
+            query, choices,
+            processor=_get_processor(processor, scorer),
+            scorer=_get_scorer(scorer),
+            score_cutoff=score_cutoff
+        )
 
     if res is None:
         return res
@@ -276,13 +346,899 @@ def extractOne(query, choices, processor=default_processor, scorer=default_score
     return (choice, score, key) if is_mapping else (choice, score)
 
 
-def dedupe(contains_dupes, threshold=70, scorer=fuzz.token_set_ratio):
+def _prepare_queries(queries, processor):
+    return [_preprocess_query(query, processor) for query in queries]
+
+
+def _score_matrix(queries, choices, processor, scorer, workers):
+    """
+    Score every (already preprocessed) query against every choice using
+    rapidfuzz.process.cdist. Returns the unrounded float64 matrix.
+    """
+    import numpy as np
+
+    return rprocess.cdist(
+        _process_many(queries, processor, scorer), _process_many(choices, processor, scorer),
+        processor=None,
+        scorer=_get_scorer(scorer),
+        dtype=np.float64,
+        workers=workers
+    )
+
+
+def cdist(queries, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0, workers=1):
+    """
+    Compute the score of every query against every choice in one pass.
+
+    The choices are preprocessed once and all comparisons run inside
+    rapidfuzz, optionally spread over several cores. Requires NumPy.
+
+    Args:
+        queries: A list of strings to match.
+        choices: A list or dictionary of choices, suitable for use with
+            extract(). For a dictionary the columns follow the order of
+            its values.
+        processor: Optional function for transforming choices before matching.
+            See extract().
+        scorer: Scoring function for extract().
+        score_cutoff: Optional argument for score threshold. Scores lower
+            than this number are set to 0. Defaults to 0.
+        workers: Number of cores to use. -1 uses all available cores.
+            Defaults to 1.
+
+    Returns:
+        A NumPy array of shape (len(queries), len(choices)). The scores are
+        rounded to integers exactly like the fuzz.* scorers do.
+    """
+    import numpy as np
+
+    if hasattr(choices, "items"):
+        choices = list(choices.values())
+
+    scores = _score_matrix(_prepare_queries(queries, processor), choices, processor, scorer, workers)
+    if scorer in _scorer_lowering:
+        scores = np.rint(scores)
+    scores[scores < score_cutoff] = 0
+
+    return scores.astype(np.int32) if scorer in _scorer_lowering else scores
+
+
+def _top_k(row, limit, valid):
+    """
+    Indices of the best scores in row, ordered like rapidfuzz.process.extract:
+    highest score first, ties broken by the position of the choice.
+    """
+    import numpy as np
+
+    candidates = np.flatnonzero(valid)
+    if limit is not None and limit < len(candidates):
+        scores = row[candidates]
+        kth = np.partition(scores, len(candidates) - limit)[len(candidates) - limit]
+        candidates = candidates[scores >= kth]
+    order = np.argsort(-row[candidates], kind="stable")
+    return candidates[order[:limit]]
+
+
+def extract_many(queries, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0, limit=5,
+                 workers=1):
+    """
+    Get a list of the best matches to a collection of choices for every query.
+
+    Same as calling extractBests() for each query, but the choices are only
+    preprocessed once and all queries are scored in a single vectorized
+    pass (see cdist()). Requires NumPy.
+
+    Args:
+        queries: A list of strings to match.
+        choices: A list or dictionary of choices, suitable for use with
+            extract().
+        processor: Optional function for transforming choices before matching.
+            See extract().
+        scorer: Scoring function for extract().
+        score_cutoff: Optional argument for score threshold. No matches with
+            a score less than this number will be returned. Defaults to 0.
+        limit: Optional maximum for the number of elements returned per
+            query. Defaults to 5.
+        workers: Number of cores to use. -1 uses all available cores.
+            Defaults to 1.
+
+    Returns: A list with one list of (match, score) tuples per query, as
+        returned by extractBests().
+    """
+    if limit == 0:
+        return [[] for _ in queries]
+
+    if scorer not in _scorer_lowering:
+        # rapidfuzz can't vectorize arbitrary python scorers, so there is
+        # nothing to gain over running extractBests for every query
+        choices = choices if hasattr(choices, "items") else list(choices)
+        return [
+            extractBests(query, choices, processor=processor, scorer=scorer,
+                         score_cutoff=score_cutoff, limit=limit)
+            for query in queries
+        ]
+
+    import numpy as np
+
+    is_mapping = hasattr(choices, "items")
+    if is_mapping:
+        keys = list(choices.keys())
+        choices = list(choices.values())
+    else:
+        choices = list(choices)
+
+    scores = _score_matrix(_prepare_queries(queries, processor), choices, processor, scorer, workers)
+    # rapidfuzz skips None choices altogether
+    not_none = np.array([choice is not None for choice in choices], dtype=bool)
+
+    results = []
+    for row in scores:
+        matches = []
+        for i in _top_k(row, limit, not_none & (row >= score_cutoff)):
+            score = int(round(row[i]))
+            matches.append((choices[i], score, keys[i]) if is_mapping else (choices[i], score))
+        results.append(matches)
+
+    return results
+
+
+def _extract_shard(query, shard, processor, scorer, score_cutoff, limit):
+    """
+    Best (score, index) pairs of one shard of the choices, highest score
+    first and ties broken by index, like rapidfuzz.process.extract.
+    Lowered scorers go through cdist, which scores without holding the GIL.
+    """
+    if scorer not in _scorer_lowering:
+        results = rprocess.extract(
+            query, shard,
+            processor=_get_processor(processor, scorer),
+            scorer=_get_scorer(scorer),
+            score_cutoff=score_cutoff,
+            limit=limit
+        )
+        return [(score, i) for _, score, i in results]
+
+    import numpy as np
+
+    row = _score_matrix([query], shard, processor, scorer, workers=1)[0]
+    valid = np.array([choice is not None for choice in shard], dtype=bool) & (row >= (score_cutoff or 0))
+    return [(float(row[i]), int(i)) for i in _top_k(row, limit, valid)]
+
+
+def _worker_count(workers):
+    """
+    Number of workers for the workers argument of extractBests() and
+    extractOne(): -1 is one per available core
+    """
+    if workers == -1:
+        return os.cpu_count() or 1
+    if isinstance(workers, bool) or not isinstance(workers, int) or workers < 1:
+        raise ValueError("workers must be a positive integer or -1, got %r" % (workers,))
+    return workers
+
+
+def _extract_sharded(query, choices, processor, scorer, score_cutoff, limit, workers, use_processes):
+    """
+    rapidfuzz.process.extract split over a pool of workers. Every shard
+    returns its own best matches, which are merged into the global best
+    ones. Returns (choice, score, key) tuples.
+    """
+    if limit == 0:
+        return []
+
+    if hasattr(choices, "items"):
+        keys = list(choices.keys())
+        choices = list(choices.values())
+    else:
+        choices = list(choices)
+        keys = range(len(choices))
+
+    size = max(-(-len(choices) // workers), 1)
+    offsets = range(0, len(choices), size)
+
+    executor = ProcessPoolExecutor if use_processes else ThreadPoolExecutor
+    with executor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(_extract_shard, query, choices[offset:offset + size], processor, scorer, score_cutoff, limit)
+            for offset in offsets
+        ]
+        shards = [[(score, offset + i) for score, i in future.result()] for offset, future in zip(offsets, futures)]
+
+    merged = heapq.merge(*shards, key=lambda result: (-result[0], result[1]))
+    return [(choices[i], score, keys[i]) for score, i in islice(merged, limit)]
+
+
+def read_choices(path, encoding="utf-8"):
+    """
+    Lazily read the choices of a line-delimited file, one choice per line.
+
+    The generator can be passed to extractWithoutOrder() or extract_stream()
+    to match against files that don't fit in memory.
+    """
+    with open(path, encoding=encoding) as f:
+        for line in f:
+            yield line.rstrip("\r\n")
+
+
+def _batches(choices, batch_size):
+    """
+    (key, choice) pairs of choices, batch_size at a time
+    """
+    it = iter(choices.items()) if hasattr(choices, "items") else enumerate(choices)
+    while True:
+        batch = list(islice(it, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def extract_stream(query, choices, processor=default_processor, scorer=default_scorer, score_cutoff=0, limit=5,
+                   batch_size=10000, encoding="utf-8"):
+    """
+    Get a list of the best matches to a stream of choices.
+
+    Same as extractBests(), but the choices are consumed batch_size at a
+    time and only the best limit matches are kept, so memory use does not
+    depend on the number of choices. Use it for generators, database
+    cursors or files.
+
+    Args:
+        query: A string to match against
+        choices: An iterable or dictionary of choices, or the path of a
+            file with one choice per line (see read_choices()).
+        processor: Optional function for transforming choices before matching.
+            See extract().
+        scorer: Scoring function for extract().
+        score_cutoff: Optional argument for score threshold. No matches with
+            a score less than this number will be returned. Defaults to 0.
+        limit: Optional maximum for the number of elements returned. Defaults
+            to 5. With None every match is kept in memory.
+        batch_size: Number of choices scored at once. Defaults to 10000.
+        encoding: Encoding of the file when choices is a path.
+
+    Returns: A list of (match, score) tuples, like extractBests(). For
+        dictionaries the tuples also contain the key of the match.
+    """
+    if limit == 0:
+        return []
+
+    if isinstance(choices, (str, os.PathLike)):
+        choices = read_choices(choices, encoding=encoding)
+
+    is_mapping = hasattr(choices, "items")
+    is_lowered = scorer in _scorer_lowering
+
+    query = _preprocess_query(query, processor)
+    choice_processor = _get_processor(processor, scorer)
+    scorer_func = _get_scorer(scorer)
+
+    # min-heap of (score, -position, choice, key): the root is the worst
+    # match kept, on equal scores the one seen last
+    heap = []
+    position = 0
+    for batch in _batches(choices, batch_size):
+        cutoff = score_cutoff
+        if limit is not None and len(heap) >= limit:
+            cutoff = max(cutoff, heap[0][0])
+
+        results = rprocess.extract(
+            query, [choice for _, choice in batch],
+            processor=choice_processor,
+            scorer=scorer_func,
+            score_cutoff=cutoff,
+            limit=limit
+        )
+        for choice, score, i in results:
+            entry = (score, -(position + i), choice, batch[i][0])
+            if limit is None or len(heap) < limit:
+                heapq.heappush(heap, entry)
+            elif entry[:2] > heap[0][:2]:
+                heapq.heapreplace(heap, entry)
+
+        position += len(batch)
+
+    results = []
+    for score, _, choice, key in sorted(heap, key=lambda entry: (-entry[0], -entry[1])):
+        if is_lowered:
+            score = int(round(score))
+
+        results.append((choice, score, key) if is_mapping else (choice, score))
+
+    return results
+
+
+def _indel_bound(len1, len2):
+    """
+    Upper bound of fuzz.ratio for strings of the given lengths
+    (len1 is a scalar, len2 a NumPy array)
+    """
+    import numpy as np
+
+    total = len1 + len2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bound = np.where(total > 0, 200.0 * np.minimum(len1, len2) / total, 100.0)
+    return bound
+
+
+def _wratio_bound(len1, len2):
+    """
+    Upper bound of fuzz.WRatio for strings of the given lengths. WRatio
+    only uses unscaled results when the lengths are within a factor 1.5 of
+    each other, otherwise the partial results are scaled by 0.9 (or 0.6 when
+    one string is more than 8 times as long as the other)
+    """
+    import numpy as np
+
+    shorter = np.minimum(len1, len2)
+    longer = np.maximum(len1, len2)
+    bound = np.where(longer < 1.5 * shorter, 100.0, np.where(longer <= 8 * shorter, 90.0, 60.0))
+    return np.maximum(bound, _indel_bound(len1, len2))
+
+
+def _sorted_tokens_len(tokens):
+    return sum(len(token) for token in tokens) + max(len(tokens) - 1, 0)
+
+
+class ChoiceIndex:
+    """
+    A collection of choices preprocessed once to be matched against many queries.
+
+    process.extract() and friends run the processor over every choice for
+    every query. ChoiceIndex runs it once when the index is built and keeps
+    the lengths of the processed choices, which are used to skip the choices
+    that cannot reach score_cutoff with fuzz.ratio, fuzz.QRatio,
+    fuzz.token_sort_ratio, fuzz.token_set_ratio and fuzz.WRatio. Requires NumPy.
+
+    Results are the same as calling the module level functions with the same
+    choices, processor and scorer.
+
+    Arguments:
+        choices: A list or dictionary of choices, suitable for use with
+            extract(). They are copied, later changes are not picked up.
+        processor: Optional function for transforming choices before matching.
+            See extract().
+        scorer: Scoring function for extract().
+    """
+
+    def __init__(self, choices, processor=default_processor, scorer=default_scorer):
+        import numpy as np
+
+        self.is_mapping = hasattr(choices, "items")
+        if self.is_mapping:
+            self.keys = list(choices.keys())
+            self.choices = list(choices.values())
+        else:
+            self.choices = list(choices)
+            self.keys = list(range(len(self.choices)))
+
+        self.processor = processor
+        self.scorer = scorer
+        self._is_lowered = scorer in _scorer_lowering
+        self._choice_processor = _get_processor(processor, scorer)
+        self._scorer = _get_scorer(scorer)
+
+        # rapidfuzz skips None choices, so they are never candidates
+        self.processed = _process_many(self.choices, processor, scorer)
+        self._valid = np.array([choice is not None for choice in self.processed], dtype=bool)
+        self._processed = np.empty(len(self.processed), dtype=object)
+        self._processed[:] = self.processed
+
+        self._lengths = None
+        self._token_lengths = None
+        self._token_index = None
+        if scorer in (fuzz.ratio, fuzz.QRatio, fuzz.UQRatio, fuzz.WRatio, fuzz.UWRatio):
+            self._lengths = np.array(
+                [len(choice) if choice is not None else 0 for choice in self.processed], dtype=np.int32)
+        elif scorer is fuzz.token_sort_ratio:
+            self._token_lengths = np.array(
+                [_sorted_tokens_len(choice.split()) if choice is not None else 0 for choice in self.processed],
+                dtype=np.int32)
+        elif scorer is fuzz.token_set_ratio:
+            self._token_lengths = np.empty(len(self.processed), dtype=np.int32)
+            index = {}
+            for i, choice in enumerate(self.processed):
+                tokens = set(choice.split()) if choice is not None else set()
+                self._token_lengths[i] = _sorted_tokens_len(tokens)
+                for token in tokens:
+                    index.setdefault(token, []).append(i)
+            self._token_index = {token: np.array(ids, dtype=np.int32) for token, ids in index.items()}
+
+    def __len__(self):
+        return len(self.choices)
+
+    def _upper_bounds(self, query):
+        """
+        Upper bound of the score of every choice, or None when the scorer
+        has no cheap bound
+        """
+        import numpy as np
+
+        if self._lengths is not None:
+            if self.scorer in (fuzz.WRatio, fuzz.UWRatio):
+                return _wratio_bound(len(query), self._lengths)
+            return _indel_bound(len(query), self._lengths)
+
+        if self._token_index is not None:
+            # without a common token, token_set_ratio is the ratio of the
+            # sorted token sets, otherwise it can be anything up to 100
+            tokens = set(query.split())
+            bound = _indel_bound(_sorted_tokens_len(tokens), self._token_lengths)
+            for token in tokens:
+                ids = self._token_index.get(token)
+                if ids is not None:
+                    bound[ids] = 100.0
+            return bound
+
+        if self._token_lengths is not None:
+            return _indel_bound(_sorted_tokens_len(query.split()), self._token_lengths)
+
+        return None
+
+    def _shortlist(self, query):
+        """
+        Indices of the choices worth scoring against an already processed
+        query when an approximate search is requested. Every choice here.
+        """
+        import numpy as np
+
+        return np.arange(len(self.processed))
+
+    def _candidates(self, query, score_cutoff, exact=True):
+        """
+        Processed query, indices of the choices that can reach score_cutoff
+        and the processed choices at these indices
+        """
+        import numpy as np
+
+        query = _preprocess_query(query, self.processor)
+        if self._choice_processor:
+            query = self._choice_processor(query)
+
+        mask = self._valid
+        if score_cutoff and len(self.processed):
+            bound = self._upper_bounds(query)
+            if bound is not None:
+                # small tolerance, the bound is not computed exactly like rapidfuzz does
+                mask = mask & (bound + 1e-9 >= score_cutoff)
+        if not exact:
+            selected = np.zeros(len(self.processed), dtype=bool)
+            selected[self._shortlist(query)] = True
+            mask = mask & selected
+        candidates = np.flatnonzero(mask)
+        return query, candidates, self._processed[candidates].tolist()
+
+    def _result(self, i, score):
+        if self._is_lowered:
+            score = int(round(score))
+
+        choice = self.choices[i]
+        return (choice, score, self.keys[i]) if self.is_mapping else (choice, score)
+
+    def _extract_without_order(self, query, score_cutoff, exact=True):
+        query, candidates, processed = self._candidates(query, score_cutoff, exact)
+        it = rprocess.extract_iter(
+            query, processed,
+            processor=None,
+            scorer=self._scorer,
+            score_cutoff=score_cutoff
+        )
+
+        for _, score, pos in it:
+            yield self._result(candidates[pos], score)
+
+    def _extract_bests(self, query, score_cutoff, limit, exact=True):
+        query, candidates, processed = self._candidates(query, score_cutoff, exact)
+        results = rprocess.extract(
+            query, processed,
+            processor=None,
+            scorer=self._scorer,
+            score_cutoff=score_cutoff,
+            limit=limit
+        )
+
+        return [self._result(candidates[pos], score) for _, score, pos in results]
+
+    def _extract_one(self, query, score_cutoff, exact=True):
+        query, candidates, processed = self._candidates(query, score_cutoff, exact)
+        res = rprocess.extractOne(
+            query, processed,
+            processor=None,
+            scorer=self._scorer,
+            score_cutoff=score_cutoff
+        )
+
+        if res is None:
+            return res
+
+        _, score, pos = res
+        return self._result(candidates[pos], score)
+
+    def extractWithoutOrder(self, query, score_cutoff=0):
+        """
+        Generator of (match, score) tuples for every choice above score_cutoff.
+        See process.extractWithoutOrder().
+        """
+        return self._extract_without_order(query, score_cutoff)
+
+    def extract(self, query, limit=5):
+        """
+        List of the best (match, score) tuples. See process.extract().
+        """
+        return self.extractBests(query, limit=limit)
+
+    def extractBests(self, query, score_cutoff=0, limit=5):
+        """
+        List of the best (match, score) tuples above score_cutoff.
+        See process.extractBests().
+        """
+        return self._extract_bests(query, score_cutoff, limit)
+
+    def extractOne(self, query, score_cutoff=0):
+        """
+        The single best (match, score) tuple above score_cutoff, or None.
+        See process.extractOne().
+        """
+        return self._extract_one(query, score_cutoff)
+
+
+# prime used by the MinHash permutations, small enough for the products
+# of two hashes to fit in 64 bits
+_MINHASH_PRIME = (1 << 31) - 1
+
+
+def _qgram_hashes(s, q):
+    """
+    Hashes of the character q-grams of s, padded with a space on both sides.
+    CRC32 rather than hash(), which is salted per process, so that signatures
+    only depend on the seed.
+    """
+    s = " %s " % s
+    grams = {s} if len(s) <= q else {s[i:i + q] for i in range(len(s) - q + 1)}
+    return [zlib.crc32(gram.encode("utf-8", "surrogatepass")) & _MINHASH_PRIME for gram in grams]
+
+
+class MinHashIndex(ChoiceIndex):
+    """
+    A ChoiceIndex that only scores a shortlist of likely matches.
+
+    The shortlist is built with MinHash signatures of the character q-grams
+    of the processed choices and locality sensitive hashing: a choice is a
+    candidate when all the hashes of at least one band of its signature are
+    the same as the query's. Only the max_candidates choices sharing the
+    most bands with the query are then scored exactly with the scorer.
+
+    This trades recall for speed: a good match that shares too few q-grams
+    with the query can be missed. More bands (with the same num_perm) find
+    more candidates and miss fewer matches, but are slower. Requires NumPy.
+
+    Arguments:
+        choices: A list or dictionary of choices, suitable for use with
+            extract().
+        processor: Optional function for transforming choices before matching.
+            See extract().
+        scorer: Scoring function for extract().
+        num_perm: Number of hashes in the MinHash signatures. Defaults to 64.
+        bands: Number of LSH bands the signatures are split into, must
+            divide num_perm. Defaults to 16.
+        q: Length of the character q-grams. Defaults to 3.
+        max_candidates: Maximum number of choices scored per query.
+            Defaults to 300.
+        fallback: Search all the choices when the shortlist gives fewer
+            matches than requested. Defaults to True.
+        seed: Seed of the MinHash permutations. Defaults to 0.
+    """
+
+    def __init__(self, choices, processor=default_processor, scorer=default_scorer, num_perm=64, bands=16, q=3,
+                 max_candidates=300, fallback=True, seed=0):
+        import numpy as np
+
+        if num_perm % bands:
+            raise ValueError("bands must divide num_perm")
+
+        super().__init__(choices, processor=processor, scorer=scorer)
+        self.q = q
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.max_candidates = max_candidates
+        self.fallback = fallback
+
+        rng = np.random.default_rng(seed)
+        self._perm_a = rng.integers(1, _MINHASH_PRIME, size=num_perm, dtype=np.int64)
+        self._perm_b = rng.integers(0, _MINHASH_PRIME, size=num_perm, dtype=np.int64)
+
+        hashes = [_qgram_hashes(str(choice), q) if choice is not None else [] for choice in self.processed]
+        counts = np.array([len(h) for h in hashes], dtype=np.int64)
+        flat = np.fromiter((h for choice in hashes for h in choice), dtype=np.int64, count=int(counts.sum()))
+        # position of every indexed choice in self.choices
+        self._lsh_ids = np.flatnonzero(counts)
+        starts = (np.cumsum(counts) - counts)[self._lsh_ids]
+
+        self._band_keys = np.zeros((bands, len(self._lsh_ids)), dtype=np.uint64)
+        if len(self._lsh_ids):
+            for perm in range(num_perm):
+                values = (self._perm_a[perm] * flat + self._perm_b[perm]) % _MINHASH_PRIME
+                self._add_to_band(self._band_keys[perm // self.rows], np.minimum.reduceat(values, starts))
+
+        # sorted band keys, searched with np.searchsorted for every query
+        self._band_order = np.argsort(self._band_keys, axis=1, kind="stable")
+        self._band_keys = np.take_along_axis(self._band_keys, self._band_order, axis=1)
+
+    @staticmethod
+    def _add_to_band(keys, minhashes):
+        """
+        Fold one row of MinHash values into the band keys, in place
+        """
+        import numpy as np
+
+        keys *= np.uint64(1000003)
+        keys ^= minhashes.astype(np.uint64)
+
+    def _shortlist(self, query):
+        import numpy as np
+
+        hashes = np.array(_qgram_hashes(query, self.q), dtype=np.int64)
+        minhashes = ((self._perm_a[:, None] * hashes[None, :] + self._perm_b[:, None]) % _MINHASH_PRIME).min(axis=1)
+        minhashes = minhashes.reshape(self.bands, self.rows)
+
+        keys = np.zeros(self.bands, dtype=np.uint64)
+        for row in range(self.rows):
+            self._add_to_band(keys, minhashes[:, row])
+
+        matches = []
+        for band, key in enumerate(keys):
+            lo = np.searchsorted(self._band_keys[band], key, side="left")
+            hi = np.searchsorted(self._band_keys[band], key, side="right")
+            matches.append(self._band_order[band, lo:hi])
+        if not matches:
+            return np.empty(0, dtype=np.int64)
+
+        ids, shared_bands = np.unique(np.concatenate(matches), return_counts=True)
+        if len(ids) > self.max_candidates:
+            ids = ids[np.argsort(-shared_bands, kind="stable")[:self.max_candidates]]
+        return self._lsh_ids[ids]
+
+    def extractWithoutOrder(self, query, score_cutoff=0, exact=False):
+        """
+        Generator of (match, score) tuples for the candidates above
+        score_cutoff, or for every choice with exact=True.
+        See process.extractWithoutOrder().
+        """
+        found = False
+        for result in self._extract_without_order(query, score_cutoff, exact):
+            found = True
+            yield result
+
+        if not found and not exact and self.fallback:
+            yield from self._extract_without_order(query, score_cutoff)
+
+    def extract(self, query, limit=5, exact=False):
+        """
+        List of the best (match, score) tuples. See process.extract().
+        """
+        return self.extractBests(query, limit=limit, exact=exact)
+
+    def extractBests(self, query, score_cutoff=0, limit=5, exact=False):
+        """
+        List of the best (match, score) tuples above score_cutoff among the
+        candidates, or among every choice with exact=True.
+        See process.extractBests().
+        """
+        results = self._extract_bests(query, score_cutoff, limit, exact)
+        if not exact and self.fallback and len(results) < (limit or 1):
+            results = self._extract_bests(query, score_cutoff, limit)
+        return results
+
+    def extractOne(self, query, score_cutoff=0, exact=False):
+        """
+        The single best (match, score) tuple above score_cutoff among the
+        candidates, or among every choice with exact=True.
+        See process.extractOne().
+        """
+        res = self._extract_one(query, score_cutoff, exact)
+        if res is None and not exact and self.fallback:
+            res = self._extract_one(query, score_cutoff)
+        return res
+
+
+class _DisjointSet:
+    """
+    Union-find over the indices 0..n-1 with path halving and union by size.
+    """
+    def __init__(self, n):
+        self.parent = list(range(n))
+        self.size = [1] * n
+
+    def find(self, i):
+        parent = self.parent
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def union(self, i, j):
+        i, j = self.find(i), self.find(j)
+        if i == j:
+            return
+        if self.size[i] < self.size[j]:
+            i, j = j, i
+        self.parent[j] = i
+        self.size[i] += self.size[j]
+
+
+# Scorers that compute the Indel similarity of a view of the processed strings.
+# For them a score >= threshold requires a minimum number of characters in
+# common, which dedupe uses to skip pairs that cannot be duplicates.
+_indel_views = {
+    fuzz.ratio: str,
+    fuzz.QRatio: str,
+    fuzz.UQRatio: str,
+    fuzz.token_sort_ratio: lambda s: " ".join(sorted(s.split())),
+    # without a token in common, token_set_ratio is the ratio of the sorted unique tokens
+    fuzz.token_set_ratio: lambda s: " ".join(sorted(set(s.split()))),
+}
+
+
+def _block_spans(blocks, limit=None):
+    """
+    For every item i of every block, (block, pos, end): i = block[pos] has to
+    be scored against block[pos + 1:end]. limit(i) is the largest length of a
+    block item i can match, when the blocks are sorted by length.
+    """
+    spans = []
+    for block, lengths in blocks:
+        if len(block) < 2:
+            continue
+        for pos, i in enumerate(block[:-1]):
+            end = len(block) if limit is None else bisect.bisect_right(lengths, limit(i), pos + 1)
+            if end > pos + 1:
+                spans.append((block, pos, end))
+    return spans
+
+
+def _prefix_filter_spans(strings, threshold):
+    """
+    Spans (see _block_spans) covering every pair of strings that can have an
+    Indel similarity ratio >= threshold.
+
+    ratio(x, y) <= 200 * o / (len(x) + len(y)), with o the number of
+    characters x and y have in common (as multisets), so a duplicate pair has
+    len(x) >= r * len(y) and o >= ceil(r * len(y)), with t = threshold / 100,
+    r = t / (2 - t) and len(x) <= len(y). Two strings with o common characters
+    share at least one character among the first len - o + 1 characters of
+    each, when the characters of every string are sorted in the same global
+    order (rarest first). Only those prefixes are indexed, which never misses
+    a pair.
+    """
+    delta = (threshold - 1e-6) / 100
+    ratio = delta / (2 - delta)
+    rows = []
+    for s in strings:
+        # the k-th occurrence of a character is a different element than the first one
+        seen = {}
+        row = []
+        for ch in s:
+            row.append((ch, seen.get(ch, 0)))
+            seen[ch] = row[-1][1] + 1
+        rows.append(row)
+
+    frequency = {}
+    for row in rows:
+        for element in row:
+            frequency[element] = frequency.get(element, 0) + 1
+
+    index = {}
+    for i in sorted(range(len(rows)), key=lambda i: len(rows[i])):
+        row = sorted(rows[i], key=lambda element: (frequency[element], element))
+        min_overlap = max(1, math.ceil(ratio * len(row) - 1e-9))
+        for element in row[:max(0, len(row) - min_overlap + 1)]:
+            block, lengths = index.setdefault(element, ([], []))
+            block.append(i)
+            lengths.append(len(row))
+
+    return _block_spans(index.values(), lambda i: len(rows[i]) / ratio + 1e-9)
+
+
+def _token_blocks(processed, max_block_size=None):
+    """
+    Blocks (see _block_spans) of the items sharing a token. Tokens shared by
+    more than max_block_size items are left out.
+    """
+    index = {}
+    for i, s in enumerate(processed):
+        for token in set(s.split()):
+            index.setdefault(token, []).append(i)
+    return [(block, None) for block in index.values() if max_block_size is None or len(block) <= max_block_size]
+
+
+def _neighbours(n, pairs, symmetric):
+    """
+    Dict mapping every item i to the sorted items it has to be scored
+    against: the items j > i of its pairs when the scorer is symmetric,
+    all of them otherwise
+    """
+    neighbours = [set() for _ in range(n)]
+    for i, j in pairs:
+        if i == j:
+            continue
+        if i > j:
+            i, j = j, i
+        neighbours[i].add(j)
+        if not symmetric:
+            neighbours[j].add(i)
+
+    return {i: sorted(js) for i, js in enumerate(neighbours) if js}
+
+
+def _candidate_pairs(processed, scorer, threshold):
+    """
+    Candidates (see _neighbours) covering every pair that can reach the
+    threshold, or None when every pair has to be scored (scorers for which
+    no pair can be ruled out in advance, or when most pairs are candidates
+    anyway).
+    """
+    view = _indel_views.get(scorer)
+    if view is None or threshold <= 0:
+        return None
+    strings = [view(s) for s in processed]
+    spans = _prefix_filter_spans(strings, threshold)
+
+    if scorer is fuzz.token_set_ratio:
+        # a common token can be enough for any score, up to 100 when one token set contains the other
+        spans += _block_spans(_token_blocks(processed))
+
+    # scoring every pair in C is cheaper than collecting most of them in Python
+    n = len(strings)
+    if 4 * sum(end - pos - 1 for _, pos, end in spans) > n * (n - 1):
+        return None
+
+    pairs = [(block[pos], j) for block, pos, end in spans for j in block[pos + 1:end]]
+    # empty strings have no characters to index: they are scored against every item
+    pairs += [(i, j) for i, s in enumerate(strings) if not s for j in range(n)]
+
+    return _neighbours(n, pairs, symmetric=True)
+
+
+def _blocking_pairs(processed, scorer, max_candidates):
+    """
+    Candidates (see _neighbours) of the likely duplicates: the max_candidates
+    items of the MinHashIndex shortlist of every item, and the items sharing a
+    token that at most max_candidates items have. That is O(n * max_candidates)
+    pairs per token of the items, but duplicates with few q-grams and no rare
+    token in common are missed.
+    """
+    # the index only provides the shortlists, the strings are already processed
+    index = MinHashIndex(processed, processor=None, scorer=None, max_candidates=max_candidates)
+    pairs = [(i, int(j)) for i, s in enumerate(processed) for j in index._shortlist(s)]
+    pairs += [(block[pos], j) for block, pos, end in _block_spans(_token_blocks(processed, max_candidates))
+              for j in block[pos + 1:end]]
+
+    return _neighbours(len(processed), pairs, symmetric=scorer in _indel_views)
+
+
+# largest number of distinct items dedupe compares exactly by default,
+# above it only the candidates found by blocking are scored
+DEDUPE_EXACT_LIMIT = 2000
+
+
+def dedupe(contains_dupes, threshold=70, scorer=fuzz.token_set_ratio, return_clusters=False, transitive=False,
+           exact=None, max_candidates=100):
     """
     This convenience function takes a list of strings containing duplicates and uses fuzzy matching to identify
-    and remove duplicates. Specifically, it uses process.extract to identify duplicates that
-    score greater than a user defined threshold. Then, it looks for the longest item in the duplicate list
-    since we assume this item contains the most entity information and returns that. It breaks string
-    length ties on an alphabetical sort.
+    and remove duplicates. Specifically, it identifies the duplicates of each item that score greater than
+    a user defined threshold. Then, it looks for the longest item in the duplicate list since we assume this
+    item contains the most entity information and returns that. It breaks string length ties on an
+    alphabetical sort.
+
+    Exact deduplication compares every item with every other item, which takes time quadratic in the number
+    of items. For fuzz.ratio, fuzz.QRatio, fuzz.UQRatio, fuzz.token_sort_ratio and fuzz.token_set_ratio, pairs
+    that cannot reach the threshold (too few characters in common, and no common token for token_set_ratio)
+    are skipped without scoring them, but with loose thresholds most pairs remain.
+
+    Above DEDUPE_EXACT_LIMIT distinct items, dedupe uses blocking instead: every item is only scored against
+    its likely duplicates, the max_candidates items with the most similar character q-grams (see
+    MinHashIndex) and the items sharing a token with it, leaving out tokens shared by more than
+    max_candidates items. The time is then linear in the number of items, but duplicates with few q-grams
+    and no rare token in common are missed.
 
     Note: as the threshold DECREASES the number of duplicates that are found INCREASES. This means that the
         returned deduplicated list will likely be shorter. Raise the threshold for dedupe to be less
@@ -297,17 +1253,94 @@ def dedupe(contains_dupes, threshold=70, scorer=fuzz.token_set_ratio):
             of the form f(query, choice) -> int.
             By default, fuzz.token_set_ratio() is used and expects both query and
             choice to be strings.
+        return_clusters: If True, return a dictionary mapping every kept item
+            to the list of items it replaces instead. Defaults to False.
+        transitive: If True, duplicates of duplicates are merged into a single
+            cluster (if a matches b and b matches c, a and c are duplicates too)
+            and the longest item of each cluster is kept. Note that with
+            subset-based scorers like token_set_ratio this can chain unrelated
+            items together. Defaults to False.
+        exact: If True, always find every duplicate; if False, always use blocking.
+            Defaults to None: exact up to DEDUPE_EXACT_LIMIT distinct items.
+        max_candidates: Number of likely duplicates scored per item and per
+            token with blocking. Defaults to 100.
 
     Returns:
         A deduplicated list. For example:
 
-            In: contains_dupes = ['Frodo Baggin', 'Frodo Baggins', 'F. Baggins', 'Samwise G.', 'Gandalf', 'Bilbo Baggins']
+            In: contains_dupes = ['Frodo Baggin', 'Frodo Baggins', 'F. Baggins', 'Samwise G.', 'Gandalf',
+                                  'Bilbo Baggins']
             In: dedupe(contains_dupes)
-            Out: ['Frodo Baggins', 'Samwise G.', 'Bilbo Baggins', 'Gandalf']
+            Out: ['Frodo Baggins', 'Samwise G.', 'Gandalf']
+            In: dedupe(contains_dupes, return_clusters=True)
+            Out: {'Frodo Baggins': ['Frodo Baggin', 'Frodo Baggins', 'F. Baggins', 'Bilbo Baggins'],
+                  'Samwise G.': ['Samwise G.'], 'Gandalf': ['Gandalf']}
     """
-    deduped = set()
-    for item in contains_dupes:
-        matches = extractBests(item, contains_dupes, scorer=scorer, score_cutoff=threshold, limit=None)
-        deduped.add(max(matches, key=lambda x: (len(x[0]), x[0]))[0])
-
+    contains_dupes = list(contains_dupes)
+    queries = _process_many(_prepare_queries(contains_dupes, default_processor), default_processor, scorer)
+    choices = _process_many(contains_dupes, default_processor, scorer)
+
+    # items that are identical once processed only need to be scored once
+    groups = {}
+    for i, choice in enumerate(choices):
+        groups.setdefault(choice if choice else i, []).append(i)
+    groups = list(groups.values())
+    longest = [max((contains_dupes[i] for i in group), key=lambda x: (len(x), x)) for group in groups]
+
+    matched = [[] for _ in groups]
+    scorer_func = _get_scorer(scorer)
+    processed = [choices[group[0]] for group in groups]
+    if exact is None:
+        exact = len(groups) <= DEDUPE_EXACT_LIMIT
+    if exact:
+        pairs = _candidate_pairs(processed, scorer, threshold)
+    else:
+        pairs = _blocking_pairs(processed, scorer, max_candidates)
+    if pairs is None:
+        # every item is scored against every other one, in both directions
+        for u, group in enumerate(groups):
+            matches = rprocess.extract_iter(
+                queries[group[0]], processed,
+                processor=None,
+                scorer=scorer_func,
+                score_cutoff=threshold
+            )
+            matched[u].extend(v for _, _, v in matches if v != u)
+    else:
+        # the scorers in _indel_views are symmetric: each pair is scored once,
+        # the candidates of the other scorers are scored in both directions
+        symmetric = scorer in _indel_views
+        for u, candidates in pairs.items():
+            matches = rprocess.extract_iter(
+                queries[groups[u][0]], [processed[v] for v in candidates],
+                processor=None,
+                scorer=scorer_func,
+                score_cutoff=threshold
+            )
+            for _, _, pos in matches:
+                matched[u].append(candidates[pos])
+                if symmetric:
+                    matched[candidates[pos]].append(u)
+
+    if transitive:
+        clusters = _DisjointSet(len(groups))
+        for u, neighbours in enumerate(matched):
+            for v in neighbours:
+                clusters.union(u, v)
+        best = {}
+        for u in range(len(groups)):
+            root = clusters.find(u)
+            best[root] = max(best.get(root, longest[u]), longest[u], key=lambda x: (len(x), x))
+        representatives = [best[clusters.find(u)] for u in range(len(groups))]
+    else:
+        representatives = [max([longest[u]] + [longest[v] for v in neighbours], key=lambda x: (len(x), x))
+                           for u, neighbours in enumerate(matched)]
+
+    deduped = {}
+    for u, group in enumerate(groups):
+        deduped.setdefault(representatives[u], []).extend(group)
+    deduped = {item: [contains_dupes[i] for i in sorted(members)] for item, members in deduped.items()}
+
+    if return_clusters:
+        return deduped
     return list(deduped) if len(deduped) != len(contains_dupes) else contains_dupes
@@ -1,6 +1,7 @@
 from collections.abc import Mapping
+import os
 import typing
-from typing import Any, Callable, Union, Tuple, Generator, TypeVar, Sequence
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Union, Tuple, Generator, TypeVar, Sequence
 
 
 ChoicesT = Union[Mapping[str, str], Sequence[str]]
@@ -15,3 +16,35 @@ def extractWithoutOrder(query: str, choices: Mapping[str, str], processor: Proce
 
 @typing.overload
 def extractWithoutOrder(query: str, choices: Sequence[str], processor: ProcessorT, scorer: ScorerT, score_cutoff: int = ...) -> Generator[Tuple[str, int], None, None]: ...
+
+
+@typing.overload
+def extract_many(queries: Iterable[str], choices: Mapping[str, str], processor: ProcessorT = ..., scorer: ScorerT = ..., score_cutoff: int = ..., limit: Optional[int] = ..., workers: int = ...) -> List[List[Tuple[str, int, str]]]: ...
+
+
+@typing.overload
+def extract_many(queries: Iterable[str], choices: Sequence[str], processor: ProcessorT = ..., scorer: ScorerT = ..., score_cutoff: int = ..., limit: Optional[int] = ..., workers: int = ...) -> List[List[Tuple[str, int]]]: ...
+
+
+def cdist(queries: Iterable[str], choices: ChoicesT, processor: ProcessorT = ..., scorer: ScorerT = ..., score_cutoff: int = ..., workers: int = ...) -> Any: ...
+
+
+class ChoiceIndex:
+    def __init__(self, choices: ChoicesT, processor: ProcessorT = ..., scorer: ScorerT = ...) -> None: ...
+    def __len__(self) -> int: ...
+    def extractWithoutOrder(self, query: str, score_cutoff: int = ...) -> Generator[Tuple[Any, ...], None, None]: ...
+    def extract(self, query: str, limit: Optional[int] = ...) -> List[Tuple[Any, ...]]: ...
+    def extractBests(self, query: str, score_cutoff: int = ..., limit: Optional[int] = ...) -> List[Tuple[Any, ...]]: ...
+    def extractOne(self, query: str, score_cutoff: int = ...) -> Optional[Tuple[Any, ...]]: ...
+
+
+def read_choices(path: Union[str, os.PathLike], encoding: str = ...) -> Iterator[str]: ...
+def extract_stream(query: str, choices: Union[Iterable[Any], Mapping[Any, Any], str, os.PathLike], processor: ProcessorT = ..., scorer: ScorerT = ..., score_cutoff: int = ..., limit: Optional[int] = ..., batch_size: int = ..., encoding: str = ...) -> List[Tuple[Any, ...]]: ...
+
+
+class MinHashIndex(ChoiceIndex):
+    def __init__(self, choices: ChoicesT, processor: ProcessorT = ..., scorer: ScorerT = ..., num_perm: int = ..., bands: int = ..., q: int = ..., max_candidates: int = ..., fallback: bool = ..., seed: int = ...) -> None: ...
+    def extractWithoutOrder(self, query: str, score_cutoff: int = ..., exact: bool = ...) -> Generator[Tuple[Any, ...], None, None]: ...
+    def extract(self, query: str, limit: Optional[int] = ..., exact: bool = ...) -> List[Tuple[Any, ...]]: ...
+    def extractBests(self, query: str, score_cutoff: int = ..., limit: Optional[int] = ..., exact: bool = ...) -> List[Tuple[Any, ...]]: ...
+    def extractOne(self, query: str, score_cutoff: int = ..., exact: bool = ...) -> Optional[Tuple[Any, ...]]: ...
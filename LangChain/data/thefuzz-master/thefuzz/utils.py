@@ -1,12 +1,29 @@
+from functools import lru_cache
+
 from rapidfuzz.utils import default_process as _default_process
 
 translation_table = {i: None for i in range(128, 256)}  # ascii dammit!
 
+# number of (string, force_ascii) pairs remembered by full_process
+FULL_PROCESS_CACHE_SIZE = 2 ** 16
+
 
 def ascii_only(s):
+    if s.isascii():
+        return s
     return s.translate(translation_table)
 
 
+def _full_process(s, force_ascii=False):
+    if force_ascii:
+        s = ascii_only(str(s))
+
+    return _default_process(s)
+
+
+_cached_full_process = lru_cache(maxsize=FULL_PROCESS_CACHE_SIZE)(_full_process)
+
+
 def full_process(s, force_ascii=False):
     """
     Process string by
@@ -14,9 +31,43 @@ def full_process(s, force_ascii=False):
     -- trim whitespace
     -- force to lower case
     if force_ascii == True, force convert to ascii
+
+    Results for str inputs are kept in a bounded, thread-safe LRU cache,
+    see full_process_cache_info()
     """
+    if type(s) is str:
+        return _cached_full_process(s, force_ascii)
 
-    if force_ascii:
-        s = ascii_only(str(s))
+    return _full_process(s, force_ascii)
 
-    return _default_process(s)
+
+def full_process_many(strings, force_ascii=False):
+    """
+    Process every string of an iterable like full_process and return the
+    results as a list
+    """
+    cached = _cached_full_process
+    return [
+        cached(s, force_ascii) if type(s) is str else _full_process(s, force_ascii)
+        for s in strings
+    ]
+
+
+def full_process_cache_info():
+    """
+    Hits, misses, maxsize and currsize of the full_process cache
+    """
+    return _cached_full_process.cache_info()
+
+
+def full_process_cache_clear():
+    _cached_full_process.cache_clear()
+
+
+def set_full_process_cache_size(maxsize):
+    """
+    Resize the full_process cache. The cached results are dropped.
+    maxsize=0 disables caching, None makes the cache unbounded.
+    """
+    global _cached_full_process
+    _cached_full_process = lru_cache(maxsize=maxsize)(_full_process)
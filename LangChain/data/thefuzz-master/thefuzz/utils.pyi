@@ -1,3 +1,11 @@
+from functools import _CacheInfo
+from typing import Any, Iterable, List, Optional
+
+FULL_PROCESS_CACHE_SIZE: int
 
 def ascii_only(s: str) -> str: ...
 def full_process(s: str, force_ascii: bool = ...) -> str: ...
+def full_process_many(strings: Iterable[Any], force_ascii: bool = ...) -> List[str]: ...
+def full_process_cache_info() -> _CacheInfo: ...
+def full_process_cache_clear() -> None: ...
+def set_full_process_cache_size(maxsize: Optional[int]) -> None: ...